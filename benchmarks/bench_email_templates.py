@@ -0,0 +1,56 @@
+"""Microbenchmark: plantillas compiladas vs format_map con SafeDict.
+
+Uso:
+    python benchmarks/bench_email_templates.py [iteraciones]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.email_templates import (  # noqa: E402
+    EMAIL_TEMPLATES,
+    render_email_template,
+    render_email_template_format_map,
+)
+
+STATIC_CONTEXT = {
+    "logo_url": "https://res.cloudinary.com/demo/image/upload/talentohub/logo.png",
+    "support_email": "soporte@talentohub.com",
+}
+
+CONTEXTS = {
+    "welcome": {"user_name": "Ana Pérez", "login_url": "https://talentohub.com/login"},
+    "password_reset": {"username": "ana", "reset_link": "https://talentohub.com/reset/abc/def"},
+    "account_locked": {"minutes_remaining": 5},
+}
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{'plantilla':<30}{'format_map (µs)':>18}{'compilada (µs)':>18}{'mejora':>10}")
+
+    for key in EMAIL_TEMPLATES:
+        context = CONTEXTS.get(key, {})
+        merged = dict(STATIC_CONTEXT, **context)
+
+        # Ambos caminos deben producir exactamente el mismo resultado
+        assert render_email_template(key, context, static_context=STATIC_CONTEXT) == \
+            render_email_template_format_map(key, merged), key
+
+        legacy = timeit.timeit(
+            lambda: render_email_template_format_map(key, dict(STATIC_CONTEXT, **context)),
+            number=iterations,
+        )
+        compiled = timeit.timeit(
+            lambda: render_email_template(key, context, static_context=STATIC_CONTEXT),
+            number=iterations,
+        )
+        legacy_us = legacy / iterations * 1e6
+        compiled_us = compiled / iterations * 1e6
+        print(f"{key:<30}{legacy_us:>18.2f}{compiled_us:>18.2f}{legacy / compiled:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark: arranque en frío del PDF de una vacante (matplotlib vs reportlab, pool frío vs caliente).
+
+Cada medición "en frío" corre en un intérprete nuevo: incluye los imports de
+matplotlib/reportlab y la carga de fuentes, que es lo que pagaba el primer reporte de
+cada worker de gunicorn. Luego se mide el mismo render ya en caliente. La última parte
+mide el primer PDF a través de un ReportPool nuevo (spawn + imports + render) frente a
+un pool precalentado con ReportPool.calentar(), como hace post_worker_init con REPORT_WARMUP=true.
+
+Uso:
+    python benchmarks/bench_report_cold_start.py [repeticiones]
+"""
+import os
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+DATOS = {
+    "vacante_id": 1, "titulo": "Desarrollador Backend", "empresa_nombre": "Empresa S.A.S.",
+    "total": 60, "ultima": "2026-01-01T10:00:00+00:00",
+    "por_estado": [("Postulado", 30), ("En revisión", 15), ("Entrevista", 10), ("Rechazado", 5)],
+    "logo": None, "generado": "2026-01-01T10:00:00+00:00",
+}
+
+# Se ejecuta en un proceso nuevo: imprime "primer_render segundo_render" en segundos
+SCRIPT_FRIO = """
+import sys, time
+sys.path.insert(0, {raiz!r})
+inicio = time.perf_counter()
+from core.report_render import render_pdf_vacante
+render_pdf_vacante({datos!r})
+frio = time.perf_counter() - inicio
+inicio = time.perf_counter()
+render_pdf_vacante({datos!r})
+print(frio, time.perf_counter() - inicio)
+"""
+
+
+def render_en_proceso_nuevo(motor):
+    datos = dict(DATOS, motor=motor)
+    salida = subprocess.run(
+        [sys.executable, "-c", SCRIPT_FRIO.format(raiz=RAIZ, datos=datos)],
+        check=True, capture_output=True, text=True,
+    ).stdout.split()
+    return float(salida[0]), float(salida[1])
+
+
+def primer_pdf_del_pool(motor, precalentado):
+    from core.report_jobs import ReportPool
+    from core.report_render import calentar, render_pdf_vacante
+
+    pool = ReportPool(workers=1, queue_size=4, initializer=calentar, initargs=(motor,))
+    try:
+        if precalentado:
+            pool.calentar()
+            # Esperar a que el proceso termine el initializer (en producción pasa al arrancar el worker)
+            pool._get_executor().submit(os.getpid).result()
+        inicio = time.perf_counter()
+        trabajo = pool.submit("bench", render_pdf_vacante, dict(DATOS, motor=motor))
+        trabajo.terminado.wait()
+        trabajo.future.result()
+        return time.perf_counter() - inicio
+    finally:
+        pool.shutdown(wait=True)
+
+
+def mediana(valores):
+    valores = sorted(valores)
+    return valores[len(valores) // 2]
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print(f"mediana de {repeticiones} repeticiones (segundos)")
+    print(f"{'motor':<12}{'1er render (frío)':>20}{'render caliente':>18}")
+    for motor in ("matplotlib", "reportlab"):
+        medidas = [render_en_proceso_nuevo(motor) for _ in range(repeticiones)]
+        print(f"{motor:<12}{mediana([m[0] for m in medidas]):>20.3f}{mediana([m[1] for m in medidas]):>18.3f}")
+
+    print()
+    print(f"{'motor':<12}{'pool frío':>20}{'pool precalentado':>18}")
+    for motor in ("matplotlib", "reportlab"):
+        frio = mediana([primer_pdf_del_pool(motor, False) for _ in range(repeticiones)])
+        caliente = mediana([primer_pdf_del_pool(motor, True) for _ in range(repeticiones)])
+        print(f"{motor:<12}{frio:>20.3f}{caliente:>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Microbenchmark: correo de cambio de estado, todas las plantillas vs solo la del estado.
+
+Antes actualizar_estado_postulacion formateaba las seis plantillas (~18 KB de texto y
+11 llamadas a strftime) en cada cambio de estado y usaba una. Ahora se compilan una vez
+en EMAIL_TEMPLATES y se renderiza solo la del nuevo estado.
+
+Uso:
+    python benchmarks/bench_status_templates.py [iteraciones]
+"""
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.email_templates import ESTADO_POSTULACION_TEMPLATES, render_email_template  # noqa: E402
+
+
+def build_context(fecha_actualizacion):
+    return {
+        "vacante": "Desarrollador Backend",
+        "empresa": "ACME S.A.S.",
+        "empresa_mayus": "ACME S.A.S.",
+        "ubicacion": "Bogotá",
+        "modalidad": "Remoto",
+        "tipo_jornada": "Tiempo completo",
+        "salario": "Según lo acordado en entrevista",
+        "fecha_actualizacion": fecha_actualizacion,
+        "nombre": "Ana",
+        "primer_nombre": "Ana",
+        "postulacion_id": 1234,
+        "fecha_postulacion": "01/02/2026",
+    }
+
+
+def eager(nuevo_estado):
+    # Como el código anterior: todas las plantillas y un strftime por cada fecha mostrada
+    for _ in range(11):
+        fecha = datetime.now().strftime('%d/%m/%Y a las %H:%M')
+    context = build_context(fecha)
+    rendered = {
+        estado: render_email_template(key, context)
+        for estado, key in ESTADO_POSTULACION_TEMPLATES.items()
+    }
+    return rendered[nuevo_estado]
+
+
+def lazy(nuevo_estado):
+    context = build_context(datetime.now().strftime('%d/%m/%Y a las %H:%M'))
+    return render_email_template(ESTADO_POSTULACION_TEMPLATES[nuevo_estado], context)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{'estado':<26}{'todas (µs)':>14}{'solo una (µs)':>16}{'mejora':>10}{'KB evitados':>14}")
+
+    for estado in ESTADO_POSTULACION_TEMPLATES:
+        assert eager(estado) == lazy(estado), estado
+        skipped = sum(
+            len(subject) + len(text)
+            for other, (subject, text, _) in (
+                (other, lazy(other)) for other in ESTADO_POSTULACION_TEMPLATES
+            )
+            if other != estado
+        )
+        all_time = timeit.timeit(lambda: eager(estado), number=iterations)
+        one_time = timeit.timeit(lambda: lazy(estado), number=iterations)
+        print(
+            f"{estado:<26}{all_time / iterations * 1e6:>14.2f}{one_time / iterations * 1e6:>16.2f}"
+            f"{all_time / one_time:>9.1f}x{skipped / 1024:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark: exportación de métricas a 100k filas (CSV en memoria vs streaming vs XLSX).
+
+Antes format=excel devolvía un CSV armado completo en un StringIO. Ahora el CSV sale en
+streaming y excel es un XLSX real escrito con openpyxl en modo write-only. Se miden
+tiempo y pico de memoria (tracemalloc) con datos sintéticos, sin base de datos. Con lxml
+instalado openpyxl serializa el XML bastante más rápido.
+
+Uso:
+    python benchmarks/bench_xlsx_export.py [filas]
+"""
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "gestion_de_candidatos.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from core.metrics import EXPORT_HEADER, csv_streaming, escribir_xlsx, filas_exportacion  # noqa: E402
+from core.models import Postulacion  # noqa: E402
+
+ESTADOS = [valor for valor, _ in Postulacion.ESTADOS]
+
+
+def metricas_sinteticas(filas):
+    """Una vacante por cada len(ESTADOS) filas, generadas sobre la marcha (como iterar_metricas)."""
+    base = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+    for vacante_id in range(1, filas // len(ESTADOS) + 1):
+        por_estado = {estado: (vacante_id * (i + 3)) % 97 + 1 for i, estado in enumerate(ESTADOS)}
+        yield {
+            "vacante_id": vacante_id,
+            "titulo": f"Desarrollador Backend {vacante_id}",
+            "empresa_id": vacante_id % 50 + 1,
+            "empresa_nombre": f"Empresa {vacante_id % 50 + 1} S.A.S.",
+            "total_postulaciones": sum(por_estado.values()),
+            "postulaciones_por_estado": por_estado,
+            "ultima_postulacion": base + timedelta(minutes=vacante_id),
+        }
+
+
+def csv_en_memoria(filas):
+    # Como el código anterior: todo el CSV en un StringIO y luego copiado a la respuesta
+    sio = io.StringIO()
+    writer = csv.writer(sio)
+    writer.writerow(EXPORT_HEADER)
+    for r in filas_exportacion(list(metricas_sinteticas(filas))):
+        writer.writerow([str(c) if c is not None else '' for c in r])
+    return len(sio.getvalue().encode("utf-8"))
+
+
+def csv_en_streaming(filas):
+    return sum(len(bloque.encode("utf-8")) for bloque in csv_streaming(filas_exportacion(metricas_sinteticas(filas))))
+
+
+def xlsx_write_only(filas):
+    with tempfile.TemporaryFile() as archivo:
+        escribir_xlsx(metricas_sinteticas(filas), archivo)
+        return archivo.tell()
+
+
+def xlsx_normal(filas):
+    # Referencia: openpyxl sin write-only guarda todas las celdas en memoria
+    from openpyxl import Workbook
+
+    libro = Workbook()
+    hoja = libro.active
+    hoja.append(EXPORT_HEADER)
+    for fila in filas_exportacion(metricas_sinteticas(filas)):
+        hoja.append([c.replace(tzinfo=None) if isinstance(c, datetime) else c for c in fila])
+    with tempfile.TemporaryFile() as archivo:
+        libro.save(archivo)
+        return archivo.tell()
+
+
+def medir(funcion, filas):
+    # El tiempo se mide sin tracemalloc (lo hace varias veces más lento); la memoria en otra pasada
+    inicio = time.perf_counter()
+    tamano = funcion(filas)
+    segundos = time.perf_counter() - inicio
+    tracemalloc.start()
+    funcion(filas)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return segundos, pico, tamano
+
+
+def main():
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"{filas} filas ({filas // len(ESTADOS)} vacantes x {len(ESTADOS)} estados)")
+    print(f"{'variante':<28}{'tiempo (s)':>12}{'pico (MB)':>12}{'salida (MB)':>13}")
+    for nombre, funcion in (
+        ("csv en StringIO (antes)", csv_en_memoria),
+        ("csv streaming", csv_en_streaming),
+        ("xlsx write-only", xlsx_write_only),
+        ("xlsx openpyxl normal", xlsx_normal),
+    ):
+        segundos, pico, tamano = medir(funcion, filas)
+        print(f"{nombre:<28}{segundos:>12.2f}{pico / 2**20:>12.1f}{tamano / 2**20:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
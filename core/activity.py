@@ -0,0 +1,80 @@
+import logging
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_CACHE_KEY = "user_activity_{user_id}"
+
+
+def _cache():
+    return caches[getattr(settings, "INACTIVITY_CACHE_ALIAS", "default")]
+
+
+def _granularity():
+    return getattr(settings, "ACTIVITY_WRITE_GRANULARITY", 15)
+
+
+def _cache_key(user_id):
+    return ACTIVITY_CACHE_KEY.format(user_id=user_id)
+
+
+def get_last_activity(user_id):
+    """Última actividad registrada (epoch en segundos) o None."""
+    value = _cache().get(_cache_key(user_id))
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    # Valores antiguos guardados como ISO string / datetime
+    try:
+        dt = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+        return int(dt.timestamp())
+    except Exception:
+        return None
+
+
+def record_activity(user_id, now=None):
+    """Guarda la actividad del usuario sin condiciones (login, heartbeat)."""
+    now = int(now if now is not None else time.time())
+    ttl = getattr(settings, "INACTIVITY_CACHE_TTL", 86400)
+    _cache().set(_cache_key(user_id), now, ttl)
+    return now
+
+
+def touch_activity(user_id, last_activity=None, now=None):
+    """Registra actividad solo si la guardada es más vieja que ACTIVITY_WRITE_GRANULARITY.
+
+    Así la mayoría de requests solo leen la cache. Devuelve True si escribió.
+    """
+    now = int(now if now is not None else time.time())
+    if last_activity is not None and now - last_activity < _granularity():
+        return False
+    record_activity(user_id, now)
+    return True
+
+
+def inactivity_elapsed(user_id, now=None):
+    """Segundos sin actividad si superan el timeout, o None si la sesión sigue viva.
+
+    Renueva la actividad (con escritura agrupada) cuando la sesión sigue viva. Como
+    el valor guardado puede atrasarse hasta una granularidad, se suma al timeout:
+    una sesión nunca expira antes de INACTIVITY_TIMEOUT.
+    """
+    now = int(now if now is not None else time.time())
+    last_activity = get_last_activity(user_id)
+    if last_activity is None:
+        # Primera vez o cache expiró - registrar actividad
+        record_activity(user_id, now)
+        return None
+
+    elapsed = now - last_activity
+    timeout = getattr(settings, "INACTIVITY_TIMEOUT", 120)
+    if elapsed > timeout + _granularity():
+        return elapsed
+
+    touch_activity(user_id, last_activity, now)
+    return None
@@ -0,0 +1,198 @@
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, ProgrammingError, connection, transaction
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Empresa
+from .roles import (
+    REQUEST_EMPRESA_ATTR,
+    REQUEST_ROLE_ATTR,
+    ensure_role_version,
+    get_role_version,
+    get_supabase_empresa_id,
+    get_supabase_role,
+    normalize_role,
+)
+
+logger = logging.getLogger(__name__)
+
+# Claims que se firman dentro del access token
+ROLE_CLAIM = "role"
+EMPRESA_CLAIM = "id_empresa"
+ROLE_VERSION_CLAIM = "role_ver"
+
+
+# None = aún no se sabe si la BD soporta la consulta (columnas role/id_empresa en auth_user)
+_context_query_supported = None
+
+
+def role_claims_enabled():
+    return getattr(settings, "JWT_ROLE_CLAIMS", False)
+
+
+def build_role_claims(user):
+    """Claims de rol/empresa para el access token del usuario ({} si la cache no está disponible)."""
+    # La versión se lee antes que el rol: si cambia en medio, el token queda obsoleto
+    # y se rechaza, nunca al revés.
+    version = ensure_role_version(user.id)
+    if version is None:
+        # Sin versión no se podría revocar el token: se emite sin claims (rol desde la BD)
+        return {}
+    return {
+        ROLE_CLAIM: get_supabase_role(user),
+        EMPRESA_CLAIM: get_supabase_empresa_id(user),
+        ROLE_VERSION_CLAIM: version,
+    }
+
+
+def load_user_context(user):
+    """Carga role, id_empresa y las empresas propias del usuario en una sola consulta.
+
+    Deja en el objeto user: role, id_empresa, owned_empresa_ids y el memo que usan
+    get_supabase_role/get_supabase_empresa_id, para que las vistas no consulten más.
+    Si la BD no tiene las columnas (p.ej. SQLite local) no hace nada y las vistas
+    siguen usando la resolución perezosa de core.roles.
+    """
+    global _context_query_supported
+    if _context_query_supported is False or not getattr(user, "id", None):
+        return user
+    if connection.vendor != "postgresql":
+        _context_query_supported = False
+        return user
+
+    sql = (
+        "SELECT u.role, u.id_empresa, "
+        "ARRAY(SELECT e.id FROM {empresa} e WHERE e.owner_id = u.id ORDER BY e.id) "
+        "FROM auth_user u WHERE u.id = %s"
+    ).format(empresa=Empresa._meta.db_table)
+    try:
+        # Savepoint: un error aquí no debe romper la transacción del request
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [user.id])
+                row = cursor.fetchone()
+        _context_query_supported = True
+    except ProgrammingError as e:
+        # Error de esquema (faltan las columnas): no tiene sentido reintentar en este proceso
+        logger.warning(f"Consulta de contexto de usuario no soportada, se usa la resolución perezosa: {e}")
+        _context_query_supported = False
+        return user
+    except DatabaseError as e:
+        # Error transitorio (conexión caída, timeout, serialización): solo este request
+        # usa la resolución perezosa
+        logger.warning(f"No se pudo cargar el contexto del usuario {user.id}, se usa la resolución perezosa: {e}")
+        return user
+
+    if not row:
+        return user
+    return aplicar_contexto(user, *row)
+
+
+def aplicar_contexto(user, raw_role, id_empresa, owned_ids):
+    """Deja en user el rol, la empresa y las empresas propias ya resueltos (ver load_user_context)."""
+    owned_ids = list(owned_ids or [])
+    user.owned_empresa_ids = owned_ids
+    user.id_empresa = id_empresa
+    setattr(user, REQUEST_EMPRESA_ATTR, id_empresa or (owned_ids[0] if owned_ids else None))
+
+    role = normalize_role(raw_role)
+    if role:
+        # Sin rol en auth_user se deja que get_supabase_role use el fallback por grupos
+        user.role = role
+        setattr(user, REQUEST_ROLE_ATTR, role)
+    return user
+
+
+class RoleRefreshToken(RefreshToken):
+    """RefreshToken que agrega rol e id_empresa al access token derivado.
+
+    Los claims no se guardan en el refresh token: se recalculan cada vez que se
+    emite un access token (login o /api/token/refresh/).
+    """
+    no_copy_claims = RefreshToken.no_copy_claims + (ROLE_CLAIM, EMPRESA_CLAIM, ROLE_VERSION_CLAIM)
+
+    _claims_user = None
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token._claims_user = user
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        if not role_claims_enabled():
+            return access
+
+        user = self._claims_user
+        if user is None:
+            user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+            if user_id is None:
+                return access
+            # Instancia sin consultar: get_supabase_role/get_supabase_empresa_id solo usan el id
+            user = get_user_model()(**{api_settings.USER_ID_FIELD: user_id})
+
+        try:
+            for claim, value in build_role_claims(user).items():
+                access[claim] = value
+        except Exception as e:
+            logger.warning(f"No se pudieron agregar los claims de rol al token: {e}")
+        return access
+
+
+class RoleClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication que expone role e id_empresa del token en request.user.
+
+    Si el token trae los claims y su versión de rol sigue vigente, no se consulta
+    la BD para el rol ni para la empresa. Si el rol cambió desde que se emitió el
+    token, se responde TOKEN_STALE para que el cliente lo refresque. Si la versión
+    no está en cache (descartada o cache caída) tampoco se puede confiar en los
+    claims: también es TOKEN_STALE, y el refresh crea una versión nueva.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+
+        if not role_claims_enabled() or ROLE_CLAIM not in validated_token.payload:
+            return load_user_context(user)
+
+        current_version = get_role_version(user.id)
+        if current_version is None or validated_token.payload.get(ROLE_VERSION_CLAIM) != current_version:
+            raise AuthenticationFailed({
+                "error_code": "TOKEN_STALE",
+                "detail": "Tu rol cambió. Actualiza el token con /api/token/refresh/.",
+            })
+
+        role = validated_token[ROLE_CLAIM]
+        id_empresa = validated_token.payload.get(EMPRESA_CLAIM)
+        user.role = role
+        user.id_empresa = id_empresa
+        setattr(user, REQUEST_ROLE_ATTR, role)
+        setattr(user, REQUEST_EMPRESA_ATTR, id_empresa)
+        return user
+
+
+class UserContextTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication que precarga role/empresa del usuario (ver load_user_context)."""
+
+    def authenticate_credentials(self, key):
+        user, token = super().authenticate_credentials(key)
+        return load_user_context(user), token
+
+
+class UserContextSessionAuthentication(SessionAuthentication):
+    """SessionAuthentication que precarga role/empresa del usuario (ver load_user_context)."""
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is None:
+            return None
+        user, auth = result
+        return load_user_context(user), auth
@@ -0,0 +1,226 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteCache(BaseCache):
+    """Cache en un archivo SQLite compartido por todos los procesos del host.
+
+    Pensada para despliegues de un solo servidor con varios workers de gunicorn:
+    no necesita servicios externos y add/incr son atómicos entre procesos
+    (BEGIN IMMEDIATE toma el lock de escritura de SQLite).
+
+    LOCATION es la ruta del archivo. Usa WAL para que las lecturas no bloqueen.
+    """
+
+    # Cada cuántas escrituras (por proceso) se limpian las claves expiradas
+    cull_every = 200
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    # ----------------------------
+    # Conexión
+    # ----------------------------
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        # Una conexión abierta antes de un fork no se comparte con el proceso hijo
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # isolation_level=None: las transacciones se manejan a mano
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._ensure_table(conn)
+        return conn
+
+    def _ensure_table(self, conn):
+        if self._initialized:
+            return
+        with self._init_lock:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires)")
+            self._initialized = True
+
+    def _expiry(self, timeout):
+        # get_backend_timeout ya devuelve el instante absoluto de expiración (o None)
+        return self.get_backend_timeout(timeout)
+
+    def _fetch(self, conn, key, now):
+        row = conn.execute("SELECT value, expires FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return None
+        return row
+
+    def _after_write(self, conn):
+        with self._writes_lock:
+            self._writes += 1
+            should_cull = self._writes % self.cull_every == 0
+        if should_cull:
+            self._cull(conn)
+
+    def _cull(self, conn):
+        try:
+            conn.execute("DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+            count = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+            if count > self._max_entries:
+                # Igual que los backends de Django: se descarta 1/CULL_FREQUENCY de las entradas
+                to_delete = count // self._cull_frequency if self._cull_frequency else count
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE key IN "
+                    "(SELECT key FROM cache_entries ORDER BY expires IS NULL, expires LIMIT ?)",
+                    (to_delete,),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudo limpiar la cache SQLite: {e}")
+
+    # ----------------------------
+    # API de cache de Django
+    # ----------------------------
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._fetch(conn, key, now) is not None:
+                conn.execute("COMMIT")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)",
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expiry(timeout)),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_write(conn)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._fetch(self._connection(), key, time.time())
+        if row is None:
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        if not keys:
+            return {}
+        key_map = {self.make_and_validate_key(k, version=version): k for k in keys}
+        placeholders = ",".join("?" for _ in key_map)
+        rows = self._connection().execute(
+            f"SELECT key, value, expires FROM cache_entries WHERE key IN ({placeholders})",
+            list(key_map),
+        ).fetchall()
+        now = time.time()
+        return {
+            key_map[key]: pickle.loads(value)
+            for key, value, expires in rows
+            if expires is None or expires > now
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expiry(timeout)),
+        )
+        self._after_write(conn)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            "UPDATE cache_entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (self._expiry(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(k, version=version) for k in keys]
+        if keys:
+            placeholders = ",".join("?" for _ in keys)
+            self._connection().execute(f"DELETE FROM cache_entries WHERE key IN ({placeholders})", keys)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._fetch(self._connection(), key, time.time()) is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._fetch(conn, key, time.time())
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            new_value = pickle.loads(row[0]) + delta
+            conn.execute(
+                "UPDATE cache_entries SET value = ? WHERE key = ?",
+                (pickle.dumps(new_value, pickle.HIGHEST_PROTOCOL), key),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return new_value
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache_entries")
+
+    def close(self, **kwargs):
+        # Conexión por hilo reutilizable: no se cierra al final de cada request
+        pass
+
+
+def probe_cache(alias):
+    """Escribe, lee y borra una clave de prueba. Devuelve estado y latencia (ms)."""
+    result = {"alias": alias, "ok": False, "latency_ms": None, "backend": None, "error": None}
+    try:
+        cache = caches[alias]
+        result["backend"] = f"{cache.__class__.__module__}.{cache.__class__.__name__}"
+        key = f"health:{uuid.uuid4().hex}"
+        start = time.perf_counter()
+        cache.set(key, 1, 30)
+        ok = cache.get(key) == 1
+        cache.delete(key)
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        result["ok"] = ok
+        if not ok:
+            result["error"] = "La clave escrita no se pudo leer"
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def probe_caches(aliases=None):
+    return [probe_cache(alias) for alias in (aliases or settings.CACHES.keys())]
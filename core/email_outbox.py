@@ -0,0 +1,255 @@
+import base64
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def _provider_for_new_email():
+    # SendGrid (HTTPS) si hay API key, igual que el envío directo; si no, SMTP
+    if getattr(settings, "SENDGRID_API_KEY", None):
+        return EmailOutbox.PROVIDER_SENDGRID
+    return EmailOutbox.PROVIDER_SMTP
+
+
+def encode_attachments(attachments):
+    """[(filename, content, mimetype)] -> lista serializable en JSON (contenido en base64)."""
+    encoded = []
+    for filename, content, mimetype in attachments or []:
+        if content is None:
+            continue
+        raw_bytes = content.encode("utf-8") if isinstance(content, str) else bytes(content)
+        encoded.append({
+            "filename": filename or "attachment",
+            "content": base64.b64encode(raw_bytes).decode("ascii"),
+            "mimetype": mimetype or "application/octet-stream",
+        })
+    return encoded
+
+
+def decode_attachments(encoded):
+    return [
+        (item["filename"], base64.b64decode(item["content"]), item["mimetype"])
+        for item in encoded or []
+    ]
+
+
+def enqueue_email(subject, message, recipient_list, html_message="", from_email=None, attachments=None,
+                  substitutions=None):
+    """Guarda el correo en el outbox y despierta al dispatcher al confirmar la transacción."""
+    entry = EmailOutbox.objects.create(
+        provider=_provider_for_new_email(),
+        subject=(subject or "")[:255],
+        message=message or "",
+        html_message=html_message or "",
+        from_email=from_email or getattr(settings, "DEFAULT_FROM_EMAIL", "") or "",
+        recipients=list(recipient_list or []),
+        attachments=encode_attachments(attachments),
+        substitutions=substitutions or {},
+        max_attempts=getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 5),
+    )
+    logger.info("Correo encolado #%s: %s -> %s", entry.id, subject, recipient_list)
+    if getattr(settings, "EMAIL_OUTBOX_IN_PROCESS", True):
+        transaction.on_commit(lambda: get_dispatcher().wake())
+    return entry
+
+
+def _retry_delay(attempts):
+    base = float(getattr(settings, "EMAIL_RETRY_BACKOFF_SECONDS", 1.0)) * 30
+    max_delay = float(getattr(settings, "EMAIL_OUTBOX_MAX_RETRY_DELAY", 3600))
+    return timedelta(seconds=min(max_delay, base * (2 ** max(0, attempts - 1))))
+
+
+class OutboxDispatcher:
+    """Entrega los correos del outbox con un pool de hilos acotado.
+
+    - Reclama filas vencidas con un UPDATE condicional (seguro entre procesos).
+    - Límite de envíos simultáneos por proveedor (EMAIL_OUTBOX_PROVIDER_CONCURRENCY).
+    - Reintentos con backoff exponencial; al agotar max_attempts la fila queda "dead".
+    - Filas "sending" abandonadas (worker reiniciado) se recuperan tras EMAIL_OUTBOX_STALE_SECONDS.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or getattr(settings, "EMAIL_OUTBOX_WORKERS", 4)
+        self.poll_seconds = getattr(settings, "EMAIL_OUTBOX_POLL_SECONDS", 5)
+        self.stale_seconds = getattr(settings, "EMAIL_OUTBOX_STALE_SECONDS", 300)
+        concurrency = getattr(settings, "EMAIL_OUTBOX_PROVIDER_CONCURRENCY", {})
+        self._provider_slots = {
+            provider: threading.BoundedSemaphore(concurrency.get(provider, self.workers))
+            for provider, _ in EmailOutbox.PROVIDER_CHOICES
+        }
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="email-outbox")
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    # ----------------------------
+    # Ciclo de vida
+    # ----------------------------
+    def start(self):
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name="email-outbox-loop", daemon=True)
+            self._thread.start()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self._wake.set()
+        self._pool.shutdown(wait=wait)
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                logger.error(f"Error en el dispatcher del outbox: {e}")
+                claimed = 0
+            finally:
+                close_old_connections()
+            # Si hubo trabajo se vuelve a consultar de inmediato; si no, se espera
+            if not claimed:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def run_once(self, wait=False):
+        """Reclama tantas filas vencidas como hilos libres haya y las entrega."""
+        with self._in_flight_lock:
+            free_slots = self.workers - self._in_flight
+        futures = []
+        for entry in self._claim(free_slots):
+            with self._in_flight_lock:
+                self._in_flight += 1
+            futures.append(self._pool.submit(self._process, entry))
+        if wait:
+            for future in futures:
+                future.result()
+        return len(futures)
+
+    # ----------------------------
+    # Reclamo y entrega
+    # ----------------------------
+    def _claim(self, limit):
+        if limit <= 0:
+            return []
+        now = timezone.now()
+        stale_before = now - timedelta(seconds=self.stale_seconds)
+        due = EmailOutbox.objects.filter(
+            status=EmailOutbox.STATUS_PENDING, next_attempt_at__lte=now
+        ).order_by("next_attempt_at").values_list("id", "status", "locked_at")[:limit]
+        stale = EmailOutbox.objects.filter(
+            status=EmailOutbox.STATUS_SENDING, locked_at__lt=stale_before
+        ).values_list("id", "status", "locked_at")[:limit]
+
+        claimed_ids = []
+        for entry_id, status, locked_at in list(due) + list(stale):
+            if len(claimed_ids) >= limit:
+                break
+            # UPDATE condicional: solo un proceso gana cada fila
+            won = EmailOutbox.objects.filter(id=entry_id, status=status, locked_at=locked_at).update(
+                status=EmailOutbox.STATUS_SENDING, locked_at=now
+            )
+            if won:
+                claimed_ids.append(entry_id)
+        return list(EmailOutbox.objects.filter(id__in=claimed_ids))
+
+    def _process(self, entry):
+        slot = self._provider_slots.get(entry.provider) or self._provider_slots[EmailOutbox.PROVIDER_SMTP]
+        try:
+            with slot:
+                self._deliver(entry)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight -= 1
+            close_old_connections()
+
+    def _release(self, entry, **fields):
+        """Guarda el resultado solo si la fila sigue reclamada por este worker.
+
+        Si tardó más de EMAIL_OUTBOX_STALE_SECONDS otro worker pudo reclamarla (locked_at
+        cambió): ese es ahora el dueño y su resultado no se pisa. Devuelve False en ese caso.
+        """
+        owned = EmailOutbox.objects.filter(id=entry.id, locked_at=entry.locked_at).update(locked_at=None, **fields)
+        if not owned:
+            logger.warning(f"Correo #{entry.id}: otro worker lo reclamó mientras se enviaba; no se actualiza")
+        return bool(owned)
+
+    def _deliver(self, entry):
+        from .email_service import DeliveryError, deliver_email
+
+        try:
+            deliver_email(
+                subject=entry.subject,
+                message=entry.message,
+                html_message=entry.html_message,
+                recipient_list=entry.recipients,
+                from_email=entry.from_email or None,
+                attachments=decode_attachments(entry.attachments),
+                provider=entry.provider,
+                substitutions=entry.substitutions,
+            )
+        except Exception as e:
+            attempts = entry.attempts + 1
+            recipients = entry.recipients
+            if isinstance(e, DeliveryError):
+                # Los que ya recibieron el correo (lotes de SendGrid, mensajes SMTP) no se reintentan
+                recipients = list(e.pending)
+            if attempts >= entry.max_attempts:
+                status, next_attempt_at = EmailOutbox.STATUS_DEAD, timezone.now()
+                logger.error(f"Correo #{entry.id} descartado tras {attempts} intentos: {e}")
+            else:
+                status, next_attempt_at = EmailOutbox.STATUS_PENDING, timezone.now() + _retry_delay(attempts)
+                logger.warning(f"Correo #{entry.id} falló (intento {attempts}), reintento {next_attempt_at}: {e}")
+            self._release(
+                entry,
+                status=status,
+                recipients=recipients,
+                attempts=attempts,
+                next_attempt_at=next_attempt_at,
+                last_error=str(e)[:2000],
+            )
+            return False
+
+        return self._release(
+            entry,
+            status=EmailOutbox.STATUS_SENT,
+            attempts=entry.attempts + 1,
+            sent_at=timezone.now(),
+            last_error="",
+        )
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Dispatcher del proceso (se crea al primer uso)."""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = OutboxDispatcher()
+    return _dispatcher
+
+
+def start_dispatcher():
+    """Arranca el dispatcher en este proceso (p.ej. desde gunicorn post_worker_init)."""
+    if getattr(settings, "EMAIL_OUTBOX_IN_PROCESS", True):
+        get_dispatcher().start()
@@ -1,62 +1,127 @@
 import logging
-import threading
 import time
 import base64
 from html import escape
 
 from django.conf import settings
-from django.core.mail import send_mail
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
-from sendgrid.helpers.mail import Attachment, FileContent, FileName, FileType, Disposition
+from django.core.mail import EmailMultiAlternatives
+from sendgrid.helpers.mail import Email
+from .email_outbox import enqueue_email
 from .email_templates import render_email_template
+from .sendgrid_client import get_sendgrid_client
+from .smtp_pool import SMTPSendError, get_smtp_pool
 
 logger = logging.getLogger(__name__)
 
 
-def _send_via_sendgrid(subject, message, html_message, recipient_list, from_email=None, attachments=None):
+# SendGrid acepta hasta 1000 personalizations por request
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+
+class DeliveryError(RuntimeError):
+    """Falló una entrega; pending son los destinatarios que aún no recibieron el correo."""
+
+    def __init__(self, message, pending):
+        super().__init__(message)
+        self.pending = pending
+
+
+class SendGridBatchError(DeliveryError):
+    """Falló un lote de SendGrid (los lotes anteriores ya se entregaron)."""
+
+
+def substitution_tag(key):
+    """Marca que se reemplaza por destinatario, p.ej. -nombre-."""
+    return f"-{key}-"
+
+
+def apply_substitutions(text, values):
+    for key, value in (values or {}).items():
+        text = text.replace(substitution_tag(key), str(value))
+    return text
+
+
+def _sendgrid_attachments(attachments):
+    # Se codifican una sola vez y el mismo bloque se reutiliza en todos los lotes
+    encoded = []
+    for filename, content, mimetype in attachments or []:
+        if content is None:
+            continue
+        raw_bytes = content.encode("utf-8") if isinstance(content, str) else bytes(content)
+        encoded.append({
+            "content": base64.b64encode(raw_bytes).decode("ascii"),
+            "filename": filename or "attachment",
+            "type": mimetype or "application/octet-stream",
+            "disposition": "attachment",
+        })
+    return encoded
+
+
+def _sendgrid_personalization(recipient, values):
+    personalization = {"to": [{"email": recipient}]}
+    if values:
+        personalization["substitutions"] = {
+            substitution_tag(key): str(value) for key, value in values.items()
+        }
+    return personalization
+
+
+def _send_via_sendgrid(subject, message, html_message, recipient_list, from_email=None, attachments=None,
+                       substitutions=None):
+    """Envía por SendGrid agrupando destinatarios en lotes de personalizations.
+
+    Cada destinatario va en su propia personalization (nadie ve a los demás) y puede
+    llevar sus propias sustituciones: substitutions = {email: {"nombre": "Ana"}}.
+    """
     api_key = getattr(settings, "SENDGRID_API_KEY", None)
     from_email = from_email or getattr(settings, "DEFAULT_FROM_EMAIL", None)
 
     if not api_key:
         return False
 
-    sg = SendGridAPIClient(api_key)
-    print(f"📮 SendGrid intento de envío: {subject} -> {recipient_list}")
-    for recipient in recipient_list:
-        mail = Mail(
-            from_email=from_email,
-            to_emails=recipient,
-            subject=subject,
-            plain_text_content=message or "",
-            html_content=html_message or "",
-        )
-
-        for item in attachments or []:
-            filename, content, mimetype = item
-            if content is None:
-                continue
-            if isinstance(content, str):
-                raw_bytes = content.encode("utf-8")
-            else:
-                raw_bytes = bytes(content)
-
-            encoded = base64.b64encode(raw_bytes).decode("ascii")
-            mail.attachment = Attachment(
-                FileContent(encoded),
-                FileName(filename or "attachment"),
-                FileType(mimetype or "application/octet-stream"),
-                Disposition("attachment"),
-            )
-
-        response = sg.send(mail)
-        if not 200 <= int(response.status_code) < 300:
-            raise RuntimeError(
-                f"SendGrid returned status {response.status_code} for {recipient}"
+    recipients = list(dict.fromkeys(recipient_list or []))
+    substitutions = substitutions or {}
+    batch_size = max(1, min(
+        SENDGRID_MAX_PERSONALIZATIONS,
+        int(getattr(settings, "SENDGRID_BATCH_SIZE", SENDGRID_MAX_PERSONALIZATIONS)),
+    ))
+
+    content = []
+    if message:
+        content.append({"type": "text/plain", "value": message})
+    if html_message:
+        content.append({"type": "text/html", "value": html_message})
+    base_payload = {
+        "from": Email(from_email).get(),
+        "subject": subject,
+        "content": content or [{"type": "text/plain", "value": " "}],
+    }
+    encoded_attachments = _sendgrid_attachments(attachments)
+    if encoded_attachments:
+        base_payload["attachments"] = encoded_attachments
+
+    # Cliente compartido del proceso: reutiliza la conexión TLS (keep-alive) entre envíos
+    sg = get_sendgrid_client()
+    print(f"📮 SendGrid intento de envío: {subject} -> {len(recipients)} destinatario(s)")
+    for start in range(0, len(recipients), batch_size):
+        batch = recipients[start:start + batch_size]
+        payload = dict(base_payload)
+        payload["personalizations"] = [
+            _sendgrid_personalization(recipient, substitutions.get(recipient)) for recipient in batch
+        ]
+        try:
+            response = sg.send(payload)
+            status_code = int(response.status_code)
+        except Exception as e:
+            raise SendGridBatchError(f"SendGrid request failed: {e}", recipients[start:]) from e
+        if not 200 <= status_code < 300:
+            raise SendGridBatchError(
+                f"SendGrid returned status {status_code} for batch {start // batch_size + 1}",
+                recipients[start:],
             )
 
-    logger.info("SendGrid email sent: %s -> %s", subject, recipient_list)
-    print(f"✅ SendGrid envió correo: {subject} -> {recipient_list}")
+    logger.info("SendGrid email sent: %s -> %s recipient(s) (pool: %s)", subject, len(recipients), sg.stats())
+    print(f"✅ SendGrid envió correo: {subject} -> {len(recipients)} destinatario(s)")
     return True
 
 
@@ -92,6 +157,22 @@ def _build_branded_html(subject, message):
         """
 
 
+def _send_via_smtp_pool(subject, message, html_message, recipient_list, from_email=None, fail_silently=False):
+    # Reutiliza una conexión SMTP ya autenticada en lugar de abrir una por mensaje
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=message or "",
+        from_email=from_email or getattr(settings, "DEFAULT_FROM_EMAIL", None),
+        to=list(recipient_list),
+    )
+    if html_message:
+        email.attach_alternative(html_message, "text/html")
+    pool = get_smtp_pool()
+    sent = pool.send_messages([email], fail_silently=fail_silently)
+    logger.debug("SMTP pool: %s", pool.stats())
+    return sent
+
+
 def _send_with_retry(send_fn, fail_silently, context_label):
     max_retries = max(0, int(getattr(settings, "EMAIL_MAX_RETRIES", 2)))
     backoff_seconds = float(getattr(settings, "EMAIL_RETRY_BACKOFF_SECONDS", 1.0))
@@ -141,14 +222,7 @@ def send_plain_email(subject, message, recipient_list, fail_silently=False, asyn
 
         def _do_send():
             branded_html = _build_branded_html(subject, message)
-            sent = send_mail(
-                subject=subject,
-                message=message,
-                from_email=getattr(settings, "DEFAULT_FROM_EMAIL", None),
-                recipient_list=recipient_list,
-                html_message=branded_html,
-                fail_silently=fail_silently,
-            )
+            sent = _send_via_smtp_pool(subject, message, branded_html, recipient_list, fail_silently=fail_silently)
             if sent:
                 logger.info("Email sent: %s -> %s", subject, recipient_list)
             else:
@@ -173,7 +247,12 @@ def send_plain_email(subject, message, recipient_list, fail_silently=False, asyn
             raise
 
     if async_send:
-        threading.Thread(target=_send, daemon=False).start()
+        enqueue_email(
+            subject=subject,
+            message=message,
+            html_message=_build_branded_html(subject, message),
+            recipient_list=recipient_list,
+        )
         return True
 
     return _send()
@@ -199,14 +278,7 @@ def send_html_email(subject, html_message, recipient_list, message="", fail_sile
             print("🔎 Proveedor correo seleccionado: SMTP (SENDGRID_API_KEY no configurada)")
 
         def _do_send():
-            sent = send_mail(
-                subject=subject,
-                message=message,
-                from_email=getattr(settings, "DEFAULT_FROM_EMAIL", None),
-                recipient_list=recipient_list,
-                html_message=html_message,
-                fail_silently=fail_silently,
-            )
+            sent = _send_via_smtp_pool(subject, message, html_message, recipient_list, fail_silently=fail_silently)
             if sent:
                 logger.info("HTML email sent: %s -> %s", subject, recipient_list)
             else:
@@ -231,78 +303,163 @@ def send_html_email(subject, html_message, recipient_list, message="", fail_sile
             raise
 
     if async_send:
-        threading.Thread(target=_send, daemon=False).start()
+        enqueue_email(
+            subject=subject,
+            message=message,
+            html_message=html_message,
+            recipient_list=recipient_list,
+        )
         return True
 
     return _send()
 
 
 def send_message_async(email_message):
-    """Send a Django EmailMessage instance in a background thread."""
+    """Encola una instancia de EmailMessage de Django en el outbox (HTML y adjuntos incluidos)."""
+    recipients = list(getattr(email_message, "to", []) or [])
+    subject = getattr(email_message, "subject", "Notificacion Talento Hub")
+    message = getattr(email_message, "body", "")
+    if not recipients:
+        raise ValueError("EmailMessage has no recipients")
+
+    attachments = []
+    for att in getattr(email_message, "attachments", []) or []:
+        # Django normalmente usa tuplas: (filename, content, mimetype)
+        if isinstance(att, (tuple, list)) and len(att) >= 3:
+            attachments.append((att[0], att[1], att[2]))
+        elif isinstance(att, (tuple, list)) and len(att) == 2:
+            attachments.append((att[0], att[1], "application/octet-stream"))
+
+    html_message = ""
+    for alt in getattr(email_message, "alternatives", []) or []:
+        mimetype = getattr(alt, "mimetype", None)
+        content = getattr(alt, "content", None)
+        if mimetype is None and isinstance(alt, (tuple, list)) and len(alt) >= 2:
+            content, mimetype = alt[0], alt[1]
+        if mimetype == "text/html":
+            html_message = content or ""
+            break
+
+    enqueue_email(
+        subject=subject,
+        message=message,
+        html_message=html_message or _build_branded_html(subject, message),
+        recipient_list=recipients,
+        from_email=getattr(email_message, "from_email", None),
+        attachments=attachments,
+    )
+    return True
 
-    def _send():
-        def _do_send():
-            recipients = list(getattr(email_message, "to", []) or [])
-            subject = getattr(email_message, "subject", "Notificacion Talento Hub")
-            message = getattr(email_message, "body", "")
-            from_email = getattr(email_message, "from_email", None)
-            sendgrid_attachments = []
-
-            if not recipients:
-                raise ValueError("EmailMessage has no recipients")
-
-            # Priorizar SendGrid en producción para evitar bloqueos SMTP en Render.
-            if getattr(settings, "SENDGRID_API_KEY", None):
-                for att in getattr(email_message, "attachments", []) or []:
-                    # Django normalmente usa tuplas: (filename, content, mimetype)
-                    if isinstance(att, (tuple, list)) and len(att) >= 3:
-                        sendgrid_attachments.append((att[0], att[1], att[2]))
-                    elif isinstance(att, (tuple, list)) and len(att) == 2:
-                        sendgrid_attachments.append((att[0], att[1], "application/octet-stream"))
-
-                html_message = ""
-                for alt in getattr(email_message, "alternatives", []) or []:
-                    mimetype = getattr(alt, "mimetype", None)
-                    content = getattr(alt, "content", None)
-                    if mimetype is None and isinstance(alt, (tuple, list)) and len(alt) >= 2:
-                        content, mimetype = alt[0], alt[1]
-                    if mimetype == "text/html":
-                        html_message = content or ""
-                        break
-
-                if not html_message:
-                    html_message = _build_branded_html(subject, message)
-
-                _send_via_sendgrid(
-                    subject=subject,
-                    message=message,
-                    html_message=html_message,
-                    recipient_list=recipients,
-                    from_email=from_email,
-                    attachments=sendgrid_attachments,
-                )
-                logger.info("EmailMessage sent via SendGrid to %s", recipients)
-                if sendgrid_attachments:
-                    print(f"📎 SendGrid adjuntos enviados: {[a[0] for a in sendgrid_attachments]}")
-                return True
 
-            email_message.send(fail_silently=False)
-            logger.info("EmailMessage sent via SMTP to %s", recipients)
-            return True
+def deliver_email(subject, message, html_message, recipient_list, from_email=None, attachments=None, provider=None,
+                  substitutions=None):
+    """Un intento de entrega (lo usa el outbox, que se encarga de los reintentos).
 
-        _send_with_retry(_do_send, fail_silently=True, context_label="email_message_async")
+    Con provider "sendgrid" intenta SendGrid y, si falla, SMTP solo para los destinatarios
+    pendientes; con "smtp" va directo a SMTP. Si el intento falla lanza DeliveryError con
+    los destinatarios que todavía no recibieron el correo.
+    """
+    recipient_list = list(recipient_list)
+    if provider == "sendgrid" and getattr(settings, "SENDGRID_API_KEY", None):
+        try:
+            return _send_via_sendgrid(
+                subject, message, html_message, recipient_list, from_email, attachments, substitutions
+            )
+        except SendGridBatchError as e:
+            logger.exception("Primary SendGrid delivery failed for %s; falling back to SMTP", subject)
+            recipient_list = e.pending
+        except Exception:
+            logger.exception("Primary SendGrid delivery failed for %s; falling back to SMTP", subject)
 
-    threading.Thread(target=_send, daemon=False).start()
+    from_email = from_email or getattr(settings, "DEFAULT_FROM_EMAIL", None)
 
+    def _build(to, values=None):
+        email = EmailMultiAlternatives(
+            subject=apply_substitutions(subject, values),
+            body=apply_substitutions(message or "", values),
+            from_email=from_email,
+            to=to,
+        )
+        if html_message:
+            email.attach_alternative(apply_substitutions(html_message, values), "text/html")
+        for filename, content, mimetype in attachments or []:
+            email.attach(filename, content, mimetype)
+        return email
+
+    if substitutions:
+        # Un mensaje por destinatario con sus valores, todos por la misma conexión SMTP
+        messages = [_build([recipient], substitutions.get(recipient)) for recipient in recipient_list]
+    else:
+        messages = [_build(recipient_list)]
+    pool = get_smtp_pool()
+    try:
+        sent = pool.send_messages(messages)
+    except SMTPSendError as e:
+        # Con un mensaje por destinatario se sabe quiénes ya lo recibieron
+        pending = recipient_list[e.done:] if substitutions else recipient_list
+        raise DeliveryError(f"SMTP send failed: {e}", pending) from e
+    except Exception as e:
+        raise DeliveryError(f"SMTP send failed: {e}", recipient_list) from e
+    if not sent:
+        raise DeliveryError(f"Email not sent (0 messages): {subject} -> {recipient_list}", recipient_list)
+    logger.info("Email sent via SMTP: %s -> %s (pool: %s)", subject, recipient_list, pool.stats())
+    return True
 
-def send_template_email(template_key, recipient_list, context=None, fail_silently=False, async_send=False):
-    merged_context = {
+
+def send_bulk_email(subject, message, recipient_list, html_message="", substitutions=None, attachments=None,
+                    async_send=True):
+    """Mismo correo a muchos destinatarios, personalizado con substitutions = {email: {clave: valor}}.
+
+    Las claves se escriben en el asunto/cuerpo como -clave- (ver substitution_tag); si se pasa
+    html_message propio, los valores que lleve deben venir ya escapados. Por SendGrid
+    sale en lotes de hasta 1000 destinatarios por request y los adjuntos se codifican una vez.
+    """
+    if not html_message:
+        html_message = _build_branded_html(subject, message)
+        if substitutions:
+            # El HTML usa sus propias marcas con los valores escapados (nombres con < o & incluidos)
+            keys = {key for values in substitutions.values() for key in (values or {})}
+            for key in keys:
+                html_message = html_message.replace(substitution_tag(key), substitution_tag(f"{key}_html"))
+            substitutions = {
+                recipient: dict(values, **{f"{key}_html": escape(str(value)) for key, value in values.items()})
+                for recipient, values in substitutions.items()
+                if values
+            }
+    if async_send:
+        enqueue_email(
+            subject=subject,
+            message=message,
+            html_message=html_message,
+            recipient_list=recipient_list,
+            attachments=attachments,
+            substitutions=substitutions,
+        )
+        return True
+
+    return deliver_email(
+        subject=subject,
+        message=message,
+        html_message=html_message,
+        recipient_list=recipient_list,
+        attachments=attachments,
+        provider="sendgrid",
+        substitutions=substitutions,
+    )
+
+
+def _static_template_context():
+    # Valores fijos del proceso: se incrustan en la plantilla compilada (bloque del logo, soporte)
+    return {
         "logo_url": getattr(settings, "TALENTOHUB_LOGO_URL", ""),
         "support_email": getattr(settings, "DEFAULT_FROM_EMAIL", ""),
     }
-    merged_context.update(context or {})
 
-    subject, text, html = render_email_template(template_key, merged_context)
+
+def send_template_email(template_key, recipient_list, context=None, fail_silently=False, async_send=False):
+    subject, text, html = render_email_template(
+        template_key, context, static_context=_static_template_context()
+    )
     if html:
         return send_html_email(
             subject=subject,
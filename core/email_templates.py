@@ -1,3 +1,7 @@
+from functools import lru_cache
+from string import Formatter
+
+
 class SafeDict(dict):
     def __missing__(self, key):
         return "{" + key + "}"
@@ -121,12 +125,707 @@ Si no fuiste tu, por favor contacta al administrador.
 
 Saludos,
 Sistema de Gestion de Candidatos
+""",
+    },
+    # Cambios de estado de una postulación (solo texto; el HTML lo arma send_plain_email).
+    # Contexto: ver ESTADO_POSTULACION_TEMPLATES y views._contexto_correo_estado.
+    "estado_postulado": {
+        "subject": "✅ Confirmación de postulación - {vacante} | {empresa}",
+        "text": """Estimado/a {nombre},
+
+Hemos registrado correctamente tu postulación.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📊 RESUMEN DE TU POSTULACIÓN
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🏢 Empresa: {empresa}
+💼 Vacante: {vacante}
+🔄 Estado actual: POSTULADO ✅
+📅 Fecha de actualización: {fecha_actualizacion}
+🆔 ID de Postulación: #{postulacion_id}
+
+Gracias por confiar en Talento Hub. Te notificaremos cuando haya avances en tu proceso.
+
+Atentamente,
+Equipo de Gestión de Talento Humano
+{empresa}
+""",
+    },
+    "estado_en_revision": {
+        "subject": "🔍 Tu postulación está en revisión - {vacante} | {empresa}",
+        "text": """Estimado/a {nombre},
+
+¡Buenas noticias! Tu postulación ha avanzado a la siguiente etapa.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📊 ACTUALIZACIÓN DE ESTADO
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🏢 Empresa: {empresa}
+💼 Puesto: {vacante}
+📍 Ubicación: {ubicacion}
+🔄 Estado actual: EN REVISIÓN 🔍
+📅 Fecha de actualización: {fecha_actualizacion}
+🆔 ID de Postulación: #{postulacion_id}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+🎯 ¿QUÉ SIGNIFICA ESTO?
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Tu perfil profesional está siendo evaluado detalladamente por nuestro equipo de Recursos Humanos.
+
+Estamos revisando:
+✓ Tu experiencia laboral y trayectoria profesional
+✓ Tus habilidades técnicas y competencias
+✓ Tu formación académica y certificaciones
+✓ La compatibilidad de tu perfil con los requisitos del puesto
+✓ Referencias y recomendaciones (si aplica)
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+⏰ TIEMPOS ESTIMADOS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+📆 Duración de revisión: 3 a 5 días hábiles
+🔔 Próxima comunicación: Si tu perfil es seleccionado, te contactaremos directamente
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+💡 MIENTRAS ESPERAS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+📱 Mantén activos tus medios de contacto (teléfono y correo)
+📧 Revisa tu bandeja de entrada y spam regularmente
+📄 Ten lista tu documentación actualizada
+🏢 Investiga más sobre {empresa}, su misión, visión y valores
+💪 Prepárate mentalmente para posibles entrevistas
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Agradecemos tu paciencia durante este proceso. Te mantendremos informado/a sobre cualquier avance.
+
+¡Mucho éxito!
+
+Atentamente,
+
+Equipo de Gestión de Talento Humano
+{empresa}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Sistema de Gestión de Candidatos | TalentoHub
+Correo generado automáticamente el {fecha_actualizacion}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+""",
+    },
+    "estado_entrevista": {
+        "subject": "🎉 ¡Felicitaciones! Has sido seleccionado para entrevista - {vacante}",
+        "text": """Estimado/a {nombre},
+
+¡EXCELENTES NOTICIAS! 🎊
+
+Tu perfil ha destacado entre los candidatos y hemos decidido continuar con tu proceso de selección.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+🎯 ACTUALIZACIÓN DE ESTADO
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🏢 Empresa: {empresa}
+💼 Puesto: {vacante}
+📍 Ubicación: {ubicacion}
+🏠 Modalidad: {modalidad}
+🔄 Estado actual: SELECCIONADO PARA ENTREVISTA ⭐
+📅 Fecha de actualización: {fecha_actualizacion}
+🆔 ID de Postulación: #{postulacion_id}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📞 PRÓXIMOS PASOS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+⏰ CONTACTO INMEDIATO
+Nuestro equipo de Recursos Humanos se comunicará contigo en las próximas 24-48 horas para:
+
+✓ Confirmar tu interés y disponibilidad
+✓ Coordinar fecha y hora de la entrevista
+✓ Definir modalidad (presencial, virtual o telefónica)
+✓ Proporcionar detalles sobre el proceso
+✓ Indicar duración estimada de la entrevista
+✓ Presentar a las personas que te entrevistarán
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📝 PREPÁRATE PARA LA ENTREVISTA
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🏢 INVESTIGA LA EMPRESA
+• Conoce la historia, misión y visión de {empresa}
+• Revisa sus productos/servicios principales
+• Identifica sus valores corporativos y cultura organizacional
+• Consulta sus redes sociales y sitio web oficial
+
+💼 PREPARA TU PRESENTACIÓN
+• Repasa tu experiencia laboral más relevante
+• Identifica 3-5 logros profesionales clave
+• Prepara ejemplos concretos de situaciones laborales (método STAR)
+• Ten claro por qué quieres trabajar en {empresa}
+
+❓ PREPARA PREGUNTAS INTELIGENTES
+• Sobre el puesto y sus responsabilidades
+• Sobre el equipo de trabajo y la cultura
+• Sobre oportunidades de crecimiento profesional
+• Sobre los retos del puesto
+
+📄 DOCUMENTACIÓN REQUERIDA
+• Copia impresa o digital de tu CV actualizado
+• Portafolio de proyectos (si aplica para el puesto)
+• Certificados de estudios y capacitaciones
+• Referencias laborales disponibles
+
+💻 SI ES ENTREVISTA VIRTUAL
+• Verifica tu conexión a internet
+• Prueba tu cámara y micrófono
+• Busca un lugar tranquilo e iluminado
+• Ten instalado Zoom/Teams/Google Meet
+• Viste de manera profesional (incluso si es virtual)
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+💡 CONSEJOS CLAVE
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+✓ Sé puntual (llega 10-15 minutos antes)
+✓ Mantén contacto visual y lenguaje corporal positivo
+✓ Responde con sinceridad y seguridad
+✓ Escucha activamente las preguntas
+✓ Sé tú mismo/a y muestra tu entusiasmo
+✓ Apaga tu teléfono o ponlo en silencio
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Estamos emocionados de conocerte mejor y explorar cómo puedes contribuir a {empresa}.
+
+¡Te deseamos mucho éxito en tu entrevista!
+
+Atentamente,
+
+Equipo de Gestión de Talento Humano
+{empresa}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Sistema de Gestión de Candidatos | TalentoHub
+Correo generado automáticamente el {fecha_actualizacion}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+""",
+    },
+    "estado_proceso_contratacion": {
+        "subject": "🎊 ¡FELICITACIONES! Iniciamos tu proceso de contratación - {vacante}",
+        "text": """Estimado/a {nombre},
+
+¡EXCELENTES NOTICIAS! 🎉🎉🎉
+
+Después de un riguroso proceso de selección, nos complace informarte que HAS SIDO SELECCIONADO/A para formar parte de nuestro equipo.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+🌟 ACTUALIZACIÓN DE ESTADO
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🏢 Empresa: {empresa}
+💼 Puesto: {vacante}
+📍 Ubicación: {ubicacion}
+🏠 Modalidad: {modalidad}
+⏰ Jornada: {tipo_jornada}
+💰 Salario: {salario}
+🔄 Estado actual: PROCESO DE CONTRATACIÓN 📋✅
+📅 Fecha de selección: {fecha_actualizacion}
+🆔 ID de Postulación: #{postulacion_id}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📋 DOCUMENTACIÓN REQUERIDA (URGENTE)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Por favor, reúne y prepara los siguientes documentos ORIGINALES y COPIAS:
+
+📄 IDENTIFICACIÓN PERSONAL
+✓ Documento de identidad vigente (DPI/Cédula/Pasaporte)
+✓ Partida de nacimiento certificada (si aplica)
+✓ 2 fotografías tamaño cédula recientes a color
+
+👨‍🎓 FORMACIÓN ACADÉMICA
+✓ Títulos universitarios certificados
+✓ Diplomas de estudios superiores
+✓ Certificados de capacitaciones y cursos
+✓ Constancias de idiomas (si aplica)
+
+💼 EXPERIENCIA LABORAL
+✓ Cartas de recomendación laboral (mínimo 2)
+✓ Certificados de trabajo de empleos anteriores
+✓ Hoja de vida actualizada y detallada
+
+🏥 DOCUMENTOS MÉDICOS Y LEGALES
+✓ Certificado médico de buena salud (reciente)
+✓ Antecedentes penales actualizados
+✓ Antecedentes policiacos
+✓ Constancia de afiliación al seguro social (si aplica)
+
+🏦 INFORMACIÓN BANCARIA
+✓ Estado de cuenta bancaria reciente
+✓ Número de cuenta para depósitos (si aplica)
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📝 PASOS A SEGUIR
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+PASO 1️⃣: REVISIÓN Y FIRMA DE CONTRATO (Próximos 3-5 días)
+• Recibirás tu contrato de trabajo para revisión
+• Lee cuidadosamente todos los términos y condiciones
+• Consulta cualquier duda antes de firmar
+• Firma y devuelve el contrato en los plazos indicados
+
+PASO 2️⃣: ENTREGA DE DOCUMENTACIÓN (Plazo: 5 días hábiles)
+• Entrega toda la documentación requerida completa
+• Asegúrate de que todas las copias sean legibles
+• Organiza los documentos según la lista proporcionada
+
+PASO 3️⃣: PROCESO DE ONBOARDING
+• Completarás formularios administrativos internos
+• Recibirás información sobre políticas de la empresa
+• Conocerás los beneficios y prestaciones
+
+PASO 4️⃣: INDUCCIÓN CORPORATIVA (Fecha por confirmar)
+• Programa de bienvenida e integración
+• Capacitación sobre sistemas y procesos
+• Presentación del equipo de trabajo
+• Recorrido por las instalaciones
+
+PASO 5️⃣: INICIO DE LABORES
+• Confirmaremos tu fecha de inicio oficial
+• Recibirás tu equipo de trabajo y credenciales
+• Comenzarás tu plan de entrenamiento específico
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+⏰ PLAZOS IMPORTANTES
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🚨 CRÍTICO: Debes entregar toda la documentación dentro de los próximos 5 DÍAS HÁBILES para no retrasar tu proceso de incorporación.
+
+Si tienes dificultades para conseguir algún documento, comunícate inmediatamente con RRHH.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📞 CONTACTO Y SEGUIMIENTO
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Para cualquier consulta, duda o información adicional:
+
+📧 Responde a este correo electrónico
+📱 Contacta al Departamento de Recursos Humanos de {empresa}
+⏰ Horario de atención: Lunes a Viernes, 8:00 AM - 5:00 PM
+
+Nuestro equipo está disponible para apoyarte en todo el proceso.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+¡Bienvenido/a a la familia {empresa}!
+
+Estamos emocionados de que comiences esta nueva etapa profesional con nosotros. Tu talento, experiencia y dedicación serán fundamentales para alcanzar nuestros objetivos.
+
+Confiamos en que esta será una relación laboral exitosa y mutuamente beneficiosa.
+
+¡Nos vemos pronto!
+
+Atentamente,
+
+Equipo de Gestión de Talento Humano
+{empresa}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Sistema de Gestión de Candidatos | TalentoHub
+Correo generado automáticamente el {fecha_actualizacion}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+""",
+    },
+    "estado_contratado": {
+        "subject": "🎉 ¡BIENVENIDO/A AL EQUIPO! Tu contratación está completa - {empresa}",
+        "text": """Estimado/a {nombre},
+
+🎊 ¡FELICITACIONES! 🎊
+
+Tu proceso de contratación ha sido completado exitosamente. Oficialmente eres parte del equipo de {empresa}.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+🌟 CONFIRMACIÓN DE CONTRATACIÓN
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🎉 BIENVENIDO/A A {empresa_mayus} 🎉
+
+🏢 Empresa: {empresa}
+💼 Tu puesto: {vacante}
+📍 Ubicación: {ubicacion}
+🏠 Modalidad: {modalidad}
+⏰ Jornada laboral: {tipo_jornada}
+🔄 Estado: CONTRATADO ✅
+📅 Fecha de contratación: {fecha_actualizacion}
+🆔 ID de Empleado: Por asignar por RRHH
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📅 INICIO DE LABORES
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Nuestro equipo de Recursos Humanos se comunicará contigo en las PRÓXIMAS HORAS para:
+
+✓ Confirmar tu fecha exacta de inicio
+✓ Coordinar tu sesión de inducción corporativa
+✓ Entregarte credenciales y accesos a sistemas
+✓ Asignarte tu equipo de trabajo (computadora, teléfono, etc.)
+✓ Presentarte oficialmente a tu equipo de trabajo
+✓ Programar tu recorrido por las instalaciones
+✓ Entregarte tu contrato firmado y documentación oficial
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📋 TU PRIMER DÍA
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+PROGRAMA DE INDUCCIÓN INTEGRAL:
+
+🏢 BIENVENIDA CORPORATIVA (9:00 AM)
+• Recepción oficial por parte del equipo de RRHH
+• Presentación de la empresa, historia y valores
+• Entrega de kit de bienvenida
+• Firma de documentos finales
+
+👥 INTEGRACIÓN AL EQUIPO (10:30 AM)
+• Presentación con tu jefe inmediato
+• Conoce a tus compañeros de equipo
+• Tour por tu área de trabajo
+• Asignación de tu espacio laboral
+
+💻 CONFIGURACIÓN TECNOLÓGICA (12:00 PM)
+• Entrega de equipo de cómputo y herramientas
+• Creación de cuentas y credenciales
+• Capacitación en sistemas internos
+• Acceso a plataformas corporativas
+
+🎓 CAPACITACIÓN INICIAL (2:00 PM)
+• Políticas y procedimientos internos
+• Normas de seguridad y salud ocupacional
+• Beneficios y prestaciones de ley
+• Código de conducta y ética profesional
+
+📍 RECORRIDO GENERAL (4:00 PM)
+• Conoce todas las instalaciones
+• Ubicación de áreas importantes
+• Presentación con otros departamentos
+• Información sobre servicios disponibles
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+💼 DOCUMENTACIÓN IMPORTANTE
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Asegúrate de tener lista y COMPLETA la siguiente documentación para tu primer día:
+
+✓ Documento de identidad original
+✓ Fotos tamaño cédula (2 adicionales)
+✓ Comprobante de domicilio reciente
+✓ Documentación académica certificada
+✓ Certificado médico de buena salud
+✓ Referencias laborales originales
+✓ Cualquier otro documento pendiente
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+🎯 EXPECTATIVAS Y OBJETIVOS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Durante tus primeras semanas en {empresa}:
+
+SEMANA 1-2: ADAPTACIÓN
+• Conocer procesos y metodologías de trabajo
+• Familiarizarte con herramientas y sistemas
+• Establecer relaciones con tu equipo
+• Comprender tu rol y responsabilidades
+
+SEMANA 3-4: INTEGRACIÓN
+• Participar activamente en proyectos
+• Aplicar conocimientos adquiridos
+• Comenzar a generar resultados
+• Recibir retroalimentación constante
+
+MES 2-3: PRODUCTIVIDAD
+• Trabajar de manera autónoma
+• Contribuir significativamente al equipo
+• Proponer mejoras e innovaciones
+• Alcanzar objetivos establecidos
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+💡 CONSEJOS PARA TU ÉXITO
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+✓ Sé puntual desde el primer día
+✓ Mantén una actitud positiva y proactiva
+✓ Haz preguntas cuando tengas dudas
+✓ Toma notas durante las capacitaciones
+✓ Conoce y respeta la cultura organizacional
+✓ Sé amable y respetuoso con todos
+✓ Demuestra tu compromiso y profesionalismo
+✓ Aprende continuamente y adapta-te rápido
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📞 CONTACTO
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Para cualquier consulta antes de tu inicio:
+
+📧 Responde a este correo
+📱 Contacta a Recursos Humanos
+⏰ Disponibilidad: Lunes a Viernes, 8:00 AM - 5:00 PM
+
+Estamos aquí para apoyarte en tu integración.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+{primer_nombre}, estamos verdaderamente emocionados de tenerte en nuestro equipo. Tu experiencia, habilidades y talento serán un gran aporte para {empresa}.
+
+Confiamos en que esta será una relación laboral exitosa, productiva y llena de crecimiento profesional.
+
+¡Bienvenido/a a la familia {empresa}!
+
+¡Nos vemos muy pronto!
+
+Con entusiasmo,
+
+Equipo de Gestión de Talento Humano
+{empresa}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Sistema de Gestión de Candidatos | TalentoHub
+Correo generado automáticamente el {fecha_actualizacion}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+""",
+    },
+    "estado_rechazado": {
+        "subject": "Actualización sobre tu postulación - {vacante} | {empresa}",
+        "text": """Estimado/a {nombre},
+
+Esperamos que te encuentres muy bien.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📊 ACTUALIZACIÓN DE TU POSTULACIÓN
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🏢 Empresa: {empresa}
+💼 Puesto aplicado: {vacante}
+📅 Fecha de postulación: {fecha_postulacion}
+📅 Fecha de esta actualización: {fecha_actualizacion}
+🆔 ID de Postulación: #{postulacion_id}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+💬 RESULTADO DEL PROCESO
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Queremos agradecerte sinceramente por tu interés en formar parte de {empresa} y por el tiempo que dedicaste a nuestro proceso de selección.
+
+Después de una cuidadosa y exhaustiva evaluación de todos los candidatos, hemos tomado la difícil decisión de continuar con otros perfiles cuya experiencia y habilidades se ajustan de manera más específica a los requisitos particulares de esta posición.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+💡 IMPORTANTE: ESTA NO ES UNA EVALUACIÓN DE TU VALOR
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Queremos enfatizar que esta decisión NO refleja tu valor como profesional ni cuestiona tus capacidades y competencias.
+
+El proceso de selección involucra múltiples factores:
+• Requisitos muy específicos del puesto
+• Experiencia en áreas particulares
+• Disponibilidad inmediata
+• Compatibilidad cultural y organizacional
+• Nivel de especialización requerido
+• Presupuesto y estructura salarial
+• Necesidades estratégicas del momento
+
+En ocasiones, la decisión se basa en detalles muy específicos que no necesariamente reflejan la calidad de tu perfil profesional.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+🔄 FUTURAS OPORTUNIDADES
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+¡No pierdas el ánimo! Valoramos tu perfil y queremos que sepas que:
+
+✓ TU PERFIL PERMANECE ACTIVO en nuestra base de datos de talento
+✓ Serás CONSIDERADO AUTOMÁTICAMENTE para futuras vacantes que coincidan con tu experiencia
+✓ Te INVITAMOS a postularte nuevamente a otras posiciones que publiquemos
+✓ Mantendremos TU INFORMACIÓN actualizada por 12 meses
+✓ Podrás ACTUALIZAR tu perfil en cualquier momento
+
+Te animamos a:
+• Revisar regularmente nuestras ofertas de empleo
+• Seguirnos en redes sociales profesionales
+• Visitar nuestro portal de carreras
+• Mantenerte atento a nuevas oportunidades
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📈 RECOMENDACIONES PARA TU DESARROLLO PROFESIONAL
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Mientras continúas tu búsqueda laboral, te sugerimos:
+
+🎓 FORMACIÓN CONTINUA
+• Actualiza tus conocimientos técnicos
+• Obtén certificaciones reconocidas en tu área
+• Participa en cursos y talleres especializados
+• Aprende nuevas tecnologías y herramientas
+
+💼 DESARROLLO DE HABILIDADES
+• Fortalece tus soft skills (comunicación, liderazgo, trabajo en equipo)
+• Desarrolla habilidades digitales
+• Mejora tu dominio de idiomas
+• Practica entrevistas y presentaciones
+
+📄 OPTIMIZA TU PERFIL PROFESIONAL
+• Actualiza constantemente tu CV y portafolio
+• Mantén activo tu perfil en LinkedIn y otras plataformas
+• Solicita recomendaciones de empleadores anteriores
+• Documenta tus logros y proyectos exitosos
+
+🌐 NETWORKING
+• Asiste a eventos profesionales de tu sector
+• Conecta con profesionales de tu área
+• Participa en comunidades y grupos especializados
+• Mantén relaciones profesionales activas
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+🙏 NUESTRO AGRADECIMIENTO
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Valoramos profundamente:
+• El tiempo que invertiste en nuestro proceso
+• Tu interés genuino en {empresa}
+• La información y documentación que compartiste
+• Tu profesionalismo durante todo el proceso
+
+Fue un placer conocer tu trayectoria y perfil profesional.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+{primer_nombre}, te deseamos el mayor de los éxitos en tu búsqueda laboral y en todos tus proyectos profesionales futuros.
+
+Estamos seguros de que encontrarás una excelente oportunidad donde tu talento, experiencia y dedicación serán plenamente aprovechados y valorados.
+
+Las puertas de {empresa} permanecen abiertas para futuras oportunidades.
+
+¡Mucho éxito!
+
+Con los mejores deseos,
+
+Equipo de Gestión de Talento Humano
+{empresa}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Sistema de Gestión de Candidatos | TalentoHub
+Correo generado automáticamente el {fecha_actualizacion}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 """,
     },
 }
 
+# Estado de la postulación -> plantilla del correo que recibe el candidato
+ESTADO_POSTULACION_TEMPLATES = {
+    "Postulado": "estado_postulado",
+    "En revisión": "estado_en_revision",
+    "Entrevista": "estado_entrevista",
+    "Proceso de contratacion": "estado_proceso_contratacion",
+    "Contratado": "estado_contratado",
+    "Rechazado": "estado_rechazado",
+}
+
+
+class CompiledTemplate:
+    """Plantilla parseada una sola vez: segmentos literales y huecos a rellenar.
+
+    Renderizar es unir la lista de partes, sin volver a parsear el string. Los
+    valores faltantes se dejan como "{clave}", igual que format_map con SafeDict.
+    """
+    __slots__ = ("parts", "fallback_source")
+
+    def __init__(self, source, static_context=None):
+        static_context = static_context or {}
+        self.fallback_source = None
+        parts = []
+        literal = []
+        try:
+            parsed = list(Formatter().parse(source))
+        except ValueError:
+            parsed = None
+
+        for text, field, spec, conversion in parsed or ():
+            literal.append(text)
+            if field is None:
+                continue
+            if not field.isidentifier():
+                # Acceso por atributo/índice ("a.b", "a[0]"): se deja a format_map
+                self.fallback_source = source
+                break
+            if field in static_context and not spec and not conversion:
+                # Fragmento estático (logo, email de soporte): se inserta al compilar
+                literal.append(str(static_context[field]))
+                continue
+            parts.append("".join(literal))
+            literal = []
+            parts.append((field, conversion, spec))
+        parts.append("".join(literal))
+
+        if parsed is None:
+            self.fallback_source = source
+        self.parts = tuple(parts)
+
+    def render(self, context):
+        if self.fallback_source is not None:
+            return self.fallback_source.format_map(SafeDict(context))
+        out = []
+        for part in self.parts:
+            if part.__class__ is str:
+                out.append(part)
+                continue
+            field, conversion, spec = part
+            if field not in context:
+                out.append("{" + field + "}")
+                continue
+            value = context[field]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "a":
+                value = ascii(value)
+            elif conversion == "s":
+                value = str(value)
+            out.append(format(value, spec) if spec else (value if value.__class__ is str else format(value)))
+        return "".join(out)
+
+
+@lru_cache(maxsize=None)
+def get_compiled_template(template_key, static_items=()):
+    """Compila (una vez por clave y contexto estático) subject, text y html."""
+    template = EMAIL_TEMPLATES.get(template_key)
+    if not template:
+        raise ValueError(f"Template '{template_key}' no existe")
+    static_context = dict(static_items)
+    html = template.get("html")
+    return (
+        CompiledTemplate(template["subject"], static_context),
+        CompiledTemplate(template.get("text", ""), static_context),
+        CompiledTemplate(html, static_context) if html else None,
+    )
+
+
+def render_email_template(template_key, context=None, static_context=None):
+    """Renderiza una plantilla de EMAIL_TEMPLATES.
+
+    static_context son valores fijos del proceso (logo, email de soporte) que se
+    incrustan al compilar; context tiene prioridad sobre ellos.
+    """
+    context = context or {}
+    static_items = ()
+    if static_context:
+        static_items = tuple(sorted(
+            (key, value) for key, value in static_context.items() if key not in context
+        ))
+    subject, text, html = get_compiled_template(template_key, static_items)
+    return subject.render(context), text.render(context), html.render(context) if html else None
+
 
-def render_email_template(template_key, context=None):
+def render_email_template_format_map(template_key, context=None):
+    """Render original con format_map (se mantiene como referencia para el benchmark)."""
     template = EMAIL_TEMPLATES.get(template_key)
     if not template:
         raise ValueError(f"Template '{template_key}' no existe")
@@ -0,0 +1,71 @@
+import logging
+
+from django.db.models import OuterRef, Subquery
+
+from .models import PostulacionEvento
+
+logger = logging.getLogger(__name__)
+
+
+def _actor_id(actor):
+    return getattr(actor, "id", None) if actor is not None else None
+
+
+def registrar_evento(postulacion_id, tipo, actor=None, resumen="", **datos):
+    """Agrega un evento al historial de la postulación (un INSERT, sin leer la fila)."""
+    return PostulacionEvento.objects.create(
+        postulacion_id=postulacion_id,
+        tipo=tipo,
+        actor_id=_actor_id(actor),
+        resumen=(resumen or "")[:255],
+        datos=datos,
+    )
+
+
+def registrar_cambios_estado(cambios, nuevo_estado, actor=None):
+    """Un evento de cambio de estado por cada (postulacion_id, estado_anterior), en un solo INSERT."""
+    eventos = [
+        PostulacionEvento(
+            postulacion_id=postulacion_id,
+            tipo=PostulacionEvento.TIPO_CAMBIO_ESTADO,
+            actor_id=_actor_id(actor),
+            resumen=f"{estado_anterior} → {nuevo_estado}"[:255],
+            datos={"anterior": estado_anterior, "nuevo": nuevo_estado},
+        )
+        for postulacion_id, estado_anterior in cambios
+    ]
+    return PostulacionEvento.objects.bulk_create(eventos, batch_size=500)
+
+
+def con_ultimo_evento(queryset):
+    """Anota tipo, resumen y fecha del último evento (subconsultas sobre core_post_evento_idx)."""
+    ultimo = PostulacionEvento.objects.filter(postulacion=OuterRef("pk")).order_by("-id")
+    return queryset.annotate(
+        ultimo_evento_tipo=Subquery(ultimo.values("tipo")[:1]),
+        ultimo_evento_resumen=Subquery(ultimo.values("resumen")[:1]),
+        ultimo_evento_fecha=Subquery(ultimo.values("creado_en")[:1]),
+    )
+
+
+def resumen_ultimo_evento(postulacion):
+    """Resumen para listados; requiere un queryset pasado por con_ultimo_evento."""
+    tipo = getattr(postulacion, "ultimo_evento_tipo", None)
+    if not tipo:
+        return None
+    return {
+        "tipo": tipo,
+        "resumen": postulacion.ultimo_evento_resumen,
+        "fecha": postulacion.ultimo_evento_fecha,
+    }
+
+
+def serializar_evento(evento):
+    return {
+        "id": evento.id,
+        "tipo": evento.tipo,
+        "resumen": evento.resumen,
+        "fecha": evento.creado_en,
+        "actor_id": evento.actor_id,
+        "actor_email": evento.actor.email if evento.actor_id and evento.actor else None,
+        "datos": evento.datos,
+    }
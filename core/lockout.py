@@ -0,0 +1,98 @@
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class BaseLockoutBackend:
+    """Interfaz de los backends de bloqueo por intentos fallidos de login.
+
+    Los tiempos se manejan como epoch (segundos) para que cualquier backend
+    pueda guardarlos sin serializar datetimes.
+    """
+
+    def __init__(self):
+        self.max_attempts = getattr(settings, 'MAX_FAILED_LOGINS', 3)
+        self.lock_seconds = getattr(settings, 'ACCOUNT_LOCK_MINUTES', 5) * 60
+        self.attempt_window = getattr(settings, 'FAILED_LOGIN_WINDOW_SECONDS', 3600)
+
+    def get_lock_until(self, username):
+        """Epoch hasta el que el usuario está bloqueado, o None si no lo está."""
+        raise NotImplementedError
+
+    def record_failure(self, username):
+        """Registra un intento fallido. Devuelve (intentos, lock_until o None)."""
+        raise NotImplementedError
+
+    def reset(self, username):
+        """Limpia intentos y bloqueo tras un login exitoso."""
+        raise NotImplementedError
+
+    def claim_lock_notification(self, username, lock_until):
+        """True solo la primera vez por periodo de bloqueo (para avisar al usuario una vez)."""
+        raise NotImplementedError
+
+
+class CacheLockoutBackend(BaseLockoutBackend):
+    """Guarda los contadores en la cache de Django con incr atómico y expiración nativa.
+
+    Con una cache compartida (Redis, BD) el límite aplica a todos los workers y
+    cada chequeo cuesta lo mismo sin importar cuántos usuarios hayan fallado.
+    """
+    prefix = 'login_lockout'
+
+    def __init__(self):
+        super().__init__()
+        self.cache = caches[getattr(settings, 'LOGIN_LOCKOUT_CACHE', 'default')]
+
+    def _key(self, kind, username):
+        # Hash del username normalizado: claves cortas y válidas en cualquier backend
+        digest = hashlib.sha256(str(username).strip().lower().encode('utf-8')).hexdigest()[:32]
+        return f'{self.prefix}:{kind}:{digest}'
+
+    def get_lock_until(self, username):
+        lock_until = self.cache.get(self._key('lock', username))
+        if lock_until and lock_until > time.time():
+            return lock_until
+        return None
+
+    def record_failure(self, username):
+        failures_key = self._key('failures', username)
+        # add() solo crea la clave si no existe; incr() es atómico en el backend
+        self.cache.add(failures_key, 0, self.attempt_window)
+        try:
+            count = self.cache.incr(failures_key)
+        except ValueError:
+            # La clave expiró entre add() e incr()
+            self.cache.set(failures_key, 1, self.attempt_window)
+            count = 1
+        # La ventana cuenta desde el último intento fallido
+        self.cache.touch(failures_key, self.attempt_window)
+
+        if count < self.max_attempts:
+            return count, None
+
+        lock_until = time.time() + self.lock_seconds
+        self.cache.set(self._key('lock', username), lock_until, self.lock_seconds)
+        # Al terminar el bloqueo se empieza a contar de cero
+        self.cache.delete(failures_key)
+        logger.warning(f'Usuario {username} BLOQUEADO por {self.lock_seconds // 60} minutos')
+        return count, lock_until
+
+    def reset(self, username):
+        self.cache.delete_many([self._key('failures', username), self._key('lock', username)])
+
+    def claim_lock_notification(self, username, lock_until):
+        ttl = max(1, int(lock_until - time.time()))
+        # add() es atómico: entre varios workers solo uno obtiene True
+        return self.cache.add(self._key('notified', username), lock_until, ttl)
+
+
+def get_lockout_backend():
+    backend_path = getattr(settings, 'LOGIN_LOCKOUT_BACKEND', 'core.lockout.CacheLockoutBackend')
+    return import_string(backend_path)()
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache_backends import probe_caches
+from core.metrics import metrics_cache_stats
+from core.roles import role_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Prueba escritura/lectura en cada cache configurada y muestra la latencia."
+
+    def add_arguments(self, parser):
+        parser.add_argument("aliases", nargs="*", help="Alias de CACHES a probar (por defecto todos)")
+
+    def handle(self, *args, **options):
+        aliases = options["aliases"] or None
+        self.stdout.write(f"CACHE_BACKEND={getattr(settings, 'CACHE_BACKEND', None)}")
+
+        failed = False
+        for probe in probe_caches(aliases):
+            if probe["ok"]:
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ {probe['alias']}: {probe['latency_ms']} ms ({probe['backend']})"
+                ))
+            else:
+                failed = True
+                self.stdout.write(self.style.ERROR(
+                    f"❌ {probe['alias']}: {probe['error']} ({probe['backend']})"
+                ))
+
+        self.stdout.write(f"Roles (este proceso): {role_cache_stats()}")
+        self.stdout.write(f"Métricas (este proceso): {metrics_cache_stats()}")
+        if failed:
+            raise CommandError("Una o más caches no respondieron correctamente.")
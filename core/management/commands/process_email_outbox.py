@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.email_outbox import OutboxDispatcher
+from core.models import EmailOutbox
+from core.sendgrid_client import sendgrid_client_stats
+from core.smtp_pool import get_smtp_pool, smtp_pool_stats
+
+
+class Command(BaseCommand):
+    help = "Entrega los correos pendientes del outbox con un pool de hilos acotado."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Procesar lo pendiente y salir")
+        parser.add_argument("--workers", type=int, default=None, help="Hilos de envío (EMAIL_OUTBOX_WORKERS)")
+
+    def handle(self, *args, **options):
+        dispatcher = OutboxDispatcher(workers=options["workers"])
+
+        if options["once"]:
+            total = 0
+            while True:
+                processed = dispatcher.run_once(wait=True)
+                if not processed:
+                    break
+                total += processed
+            dispatcher.stop()
+            get_smtp_pool().close_all()
+            self._summary(total)
+            return
+
+        self.stdout.write(f"📮 Outbox: {dispatcher.workers} hilos, Ctrl+C para salir")
+        dispatcher.start()
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            dispatcher.stop()
+            get_smtp_pool().close_all()
+            self._connection_stats()
+
+    def _summary(self, total):
+        pending = EmailOutbox.objects.filter(status=EmailOutbox.STATUS_PENDING).count()
+        dead = EmailOutbox.objects.filter(status=EmailOutbox.STATUS_DEAD).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Procesados: {total} | pendientes (reintento programado): {pending} | dead: {dead}"
+        ))
+        self._connection_stats()
+
+    def _connection_stats(self):
+        # Reutilización de conexiones en este proceso: abiertas vs mensajes/requests
+        self.stdout.write(f"SMTP: {smtp_pool_stats()}")
+        self.stdout.write(f"SendGrid: {sendgrid_client_stats()}")
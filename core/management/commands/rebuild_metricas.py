@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.metrics import reconstruir_metricas
+
+
+class Command(BaseCommand):
+    help = "Recalcula el rollup diario de métricas (core_metricas_postulacion_diaria) desde las postulaciones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--vacante", type=int, default=None, help="Reconstruir solo esta vacante")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Filas por INSERT")
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        escritas = reconstruir_metricas(vacante_id=options["vacante"], chunk_size=options["chunk_size"])
+        alcance = f"vacante {options['vacante']}" if options["vacante"] else "todas las vacantes"
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Rollup reconstruido ({alcance}): {escritas} fila(s) en {time.monotonic() - inicio:.2f}s"
+        ))
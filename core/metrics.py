@@ -0,0 +1,503 @@
+import csv
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import MetricaPostulacionDiaria, Postulacion, Vacante
+
+logger = logging.getLogger(__name__)
+
+# Tamaño aproximado (caracteres) de cada bloque que se envía al exportar en streaming
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+METRICS_VERSION_KEY = "metrics_version"
+METRICS_MODIFIED_KEY = "metrics_modified_at"
+METRICS_RESPONSE_KEY = "metrics_dashboard:v{version}:{params}"
+METRICS_FILTERS_KEY = "metrics_filtros:v{version}"
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+EXPORT_HEADER = [
+    'vacante_id', 'titulo', 'empresa_id', 'empresa_nombre',
+    'total_postulaciones', 'ultima_postulacion', 'estado', 'estado_count',
+]
+
+
+def _a_dia(valor):
+    """'yyyy-mm-dd' (o ISO datetime) -> date. Valores inválidos se ignoran."""
+    if not valor:
+        return None
+    if isinstance(valor, datetime):
+        return timezone.localdate(valor) if timezone.is_aware(valor) else valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        dia = parse_date(valor)
+        if dia is None:
+            fecha = parse_datetime(valor)
+            dia = _a_dia(fecha) if fecha else None
+        return dia
+    except ValueError:
+        return None
+
+
+def metricas_por_vacante(vacante_id=None, area=None, fecha_from=None, fecha_to=None):
+    """Métricas de postulaciones por vacante leídas del rollup diario.
+
+    Un GROUP BY (vacante, estado) sobre core_vacantes LEFT JOIN
+    core_metricas_postulacion_diaria, que luego se pivota en Python: el costo depende
+    de los días con postulaciones, no del número de postulaciones. from/to filtran por
+    día (ambos inclusive). Las vacantes sin postulaciones en el rango también aparecen,
+    con total 0.
+    """
+    return list(pivotar_metricas(_consulta_metricas(vacante_id, area, fecha_from, fecha_to)))
+
+
+def iterar_metricas(vacante_id=None, area=None, fecha_from=None, fecha_to=None, chunk_size=2000):
+    """Igual que metricas_por_vacante pero vacante a vacante, leyendo con un cursor del
+    servidor (.iterator): la memoria no crece con el tamaño de la exportación."""
+    filas = _consulta_metricas(vacante_id, area, fecha_from, fecha_to).iterator(chunk_size=chunk_size)
+    return pivotar_metricas(filas)
+
+
+def _consulta_metricas(vacante_id, area, fecha_from, fecha_to):
+    vacantes = Vacante.objects.all()
+    if vacante_id is not None:
+        vacantes = vacantes.filter(id=vacante_id)
+    if area:
+        vacantes = vacantes.filter(ubicacion__icontains=area)
+
+    # Los filtros de fecha van en el agregado (no en el WHERE) para no perder vacantes vacías
+    rango = Q()
+    dia_from, dia_to = _a_dia(fecha_from), _a_dia(fecha_to)
+    if dia_from:
+        rango &= Q(metricas_diarias__dia__gte=dia_from)
+    if dia_to:
+        rango &= Q(metricas_diarias__dia__lte=dia_to)
+
+    filas = (
+        vacantes.values('id', 'titulo', 'id_empresa_id', 'id_empresa__nombre', 'metricas_diarias__estado')
+        .annotate(
+            count=Sum('metricas_diarias__total', filter=rango),
+            last=Max('metricas_diarias__ultima', filter=rango),
+        )
+        .order_by('id')
+    )
+    return filas
+
+
+def _cache():
+    return caches[getattr(settings, "METRICS_CACHE_ALIAS", "default")]
+
+
+def _count(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def metrics_cache_stats():
+    """Contadores del proceso actual: aciertos, fallos y respuestas 304."""
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats["hits"] + stats["misses"]
+    stats["total"] = total
+    stats["hit_rate"] = round(stats["hits"] / total, 4) if total else 0.0
+    return stats
+
+
+def reset_metrics_cache_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+def get_metrics_version():
+    """Versión de las métricas; cambia con cada escritura de postulaciones."""
+    try:
+        return int(_cache().get(METRICS_VERSION_KEY) or 0)
+    except Exception:
+        return 0
+
+
+def bump_metrics_version():
+    try:
+        cache = _cache()
+        cache.set(METRICS_MODIFIED_KEY, time.time(), None)
+        try:
+            return cache.incr(METRICS_VERSION_KEY)
+        except ValueError:
+            # La clave no existe todavía: crearla sin expiración
+            if cache.add(METRICS_VERSION_KEY, 1, None):
+                return 1
+            return cache.incr(METRICS_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"No se pudo incrementar la versión de métricas: {e}")
+        return None
+
+
+def _invalidar_al_confirmar():
+    # Después del COMMIT: antes, otra petición podría cachear los datos viejos con la versión nueva
+    transaction.on_commit(bump_metrics_version)
+
+
+def normalizar_parametros(vacante_id=None, area=None, fecha_from=None, fecha_to=None):
+    """Parámetros equivalentes dan la misma clave: fechas a día, área sin mayúsculas ni espacios."""
+    dia_from, dia_to = _a_dia(fecha_from), _a_dia(fecha_to)
+    return {
+        "vacante_id": vacante_id,
+        "area": (area or "").strip().lower() or None,
+        "from": dia_from.isoformat() if dia_from else None,
+        "to": dia_to.isoformat() if dia_to else None,
+    }
+
+
+def metricas_dashboard_cacheadas(vacante_id=None, area=None, fecha_from=None, fecha_to=None):
+    """Respuesta de metrics_dashboard desde la cache de métricas.
+
+    Devuelve (entrada, hit) con entrada = {"data", "etag", "last_modified"}. La clave
+    incluye la versión de métricas, así que una escritura deja obsoletas todas las
+    respuestas sin tener que borrarlas. El ETag es un hash del contenido: si tras una
+    escritura los números no cambian, el cliente sigue recibiendo 304.
+
+    El endpoint es público: solo se cachean filtros que corresponden a datos existentes
+    (ver acotar_parametros), para que el query string no cree claves sin límite.
+    """
+    params = normalizar_parametros(vacante_id, area, fecha_from, fecha_to)
+    version = get_metrics_version()
+    cacheable = acotar_parametros(params, version)
+    params_json = json.dumps(params, sort_keys=True)
+    key = METRICS_RESPONSE_KEY.format(
+        version=version,
+        params=hashlib.sha1(params_json.encode("utf-8")).hexdigest(),
+    )
+
+    try:
+        entrada = _cache().get(key) if cacheable else None
+    except Exception:
+        entrada = None
+    if entrada is not None:
+        _count("hits")
+        return entrada, True
+
+    _count("misses")
+    data = {"vacantes": metricas_por_vacante(
+        vacante_id=params["vacante_id"], area=params["area"],
+        fecha_from=params["from"], fecha_to=params["to"],
+    )}
+    contenido = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    try:
+        last_modified = _cache().get(METRICS_MODIFIED_KEY)
+    except Exception:
+        last_modified = None
+    entrada = {
+        "data": data,
+        "etag": '"%s"' % hashlib.sha1(contenido.encode("utf-8")).hexdigest(),
+        "last_modified": int(last_modified or time.time()),
+    }
+    if not cacheable:
+        return entrada, False
+    try:
+        _cache().set(key, entrada, getattr(settings, "METRICS_CACHE_TTL", 300))
+    except Exception as e:
+        logger.warning(f"No se pudo guardar la respuesta de métricas en cache: {e}")
+    return entrada, False
+
+
+def _valores_conocidos(version):
+    """Áreas, vacantes y rango de días con datos; se calcula una vez por versión de métricas."""
+    key = METRICS_FILTERS_KEY.format(version=version)
+    try:
+        valores = _cache().get(key)
+    except Exception:
+        valores = None
+    if valores is not None:
+        return valores
+
+    ubicaciones = Vacante.objects.values_list('ubicacion', flat=True).distinct()
+    rango = MetricaPostulacionDiaria.objects.aggregate(desde=Min('dia'), hasta=Max('dia'))
+    valores = {
+        "areas": {normalizar_parametros(area=ubicacion)["area"] for ubicacion in ubicaciones} - {None},
+        "vacantes": set(Vacante.objects.values_list('id', flat=True)),
+        "desde": rango["desde"],
+        "hasta": rango["hasta"],
+    }
+    try:
+        _cache().set(key, valores, getattr(settings, "METRICS_CACHE_TTL", 300))
+    except Exception as e:
+        logger.warning(f"No se pudieron guardar los filtros de métricas en cache: {e}")
+    return valores
+
+
+def acotar_parametros(params, version):
+    """Acota (en el sitio) los filtros normalizados a los datos existentes.
+
+    Devuelve False si el área o la vacante no existen: esa respuesta no se cachea. Las
+    fechas fuera del rango con datos dan el mismo resultado que el borde, así que se
+    llevan a él (o a None). Un área o vacante nueva se cachea desde la próxima versión.
+    """
+    if not any(params.values()):
+        return True
+    conocidos = _valores_conocidos(version)
+    if params["area"] is not None and params["area"] not in conocidos["areas"]:
+        return False
+    if params["vacante_id"] is not None and params["vacante_id"] not in conocidos["vacantes"]:
+        return False
+
+    desde, hasta = conocidos["desde"], conocidos["hasta"]
+    if desde is None:
+        # Sin postulaciones en el rollup las fechas no cambian el resultado
+        params["from"] = params["to"] = None
+        return True
+    if params["from"]:
+        dia = date.fromisoformat(params["from"])
+        params["from"] = None if dia <= desde else min(dia, hasta + timedelta(days=1)).isoformat()
+    if params["to"]:
+        dia = date.fromisoformat(params["to"])
+        params["to"] = None if dia >= hasta else max(dia, desde - timedelta(days=1)).isoformat()
+    return True
+
+
+def registrar_metricas_304():
+    _count("not_modified")
+
+
+def _sumar(vacante_id, estado, dia, cantidad, ultima=None):
+    """total += cantidad en la fila (vacante, estado, día); la crea si no existe."""
+    filas = MetricaPostulacionDiaria.objects.filter(vacante_id=vacante_id, estado=estado, dia=dia)
+    cambios = {"total": F("total") + cantidad}
+    if ultima is not None:
+        cambios["ultima"] = Case(
+            When(Q(ultima__isnull=True) | Q(ultima__lt=ultima), then=Value(ultima)),
+            default=F("ultima"),
+        )
+    if filas.update(**cambios):
+        return
+    if cantidad < 0:
+        # No debería pasar si el rollup está al día; se corrige con rebuild_metricas
+        logger.warning(f"⚠️ Rollup sin fila para vacante {vacante_id} {dia} '{estado}'")
+        return
+    try:
+        with transaction.atomic():
+            MetricaPostulacionDiaria.objects.create(
+                vacante_id=vacante_id, estado=estado, dia=dia, total=cantidad, ultima=ultima
+            )
+    except IntegrityError:
+        # Otra petición creó la fila entre el UPDATE y el INSERT
+        filas.update(**cambios)
+
+
+def registrar_postulacion_metricas(postulacion):
+    """+1 en el día de la postulación para su estado. Llamar dentro de la transacción del INSERT."""
+    if not postulacion.vacante_id or not postulacion.fecha_postulacion:
+        return
+    _sumar(
+        postulacion.vacante_id,
+        postulacion.estado,
+        _a_dia(postulacion.fecha_postulacion),
+        1,
+        ultima=postulacion.fecha_postulacion,
+    )
+    _invalidar_al_confirmar()
+
+
+def registrar_cambios_estado_metricas(vacante_id, cambios, nuevo_estado):
+    """Mueve conteos entre estados. cambios: [(estado_anterior, fecha_postulacion), ...].
+
+    Se agrupan por (día, estado anterior): N postulaciones del mismo día cuestan dos UPDATE.
+    """
+    if not vacante_id:
+        return
+    grupos = defaultdict(lambda: [0, None])
+    for estado_anterior, fecha in cambios:
+        if not fecha or estado_anterior == nuevo_estado:
+            continue
+        grupo = grupos[(_a_dia(fecha), estado_anterior)]
+        grupo[0] += 1
+        grupo[1] = fecha if grupo[1] is None else max(grupo[1], fecha)
+
+    for (dia, estado_anterior), (cantidad, ultima) in sorted(grupos.items()):
+        _sumar(vacante_id, estado_anterior, dia, -cantidad)
+        _sumar(vacante_id, nuevo_estado, dia, cantidad, ultima=ultima)
+    if grupos:
+        _invalidar_al_confirmar()
+
+
+def reconstruir_metricas(vacante_id=None, chunk_size=1000):
+    """Recalcula el rollup desde core_postulaciones (todo o una vacante). Devuelve filas escritas."""
+    postulaciones = Postulacion.objects.filter(vacante__isnull=False)
+    existentes = MetricaPostulacionDiaria.objects.all()
+    if vacante_id is not None:
+        postulaciones = postulaciones.filter(vacante_id=vacante_id)
+        existentes = existentes.filter(vacante_id=vacante_id)
+
+    filas = (
+        postulaciones.annotate(dia=TruncDate('fecha_postulacion'))
+        .values('vacante_id', 'estado', 'dia')
+        .annotate(total=Count('id'), ultima=Max('fecha_postulacion'))
+        .order_by()
+    )
+    escritas = 0
+    with transaction.atomic():
+        existentes.delete()
+        pendientes = []
+        for fila in filas.iterator(chunk_size=chunk_size):
+            pendientes.append(MetricaPostulacionDiaria(**fila))
+            if len(pendientes) >= chunk_size:
+                MetricaPostulacionDiaria.objects.bulk_create(pendientes)
+                escritas += len(pendientes)
+                pendientes = []
+        if pendientes:
+            MetricaPostulacionDiaria.objects.bulk_create(pendientes)
+            escritas += len(pendientes)
+        _invalidar_al_confirmar()
+    return escritas
+
+
+def pivotar_metricas(filas):
+    """Filas (vacante, estado, count, last) -> una entrada por vacante con el detalle por estado.
+
+    Las filas llegan ordenadas por vacante, así que cada vacante se entrega en cuanto
+    aparece la siguiente (generador, sin acumular todo el resultado).
+    """
+    item = None
+    for fila in filas:
+        if item is None or item['vacante_id'] != fila['id']:
+            if item is not None:
+                yield item
+            item = {
+                'vacante_id': fila['id'],
+                'titulo': fila['titulo'],
+                'empresa_id': fila['id_empresa_id'],
+                'empresa_nombre': fila['id_empresa__nombre'],
+                'total_postulaciones': 0,
+                'postulaciones_por_estado': {},
+                'ultima_postulacion': None,
+            }
+        # Un estado puede quedar en 0 tras un cambio; su fecha sigue contando como última postulación
+        if fila['last'] and (item['ultima_postulacion'] is None or fila['last'] > item['ultima_postulacion']):
+            item['ultima_postulacion'] = fila['last']
+        if not fila['count']:
+            continue
+        item['postulaciones_por_estado'][fila['metricas_diarias__estado']] = fila['count']
+        item['total_postulaciones'] += fila['count']
+    if item is not None:
+        yield item
+
+
+def filas_exportacion(metricas):
+    """Filas planas (EXPORT_HEADER) para CSV: una por estado, o una con estado vacío si no hay."""
+    for item in metricas:
+        base = [
+            item['vacante_id'], item['titulo'], item['empresa_id'], item['empresa_nombre'],
+            item['total_postulaciones'], item['ultima_postulacion'],
+        ]
+        if not item['postulaciones_por_estado']:
+            yield base + [None, 0]
+            continue
+        for estado, count in item['postulaciones_por_estado'].items():
+            yield base + [estado, count]
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def csv_streaming(filas, chunk_size=EXPORT_CHUNK_SIZE):
+    """CSV (EXPORT_HEADER + filas) en bloques de ~chunk_size para StreamingHttpResponse."""
+    writer = csv.writer(_Eco())
+    bloque = [writer.writerow(EXPORT_HEADER)]
+    tamano = len(bloque[0])
+    for fila in filas:
+        linea = writer.writerow(['' if c is None else str(c) for c in fila])
+        bloque.append(linea)
+        tamano += len(linea)
+        if tamano >= chunk_size:
+            yield ''.join(bloque)
+            bloque, tamano = [], 0
+    if bloque:
+        yield ''.join(bloque)
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _celda_xlsx(valor):
+    # Excel no admite zona horaria: las fechas van en hora local sin tzinfo
+    if isinstance(valor, datetime) and timezone.is_aware(valor):
+        return timezone.localtime(valor).replace(tzinfo=None)
+    return valor
+
+
+def escribir_xlsx(metricas, destino):
+    """Escribe las métricas como XLSX en `destino` (archivo binario).
+
+    Usa openpyxl en modo write-only: las filas se vuelcan a disco a medida que se
+    agregan, así que la memoria no crece con el número de filas. Dos hojas:
+    - "Métricas": las mismas filas que el CSV (filas_exportacion), con números y fechas tipados.
+    - "Por estado": una fila por vacante con una columna por estado y una "Otros" con los
+      estados fuera de Postulacion.ESTADOS (datos heredados), para que la fila sume el total.
+    Devuelve el número de filas escritas en la hoja "Métricas".
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    estados = [valor for valor, _ in Postulacion.ESTADOS]
+    conocidos = set(estados)
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Métricas')
+    pivote = libro.create_sheet('Por estado')
+
+    negrita = Font(bold=True)
+
+    def encabezado(ws, columnas):
+        celdas = []
+        for columna in columnas:
+            celda = WriteOnlyCell(ws, value=columna)
+            celda.font = negrita
+            celdas.append(celda)
+        ws.append(celdas)
+
+    for ws, anchos in ((hoja, {'B': 40, 'D': 30, 'F': 20, 'G': 24}), (pivote, {'B': 40, 'C': 30})):
+        ws.freeze_panes = 'A2'
+        for columna, ancho in anchos.items():
+            ws.column_dimensions[columna].width = ancho
+
+    encabezado(hoja, EXPORT_HEADER)
+    encabezado(pivote, ['vacante_id', 'titulo', 'empresa_nombre', 'total_postulaciones', *estados, 'Otros', 'ultima_postulacion'])
+
+    filas = 0
+    for item in metricas:
+        # La fecha se convierte una vez por vacante; el resto ya son int/str/None
+        item = dict(item, ultima_postulacion=_celda_xlsx(item['ultima_postulacion']))
+        # Misma fuente de filas que el CSV, una vacante a la vez
+        for fila in filas_exportacion([item]):
+            hoja.append(fila)
+            filas += 1
+        por_estado = item['postulaciones_por_estado']
+        pivote.append([
+            item['vacante_id'], item['titulo'], item['empresa_nombre'], item['total_postulaciones'],
+            *(por_estado.get(estado, 0) for estado in estados),
+            sum(cantidad for estado, cantidad in por_estado.items() if estado not in conocidos),
+            item['ultima_postulacion'],
+        ])
+
+    libro.save(destino)
+    return filas
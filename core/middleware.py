@@ -1,55 +1,69 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from django.conf import settings
 from django.http import JsonResponse
+from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.db.models import Q
 import json
 import logging
+import time
+from .activity import inactivity_elapsed
 from .email_service import send_template_email
+from .lockout import get_lockout_backend
+from .ratelimit import LoginRateLimiter, get_client_ip
 
 logger = logging.getLogger(__name__)
 
-# Diccionario temporal en memoria (NOTA: usar Redis/Cache en producción)
-FAILED_LOGINS = {}
-
 
 class LoginSecurityMiddleware:
     """Middleware para limitar intentos de inicio de sesión.
 
     Mejoras realizadas:
-    - Soporta endpoints de Simple JWT (/api/token/) en formato JSON.
+    - Solo actúa sobre el endpoint de Simple JWT (/api/token/), en formato JSON o form-data.
     - Extrae 'username' o 'email' desde JSON body cuando aplica.
     - Intenta obtener el email real del usuario desde el modelo User para notificaciones.
     - No bloquea el flujo si ocurre un error en la lógica de notificación.
-    - WARNING: Sigue usando almacenamiento en memoria; para producción usar Redis o cache compartida.
+    - Los contadores viven en un backend configurable (LOGIN_LOCKOUT_BACKEND, por defecto
+      la cache de Django), así el límite se comparte entre todos los workers.
     """
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.lockout = get_lockout_backend()
+        self.rate_limiter = LoginRateLimiter()
+        self._login_path = None
 
     def __call__(self, request):
-        # Determinar si la ruta de login corresponde (ej. SimpleJWT)
-        is_login_path = request.path.endswith('/api/token/') or request.path.endswith('/login/')
-        username = None
-
-        # Verificar bloqueo ANTES de procesar la request
-        if is_login_path and request.method == 'POST':
-            username = self._extract_username_from_request(request)
-            if username:
-                block_response = self._check_if_blocked(username)
-                if block_response:
-                    return block_response
+        # Solo el endpoint de token (SimpleJWT) pasa por el limitador y el bloqueo;
+        # el resto de requests sigue de largo sin tocar la cache de autenticación.
+        if request.method != 'POST' or request.path != self._token_path():
+            return self.get_response(request)
+
+        # Verificar límite de frecuencia y bloqueo ANTES de procesar la request
+        # (así un ataque no llega a ejecutar el hasher de contraseñas)
+        username = self._extract_username_from_request(request)
+        rate_limit_response = self._check_rate_limit(request, username)
+        if rate_limit_response:
+            return rate_limit_response
+        if username:
+            block_response = self._check_if_blocked(username)
+            if block_response:
+                return block_response
 
         response = self.get_response(request)
 
-        # Verificar intento fallido DESPUÉS de la respuesta
-        if is_login_path and request.method == 'POST' and response.status_code in (400, 401, 403):
-            # Si no se extrajo antes, intentar ahora
-            if not username:
-                username = self._extract_username_from_request(request)
+        # Verificar intento fallido (o exitoso, para limpiar contadores) DESPUÉS de la respuesta
+        if response.status_code in (200, 400, 401, 403):
             self._handle_login_attempt(request, response, username)
 
         return response
 
+    def _token_path(self):
+        """Ruta de login resuelta desde las URLs (se calcula en la primera request)."""
+        if self._login_path is None:
+            self._login_path = reverse('token_obtain_pair')
+        return self._login_path
+
     def _extract_username_from_request(self, request):
         """Extrae el username/email del body POST (soporta form-data y JSON)."""
         try:
@@ -72,80 +86,77 @@ class LoginSecurityMiddleware:
             return None
         return None
 
+    def _check_rate_limit(self, request, username):
+        """Ventana deslizante por IP y por usuario; responde 429 con el tiempo restante."""
+        try:
+            rejected = self.rate_limiter.check(get_client_ip(request), username)
+        except Exception as e:
+            logger.error(f'Error en el limitador de login: {e}')
+            return None
+        if not rejected:
+            return None
+
+        scope, retry_after = rejected
+        logger.warning(f'Login limitado por {scope}: username={username} retry_after={retry_after}s')
+        response = JsonResponse({
+            'detail': f'Demasiados intentos de inicio de sesión. Intenta nuevamente en {retry_after} segundos.',
+            'error_code': 'LOGIN_RATE_LIMITED',
+            'retry_after_seconds': retry_after,
+        }, status=429)
+        response['Retry-After'] = str(retry_after)
+        return response
+
     def _check_if_blocked(self, username):
         """Verifica si el usuario está bloqueado antes del login"""
-        self._clean_old_attempts()
-
-        data = FAILED_LOGINS.get(username)
-        if data and data.get('lock_until'):
-            now = datetime.now()
-            if now < data['lock_until']:
-                return self._block_user_response(username, data['lock_until'])
-            else:
-                # Desbloquear si ya pasó el tiempo
-                FAILED_LOGINS.pop(username, None)
+        try:
+            lock_until = self.lockout.get_lock_until(username)
+        except Exception as e:
+            logger.error(f'Error consultando bloqueo de login: {e}')
+            return None
+        if lock_until:
+            return self._block_user_response(username, datetime.fromtimestamp(lock_until))
         return None
 
     def _handle_login_attempt(self, request, response, username):
         """Maneja el resultado del intento de login"""
-        if username and response.status_code != 200:
-            # Si no fue exitoso, registrar intento fallido
-            self._record_failed_attempt(username)
-        elif username and response.status_code == 200:
-            # Si fue exitoso, limpiar intentos fallidos
-            FAILED_LOGINS.pop(username, None)
-
-    def _record_failed_attempt(self, username):
-        """Registra un intento fallido de login"""
-        now = datetime.now()
-        max_attempts = getattr(settings, 'MAX_FAILED_LOGINS', 3)
-        lock_minutes = getattr(settings, 'ACCOUNT_LOCK_MINUTES', 5)
-
-        if username in FAILED_LOGINS:
-            FAILED_LOGINS[username]['count'] += 1
-            FAILED_LOGINS[username]['last_attempt'] = now
-
-            if FAILED_LOGINS[username]['count'] >= max_attempts:
-                FAILED_LOGINS[username]['lock_until'] = now + timedelta(minutes=lock_minutes)
-                logger.warning(f'Usuario {username} BLOQUEADO por {lock_minutes} minutos')
-        else:
-            FAILED_LOGINS[username] = {
-                'count': 1,
-                'last_attempt': now,
-                'lock_until': None,
-            }
-
-    def _clean_old_attempts(self):
-        """Limpia intentos fallidos antiguos"""
-        now = datetime.now()
-        one_hour_ago = now - timedelta(hours=1)
-
-        expired_users = [
-            username for username, data in list(FAILED_LOGINS.items())
-            if data['last_attempt'] < one_hour_ago and not data.get('lock_until')
-        ]
-
-        for username in expired_users:
-            FAILED_LOGINS.pop(username, None)
+        try:
+            if username and response.status_code != 200:
+                # Si no fue exitoso, registrar intento fallido
+                _, lock_until = self.lockout.record_failure(username)
+                if lock_until and self.lockout.claim_lock_notification(username, lock_until):
+                    self._notify_account_locked(username, lock_until)
+            elif username and response.status_code == 200:
+                # Si fue exitoso, limpiar intentos fallidos
+                self.lockout.reset(username)
+        except Exception as e:
+            logger.error(f'Error registrando intento de login: {e}')
 
-    def _block_user_response(self, username, lock_until):
-        """Respuesta cuando el usuario está bloqueado"""
-        remaining_time = lock_until - datetime.now()
-        minutes_remaining = max(1, int(remaining_time.total_seconds() / 60))
+    def _notify_account_locked(self, username, lock_until):
+        """Encola el aviso de bloqueo en el outbox (una vez por periodo de bloqueo).
 
-        # Intentar enviar email real del usuario si existe
+        Solo corre en el intento que provocó el bloqueo: una consulta y un INSERT; el
+        envío lo hace el dispatcher del outbox, con reintentos.
+        """
+        minutes_remaining = max(1, int((lock_until - time.time()) / 60))
         try:
             User = get_user_model()
-            user = User.objects.filter(username=username).first() or User.objects.filter(email=username).first()
-            user_email = user.email if user else f'{username}@example.com'
+            user = User.objects.filter(Q(username=username) | Q(email=username)).only('email').first()
+            if not user or not user.email:
+                return
             send_template_email(
                 template_key='account_locked',
-                recipient_list=[user_email],
+                recipient_list=[user.email],
                 context={'minutes_remaining': minutes_remaining},
                 fail_silently=True,
+                async_send=True,
             )
         except Exception as e:
-            logger.error(f'Error enviando email de bloqueo: {e}')
+            logger.error(f'Error encolando email de bloqueo: {e}')
+
+    def _block_user_response(self, username, lock_until):
+        """Respuesta cuando el usuario está bloqueado (sin consultas ni envío de correo)"""
+        remaining_time = lock_until - datetime.now()
+        minutes_remaining = max(1, int(remaining_time.total_seconds() / 60))
 
         return JsonResponse({
             'detail': (
@@ -176,30 +187,13 @@ class CheckUserInactivityPermission(BasePermission):
         if not request.user or not request.user.is_authenticated:
             return True  # Dejar que otros permisos manejen anónimos
         
-        from django.core.cache import cache
-        from django.utils import timezone
-        from datetime import datetime
-        
         inactivity_timeout = getattr(settings, 'INACTIVITY_TIMEOUT', 120)
-        # Mantener el registro de actividad más tiempo que el timeout de inactividad,
-        # para poder detectar expiración al siguiente request.
-        activity_cache_ttl = getattr(settings, 'INACTIVITY_CACHE_TTL', 86400)
-        cache_key = f'user_activity_{request.user.id}'
-        
-        # Verificar última actividad
-        last_activity = cache.get(cache_key)
-        
-        if last_activity is None:
-            # Primera vez o cache expiró - registrar actividad
-            cache.set(cache_key, timezone.now().isoformat(), activity_cache_ttl)
-            return True
-        
+
         try:
-            last_activity_dt = last_activity if isinstance(last_activity, datetime) else datetime.fromisoformat(last_activity)
-            current_time = timezone.now()
-            time_elapsed = (current_time - last_activity_dt).total_seconds()
-            
-            if time_elapsed > inactivity_timeout:
+            # Lee la última actividad y solo escribe si tiene más de ACTIVITY_WRITE_GRANULARITY
+            time_elapsed = inactivity_elapsed(request.user.id)
+
+            if time_elapsed is not None:
                 # Usuario inactivo - rechazar
                 logger.warning(
                     f'Usuario {request.user.username} rechazado por inactividad. '
@@ -210,11 +204,8 @@ class CheckUserInactivityPermission(BasePermission):
                     'error_code': 'SESSION_TIMEOUT',
                     'detail': msg
                 })
-            
-            # Renovar timestamp de actividad
-            cache.set(cache_key, timezone.now().isoformat(), activity_cache_ttl)
             return True
-            
+
         except AuthenticationFailed:
             raise
         except Exception as e:
@@ -0,0 +1,36 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0006_sync_favorito_fk_columns"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmailOutbox",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("provider", models.CharField(choices=[("sendgrid", "SendGrid"), ("smtp", "SMTP")], default="smtp", max_length=20)),
+                ("subject", models.CharField(max_length=255)),
+                ("message", models.TextField(blank=True, default="")),
+                ("html_message", models.TextField(blank=True, default="")),
+                ("from_email", models.CharField(blank=True, default="", max_length=254)),
+                ("recipients", models.JSONField(default=list)),
+                ("attachments", models.JSONField(blank=True, default=list)),
+                ("status", models.CharField(choices=[("pending", "Pendiente"), ("sending", "Enviando"), ("sent", "Enviado"), ("dead", "Fallido definitivamente")], default="pending", max_length=10)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("max_attempts", models.PositiveIntegerField(default=5)),
+                ("next_attempt_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("locked_at", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True, default="")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "core_email_outbox",
+                "indexes": [models.Index(fields=["status", "next_attempt_at"], name="core_outbox_due_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copiar_comentarios(apps, schema_editor):
+    # El texto acumulado en comentarios pasa como un único evento "historial" por postulación
+    Postulacion = apps.get_model("core", "Postulacion")
+    PostulacionEvento = apps.get_model("core", "PostulacionEvento")
+    pendientes = []
+    filas = (
+        Postulacion.objects.exclude(comentarios__isnull=True).exclude(comentarios="")
+        .values_list("id", "comentarios", "fecha_postulacion")
+    )
+    for postulacion_id, comentarios, fecha in filas.iterator(chunk_size=500):
+        pendientes.append(PostulacionEvento(
+            postulacion_id=postulacion_id,
+            creado_en=fecha or django.utils.timezone.now(),
+            tipo="historial",
+            resumen="Historial anterior",
+            datos={"texto": comentarios},
+        ))
+        if len(pendientes) >= 500:
+            PostulacionEvento.objects.bulk_create(pendientes)
+            pendientes = []
+    if pendientes:
+        PostulacionEvento.objects.bulk_create(pendientes)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0008_emailoutbox_substitutions"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostulacionEvento",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("creado_en", models.DateTimeField(default=django.utils.timezone.now)),
+                ("tipo", models.CharField(choices=[("postulacion", "Postulación creada"), ("cambio_estado", "Cambio de estado"), ("nota", "Nota interna"), ("correo", "Correo encolado"), ("historial", "Historial anterior (comentarios)")], max_length=20)),
+                ("resumen", models.CharField(blank=True, default="", max_length=255)),
+                ("datos", models.JSONField(blank=True, default=dict)),
+                ("actor", models.ForeignKey(blank=True, db_column="id_actor", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="eventos_postulacion", to=settings.AUTH_USER_MODEL)),
+                ("postulacion", models.ForeignKey(db_column="id_postulacion", on_delete=django.db.models.deletion.CASCADE, related_name="eventos", to="core.postulacion")),
+            ],
+            options={
+                "db_table": "core_postulacion_eventos",
+                "indexes": [models.Index(fields=["postulacion", "id"], name="core_post_evento_idx")],
+            },
+        ),
+        migrations.RunPython(copiar_comentarios, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate
+
+
+def llenar_metricas(apps, schema_editor):
+    # Backfill inicial desde core_postulaciones (mismo cálculo que rebuild_metricas)
+    Postulacion = apps.get_model("core", "Postulacion")
+    MetricaPostulacionDiaria = apps.get_model("core", "MetricaPostulacionDiaria")
+    filas = (
+        Postulacion.objects.filter(vacante__isnull=False)
+        .annotate(dia=TruncDate("fecha_postulacion"))
+        .values("vacante_id", "estado", "dia")
+        .annotate(total=Count("id"), ultima=Max("fecha_postulacion"))
+        .order_by()
+    )
+    pendientes = []
+    for fila in filas.iterator(chunk_size=1000):
+        pendientes.append(MetricaPostulacionDiaria(**fila))
+        if len(pendientes) >= 1000:
+            MetricaPostulacionDiaria.objects.bulk_create(pendientes)
+            pendientes = []
+    if pendientes:
+        MetricaPostulacionDiaria.objects.bulk_create(pendientes)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0009_postulacion_eventos"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MetricaPostulacionDiaria",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("estado", models.CharField(max_length=50)),
+                ("dia", models.DateField()),
+                ("total", models.IntegerField(default=0)),
+                ("ultima", models.DateTimeField(blank=True, null=True)),
+                ("vacante", models.ForeignKey(db_column="id_vacante", on_delete=django.db.models.deletion.CASCADE, related_name="metricas_diarias", to="core.vacante")),
+            ],
+            options={
+                "db_table": "core_metricas_postulacion_diaria",
+                "constraints": [models.UniqueConstraint(fields=("vacante", "dia", "estado"), name="core_metrica_diaria_uniq")],
+                "indexes": [models.Index(fields=["dia"], name="core_metrica_diaria_dia_idx")],
+            },
+        ),
+        migrations.RunPython(llenar_metricas, migrations.RunPython.noop),
+    ]
@@ -185,7 +185,7 @@ class Postulacion(models.Model):
     estado = models.CharField(max_length=50, choices=ESTADOS, default="Postulado")
     fecha_postulacion = models.DateTimeField()
 
-    # ⭐⭐ NUEVO CAMPO PARA GUARDAR COMENTARIOS / CONTACTOS ⭐⭐
+    # Historial antiguo en texto. Ya no se escribe: el historial vive en PostulacionEvento
     comentarios = models.TextField(null=True, blank=True)
 
     class Meta:
@@ -193,6 +193,85 @@ class Postulacion(models.Model):
 
     def __str__(self):
         return f"{self.candidato.username} - {self.empresa.nombre}"
+
+
+class PostulacionEvento(models.Model):
+    """Historial de una postulación (solo se insertan filas, nunca se editan)."""
+
+    TIPO_POSTULACION = "postulacion"
+    TIPO_CAMBIO_ESTADO = "cambio_estado"
+    TIPO_NOTA = "nota"
+    TIPO_CORREO = "correo"
+    TIPO_HISTORIAL = "historial"
+    TIPOS = [
+        (TIPO_POSTULACION, "Postulación creada"),
+        (TIPO_CAMBIO_ESTADO, "Cambio de estado"),
+        (TIPO_NOTA, "Nota interna"),
+        (TIPO_CORREO, "Correo encolado"),
+        (TIPO_HISTORIAL, "Historial anterior (comentarios)"),
+    ]
+
+    postulacion = models.ForeignKey(
+        Postulacion,
+        on_delete=models.CASCADE,
+        related_name="eventos",
+        db_column="id_postulacion",
+    )
+    creado_en = models.DateTimeField(default=timezone.now)
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name="eventos_postulacion",
+        db_column="id_actor",
+        null=True,
+        blank=True,
+    )
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    # Texto corto para listados (p.ej. "Postulado → Rechazado")
+    resumen = models.CharField(max_length=255, blank=True, default="")
+    datos = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        db_table = "core_postulacion_eventos"
+        indexes = [
+            models.Index(fields=["postulacion", "id"], name="core_post_evento_idx"),
+        ]
+
+    def __str__(self):
+        return f"[{self.tipo}] postulación {self.postulacion_id}: {self.resumen}"
+
+
+class MetricaPostulacionDiaria(models.Model):
+    """Conteo de postulaciones por (vacante, estado, día de postulación).
+
+    Se mantiene al crear postulaciones y al cambiar su estado; las métricas públicas
+    leen de aquí en lugar de recorrer core_postulaciones. Se reconstruye con
+    `python manage.py rebuild_metricas`.
+    """
+
+    vacante = models.ForeignKey(
+        Vacante,
+        on_delete=models.CASCADE,
+        related_name="metricas_diarias",
+        db_column="id_vacante",
+    )
+    estado = models.CharField(max_length=50)
+    dia = models.DateField()
+    total = models.IntegerField(default=0)
+    # Fecha de la postulación más reciente que pasó por este día/estado
+    ultima = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "core_metricas_postulacion_diaria"
+        constraints = [
+            models.UniqueConstraint(fields=["vacante", "dia", "estado"], name="core_metrica_diaria_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["dia"], name="core_metrica_diaria_dia_idx"),
+        ]
+
+    def __str__(self):
+        return f"vacante {self.vacante_id} {self.dia} {self.estado}: {self.total}"
     
 
 # ────────────────────────────────────────────────
@@ -324,3 +403,58 @@ class Entrevista(models.Model):
         # Ejecutar validaciones antes de guardar
         self.full_clean()
         super().save(*args, **kwargs)
+
+
+# ────────────────────────────────────────────────
+# OUTBOX DE CORREOS
+# ────────────────────────────────────────────────
+class EmailOutbox(models.Model):
+    """Correo pendiente de envío. Los requests solo encolan; core.email_outbox lo entrega."""
+
+    STATUS_PENDING = "pending"
+    STATUS_SENDING = "sending"
+    STATUS_SENT = "sent"
+    STATUS_DEAD = "dead"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pendiente"),
+        (STATUS_SENDING, "Enviando"),
+        (STATUS_SENT, "Enviado"),
+        (STATUS_DEAD, "Fallido definitivamente"),
+    ]
+
+    PROVIDER_SENDGRID = "sendgrid"
+    PROVIDER_SMTP = "smtp"
+    PROVIDER_CHOICES = [
+        (PROVIDER_SENDGRID, "SendGrid"),
+        (PROVIDER_SMTP, "SMTP"),
+    ]
+
+    provider = models.CharField(max_length=20, choices=PROVIDER_CHOICES, default=PROVIDER_SMTP)
+    subject = models.CharField(max_length=255)
+    message = models.TextField(blank=True, default="")
+    html_message = models.TextField(blank=True, default="")
+    from_email = models.CharField(max_length=254, blank=True, default="")
+    recipients = models.JSONField(default=list)
+    # Adjuntos como [{"filename", "content" (base64), "mimetype"}]
+    attachments = models.JSONField(default=list, blank=True)
+    # Envíos masivos: {email: {clave: valor}} para personalizar cada destinatario
+    substitutions = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "core_email_outbox"
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="core_outbox_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"[{self.status}] {self.subject} -> {', '.join(self.recipients or [])}"
@@ -0,0 +1,122 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class SlidingWindowRateLimiter:
+    """Limitador de ventana deslizante sobre la cache de Django.
+
+    Aproxima la ventana deslizante con dos contadores de ventana fija (la actual y
+    la anterior, ponderada por la fracción que sigue dentro de la ventana). Cada
+    intento cuesta un incr y un get: O(1) sin importar cuántos clientes haya. Se
+    decide con el valor que devuelve el incr atómico, así que entre intentos
+    concurrentes nunca entran más de `limit`.
+    """
+
+    def __init__(self, scope, limit, window, cache_alias='default'):
+        self.scope = scope
+        self.limit = limit
+        self.window = window
+        self.cache = caches[cache_alias]
+
+    def _keys(self, identifier, now):
+        digest = hashlib.sha256(str(identifier).strip().lower().encode('utf-8')).hexdigest()[:32]
+        index = int(now // self.window)
+        base = f'login_rl:{self.scope}:{digest}'
+        return f'{base}:{index}', f'{base}:{index - 1}', index
+
+    def _estimate(self, current, previous, elapsed):
+        return previous * (self.window - elapsed) / self.window + current
+
+    def _retry_after(self, current, previous, elapsed):
+        """Segundos hasta que la estimación vuelva a quedar por debajo del límite."""
+        if current < self.limit:
+            # Basta con que la ventana anterior pese menos
+            if previous <= 0:
+                return 0
+            wait = (self.window - elapsed) - (self.limit - current) * self.window / previous
+            return max(0, wait)
+        # La ventana actual ya está llena: esperar a la siguiente, donde pasa a ser la anterior
+        wait_next = self.window - self.limit * self.window / current
+        return (self.window - elapsed) + max(0, wait_next)
+
+    def acquire(self, identifier, now=None):
+        """Cuenta el intento y devuelve 0 si entra en el límite, o los segundos que faltan.
+
+        Un intento rechazado ya quedó contado: el llamador debe devolverlo con release().
+        """
+        now = now if now is not None else time.time()
+        current_key, previous_key, index = self._keys(identifier, now)
+        # La clave debe sobrevivir una ventana más, mientras actúa como "anterior"
+        self.cache.add(current_key, 0, self.window * 2)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            self.cache.set(current_key, 1, self.window * 2)
+            current = 1
+        previous = self.cache.get(previous_key, 0)
+        elapsed = now - index * self.window
+        # Se compara sin este intento, igual que si se hubiera consultado antes de sumarlo
+        if self._estimate(current - 1, previous, elapsed) < self.limit:
+            return 0
+        # Nunca 0 si se rechaza (redondeos en el borde de la ventana)
+        return max(self._retry_after(current - 1, previous, elapsed), 0.001)
+
+    def release(self, identifier, now):
+        """Descuenta un intento sumado por acquire() (con el mismo `now`)."""
+        current_key, _, _ = self._keys(identifier, now)
+        try:
+            self.cache.decr(current_key)
+        except ValueError:
+            pass
+
+
+def get_client_ip(request):
+    """IP del cliente. Con LOGIN_RATE_LIMIT_PROXY_COUNT > 0 se toma de X-Forwarded-For,
+    contando desde la derecha las entradas agregadas por los proxies de confianza.
+
+    Con 0 (por defecto) se usa REMOTE_ADDR: sin un proxy que lo reescriba, el cliente
+    controla X-Forwarded-For y podría cambiar de IP en cada intento.
+    """
+    proxy_count = getattr(settings, 'LOGIN_RATE_LIMIT_PROXY_COUNT', 0)
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxy_count and forwarded:
+        hops = [ip.strip() for ip in forwarded.split(',') if ip.strip()]
+        if hops:
+            return hops[-min(proxy_count, len(hops))]
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+class LoginRateLimiter:
+    """Límite de intentos de login por IP y por usuario (ver LOGIN_RATE_LIMIT_* en settings)."""
+
+    def __init__(self):
+        window = getattr(settings, 'LOGIN_RATE_LIMIT_WINDOW_SECONDS', 60)
+        cache_alias = getattr(settings, 'LOGIN_LOCKOUT_CACHE', 'default')
+        self.by_ip = SlidingWindowRateLimiter(
+            'ip', getattr(settings, 'LOGIN_RATE_LIMIT_PER_IP', 20), window, cache_alias
+        )
+        self.by_user = SlidingWindowRateLimiter(
+            'user', getattr(settings, 'LOGIN_RATE_LIMIT_PER_USER', 10), window, cache_alias
+        )
+
+    def check(self, ip, username=None):
+        """Devuelve (scope, retry_after) si el intento se rechaza, o None y lo registra."""
+        limiters = [(self.by_ip, ip)]
+        if username:
+            limiters.append((self.by_user, username))
+
+        now = time.time()
+        counted = []
+        for limiter, identifier in limiters:
+            retry_after = limiter.acquire(identifier, now)
+            counted.append((limiter, identifier))
+            if retry_after > 0:
+                # Solo los intentos aceptados cuentan: los rechazados no alargan la espera
+                for counted_limiter, counted_identifier in counted:
+                    counted_limiter.release(counted_identifier, now)
+                return limiter.scope, max(1, math.ceil(retry_after))
+        return None
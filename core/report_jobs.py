@@ -0,0 +1,265 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .report_render import calentar
+
+logger = logging.getLogger(__name__)
+
+REPORT_JOB_KEY = "report_job:{job_id}"
+REPORT_ERROR_KEY = "report_error:{clave}"
+
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_LISTO = "listo"
+ESTADO_ERROR = "error"
+ESTADO_EXPIRADO = "expirado"
+
+
+class ColaReportesLlena(Exception):
+    """La cola de reportes de este worker está llena; reintentar más tarde."""
+
+
+class _Trabajo:
+    """Un PDF en generación. Varias solicitudes de la misma clave comparten el mismo."""
+
+    def __init__(self, future=None):
+        self.future = future
+        self.terminado = threading.Event()
+
+
+class ReportPool:
+    """Pool de procesos para generar reportes fuera del worker de gunicorn.
+
+    - Como mucho `queue_size` reportes en cola o en proceso; el siguiente recibe
+      ColaReportesLlena en lugar de esperar (el request no queda colgado).
+    - Solicitudes de un PDF que ya se está generando se unen a ese trabajo.
+    - Con workers=0 se genera en el mismo proceso (desarrollo o entornos sin multiprocessing).
+    Al terminar, `al_terminar(future)` guarda el resultado antes de avisar a quien espera.
+    `initializer(*initargs)` corre una vez en cada proceso nuevo del pool.
+    """
+
+    def __init__(self, workers=1, queue_size=4, start_method="spawn", initializer=None, initargs=()):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.start_method = start_method
+        self.initializer = initializer
+        self.initargs = initargs
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._executor = None
+        self._en_curso = {}  # clave -> _Trabajo
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "joined": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+    def _count(self, key):
+        self._stats[key] += 1
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=self.initializer,
+                initargs=self.initargs,
+            )
+        return self._executor
+
+    def calentar(self):
+        """Arranca los procesos del pool sin esperar (cada uno corre el initializer).
+
+        No ocupa lugares de la cola. Con workers=0 el initializer corre en este proceso.
+        """
+        if self.workers <= 0:
+            if self.initializer is not None:
+                self.initializer(*self.initargs)
+            return
+        executor = self._get_executor()
+        # Cada tarea en cola con los procesos ocupados lanza un proceso nuevo, hasta `workers`
+        for _ in range(self.workers):
+            executor.submit(os.getpid)
+
+    def _submit(self, funcion, datos):
+        if self.workers <= 0:
+            future = Future()
+            try:
+                future.set_result(funcion(datos))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        try:
+            return self._get_executor().submit(funcion, datos)
+        except BrokenProcessPool:
+            # Un proceso del pool murió (p.ej. OOM): se descarta el pool y se crea otro
+            logger.warning("⚠️ Pool de reportes roto, se recrea")
+            self._executor = None
+            return self._get_executor().submit(funcion, datos)
+
+    def submit(self, clave, funcion, datos, al_terminar=None):
+        """Encola funcion(datos) y devuelve el _Trabajo (o el que ya existe para la clave)."""
+        with self._lock:
+            trabajo = self._en_curso.get(clave)
+            if trabajo is not None:
+                self._count("joined")
+                return trabajo
+            if not self._slots.acquire(blocking=False):
+                self._count("rejected")
+                raise ColaReportesLlena()
+            # Se registra antes de encolar: quien pida la misma clave se une a este trabajo
+            trabajo = self._en_curso[clave] = _Trabajo()
+            self._count("submitted")
+
+        # Fuera del lock: en modo en proceso funcion(datos) corre aquí y no bloquea otros submit
+        try:
+            trabajo.future = self._submit(funcion, datos)
+        except Exception as e:
+            trabajo.future = Future()
+            trabajo.future.set_exception(e)
+            self._terminar(clave, trabajo, None)
+            raise
+        # En modo en proceso el future ya terminó y el callback corre aquí mismo
+        trabajo.future.add_done_callback(lambda f: self._terminar(clave, trabajo, al_terminar))
+        return trabajo
+
+    def _terminar(self, clave, trabajo, al_terminar):
+        try:
+            if al_terminar is not None:
+                al_terminar(trabajo.future)
+        except Exception as e:
+            logger.error(f"❌ Error guardando el reporte {clave}: {e}")
+        finally:
+            with self._lock:
+                if self._en_curso.get(clave) is trabajo:
+                    del self._en_curso[clave]
+                self._count("failed" if trabajo.future.exception() else "completed")
+            self._slots.release()
+            trabajo.terminado.set()
+
+    def shutdown(self, wait=False):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._en_curso)
+        stats["workers"] = self.workers
+        stats["queue_size"] = self.queue_size
+        return stats
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_report_pool():
+    """Pool del proceso; se recrea tras un fork (los procesos hijos no se comparten)."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ReportPool(
+                    workers=getattr(settings, "REPORT_POOL_WORKERS", 1),
+                    queue_size=getattr(settings, "REPORT_QUEUE_SIZE", 4),
+                    start_method=getattr(settings, "REPORT_POOL_START_METHOD", "spawn"),
+                    initializer=calentar,
+                    initargs=(getattr(settings, "REPORT_CHART_ENGINE", "matplotlib"),),
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def calentar_pool():
+    """Lanza el pool de reportes de este worker con las librerías ya importadas."""
+    get_report_pool().calentar()
+
+
+def _cache():
+    return caches[getattr(settings, "REPORTS_CACHE_ALIAS", "default")]
+
+
+def _guardar_job(job):
+    _cache().set(REPORT_JOB_KEY.format(job_id=job["id"]), job, getattr(settings, "REPORT_JOB_TTL", 3600))
+
+
+def solicitar_reporte(clave, funcion, preparar, filename, requiere_admin=False):
+    """Crea un job para el PDF `clave`. Devuelve (job, trabajo).
+
+    Si el PDF ya está en la cache de reportes el job nace listo y trabajo es None. Si no,
+    `preparar()` arma los datos (en este proceso: consultas, logo) y funcion(datos) se
+    ejecuta en el pool. El PDF queda en la cache bajo `clave`; el estado del job se
+    deduce de ahí, así que cualquier worker puede responder el polling.
+    """
+    cache = _cache()
+    job = {
+        "id": uuid.uuid4().hex,
+        "clave": clave,
+        "filename": filename,
+        "requiere_admin": requiere_admin,
+        "creado": time.time(),
+    }
+    if cache.has_key(clave):
+        _guardar_job(job)
+        return job, None
+
+    def al_terminar(future):
+        # Corre en el hilo del pool: se pide la cache de ese hilo
+        error = future.exception()
+        if error is not None:
+            logger.error(f"❌ Error generando el reporte {clave}: {error}")
+            _cache().set(REPORT_ERROR_KEY.format(clave=clave), str(error) or error.__class__.__name__,
+                         getattr(settings, "REPORT_JOB_TTL", 3600))
+            return
+        _cache().set(clave, future.result(), getattr(settings, "REPORTS_CACHE_TTL", 86400))
+
+    datos = preparar()
+    cache.delete(REPORT_ERROR_KEY.format(clave=clave))
+    trabajo = get_report_pool().submit(clave, funcion, datos, al_terminar=al_terminar)
+    _guardar_job(job)
+    return job, trabajo
+
+
+def esperar_pdf(trabajo, timeout):
+    """Bytes del PDF si el trabajo termina dentro de `timeout`; None si sigue en proceso.
+
+    Si la generación falló se relanza la excepción del proceso hijo.
+    """
+    if not trabajo.terminado.wait(timeout):
+        return None
+    return trabajo.future.result()
+
+
+def obtener_job(job_id):
+    try:
+        return _cache().get(REPORT_JOB_KEY.format(job_id=job_id))
+    except Exception:
+        return None
+
+
+def estado_job(job):
+    """(estado, error) del job a partir de la cache de reportes.
+
+    Si pasado REPORT_JOB_TIMEOUT no hay PDF ni error, el resultado se descartó de la
+    cache (o murió el worker que lo generaba): el job queda expirado, no pendiente.
+    """
+    cache = _cache()
+    if cache.has_key(job["clave"]):
+        return ESTADO_LISTO, None
+    error = cache.get(REPORT_ERROR_KEY.format(clave=job["clave"]))
+    if error is not None:
+        return ESTADO_ERROR, error
+    if time.time() - job["creado"] > getattr(settings, "REPORT_JOB_TIMEOUT", 300):
+        return ESTADO_EXPIRADO, "El reporte ya no está disponible; solicítalo de nuevo."
+    return ESTADO_PENDIENTE, None
+
+
+def pdf_job(job):
+    return _cache().get(job["clave"])
@@ -0,0 +1,250 @@
+"""Generación de PDFs de métricas (matplotlib/reportlab).
+
+Este módulo no importa Django: las funciones reciben datos ya preparados (dicts, str,
+bytes) para poder ejecutarse en los procesos del pool de reportes (ver report_jobs).
+"""
+import logging
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+MOTOR_MATPLOTLIB = 'matplotlib'
+MOTOR_REPORTLAB = 'reportlab'
+
+
+def calentar(motor=MOTOR_MATPLOTLIB):
+    """Importa las librerías del motor y genera un PDF mínimo (fuentes, backend Agg).
+
+    Es el initializer de los procesos del pool: el primer reporte real ya no paga los
+    imports ni la carga de fuentes. Un fallo aquí no debe romper el pool (solo se pierde
+    el precalentamiento).
+    """
+    try:
+        render_pdf_vacante({
+            'vacante_id': 0, 'titulo': '', 'empresa_nombre': '', 'total': 1, 'ultima': None,
+            'por_estado': [('Postulado', 1)], 'logo': None, 'generado': '', 'motor': motor,
+        })
+    except Exception as e:
+        logger.warning(f"No se pudo precalentar el motor de reportes {motor}: {e}")
+
+
+def _grafico_matplotlib(datos, estados, counts):
+    """PNG (150 dpi) del gráfico de barras con matplotlib."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(7.5, 4))
+    ax = fig.add_subplot(111)
+    if counts:
+        bars = ax.bar(range(len(counts)), counts, color='#e74c3c')
+        ax.set_xticks(range(len(counts)))
+        ax.set_xticklabels(estados, rotation=30, ha='right')
+        ax.set_ylabel('Cantidad')
+        ax.set_title(f"Postulaciones por estado - Vacante {datos['vacante_id']}")
+        # Anotar valores encima de barras
+        for bar in bars:
+            hgt = bar.get_height()
+            ax.annotate(f'{int(hgt)}', xy=(bar.get_x() + bar.get_width() / 2, hgt), xytext=(0, 4),
+                        textcoords='offset points', ha='center', va='bottom', fontsize=9)
+    else:
+        ax.text(0.5, 0.5, 'No hay postulaciones', ha='center', va='center')
+        ax.set_xticks([])
+        ax.set_yticks([])
+
+    fig.tight_layout()
+    img_buf = BytesIO()
+    fig.savefig(img_buf, format='png', dpi=150, bbox_inches='tight')
+    plt.close(fig)
+    img_buf.seek(0)
+    return img_buf
+
+
+def _grafico_reportlab(datos, estados, counts, width, height):
+    """El mismo gráfico en vectores con reportlab.graphics (sin matplotlib ni PNG)."""
+    from reportlab.lib import colors
+    from reportlab.graphics.shapes import Drawing, String
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+
+    drawing = Drawing(width, height)
+    if not counts:
+        drawing.add(String(width / 2, height / 2, 'No hay postulaciones', textAnchor='middle', fontSize=10))
+        return drawing
+
+    drawing.add(String(width / 2, height - 14, f"Postulaciones por estado - Vacante {datos['vacante_id']}",
+                       textAnchor='middle', fontName='Helvetica-Bold', fontSize=11))
+    bc = VerticalBarChart()
+    bc.x = 50
+    bc.y = 60
+    bc.height = height - 100
+    bc.width = width - 80
+    bc.data = [counts]
+    bc.strokeColor = colors.black
+    bc.valueAxis.valueMin = 0
+    bc.valueAxis.labels.fontSize = 8
+    bc.categoryAxis.labels.boxAnchor = 'ne'
+    bc.categoryAxis.labels.dy = -2
+    bc.categoryAxis.labels.angle = 30
+    bc.categoryAxis.labels.fontSize = 8
+    bc.categoryAxis.categoryNames = estados
+    bc.bars[0].fillColor = colors.HexColor('#e74c3c')
+    # Anotar valores encima de barras
+    bc.barLabelFormat = '%d'
+    bc.barLabels.nudge = 7
+    bc.barLabels.fontSize = 8
+    drawing.add(bc)
+    return drawing
+
+
+def render_pdf_vacante(datos):
+    """PDF de una vacante: gráfico de barras, logo y detalle por estado.
+
+    datos: vacante_id, titulo, empresa_nombre, total, ultima, por_estado [(estado, n)],
+    logo (bytes o None), generado (texto) y motor del gráfico: 'matplotlib' (PNG) o
+    'reportlab' (vectorial, no importa matplotlib).
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.units import inch
+    from reportlab.lib.utils import ImageReader
+
+    estados_q = datos['por_estado']
+    estados = [estado for estado, _ in estados_q]
+    counts = [count for _, count in estados_q]
+    motor = datos.get('motor') or MOTOR_MATPLOTLIB
+
+    # Construir PDF
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    w, h = letter
+
+    # Header: título y metadata
+    c.setFont('Helvetica-Bold', 16)
+    c.drawString(40, h - 40, f"Reporte de métricas - Vacante {datos['vacante_id']}: {datos['titulo']}")
+    c.setFont('Helvetica', 9)
+    c.drawString(40, h - 60, f"Empresa: {datos['empresa_nombre'] or ''}    Vacante ID: {datos['vacante_id']}")
+    c.drawString(40, h - 75, f"Total postulaciones: {datos['total']}    Última postulación: {datos['ultima']}")
+
+    # Insertar logo si existe
+    logo_size = 60
+    if datos.get('logo'):
+        try:
+            logo_img_reader = ImageReader(BytesIO(datos['logo']))
+            c.drawImage(logo_img_reader, w - 40 - logo_size, h - 40 - (logo_size/2), width=logo_size, height=logo_size, preserveAspectRatio=True, mask='auto')
+        except Exception:
+            # si falla el logo, no interrumpe la generación
+            pass
+
+    # Dibujar el gráfico debajo del header
+    img_w = w - 80
+    img_h = 3.5 * inch
+    if motor == MOTOR_REPORTLAB:
+        from reportlab.graphics import renderPDF
+        renderPDF.draw(_grafico_reportlab(datos, estados, counts, img_w, img_h), c, 40, h - 120 - img_h)
+    else:
+        img_reader = ImageReader(_grafico_matplotlib(datos, estados, counts))
+        c.drawImage(img_reader, 40, h - 120 - img_h, width=img_w, height=img_h, preserveAspectRatio=True, mask='auto')
+
+    # Añadir tabla simple de estados y conteos
+    text_y = h - 120 - img_h - 20
+    c.setFont('Helvetica-Bold', 11)
+    c.drawString(40, text_y, 'Detalle por estado:')
+    c.setFont('Helvetica', 10)
+    ty = text_y - 14
+    if estados_q:
+        for estado, count in estados_q:
+            c.drawString(48, ty, f"- {estado}: {count}")
+            ty -= 12
+    else:
+        c.drawString(48, ty, 'No hay estados para mostrar')
+
+    # Footer: fecha de generación
+    c.setFont('Helvetica-Oblique', 8)
+    c.drawString(40, 20, f"Generado: {datos['generado']}")
+
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def render_pdf_metricas(datos):
+    """PDF con una página por vacante y gráfico reportlab (VerticalBarChart).
+
+    datos: vacantes [{vacante_id, titulo, empresa_nombre, total, ultima, por_estado}].
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+    from reportlab.graphics import renderPDF
+
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    w, h = letter
+
+    # Una página por vacante
+    for v in datos['vacantes']:
+        # Cabecera
+        c.setFont('Helvetica-Bold', 14)
+        c.drawString(40, h - 40, f"Reporte de métricas - Vacante {v['vacante_id']}: {v['titulo']}")
+
+        # Subtítulo empresa
+        c.setFont('Helvetica', 9)
+        c.drawString(40, h - 60, f"Empresa: {v['empresa_nombre'] or ''}    Vacante ID: {v['vacante_id']}")
+
+        total = v['total']
+
+        # Texto resumen
+        c.setFont('Helvetica', 10)
+        c.drawString(40, h - 90, f"Total postulaciones: {total}")
+        c.drawString(200, h - 90, f"Última postulación: {v['ultima']}")
+
+        # Preparar datos para gráfico
+        estados = [estado for estado, _ in v['por_estado']]
+        counts = [count for _, count in v['por_estado']]
+
+        if total > 0 and counts:
+            # Dibujar gráfico de barras usando Graphics
+            drawing_width = 6.5 * inch
+            drawing_height = 3 * inch
+            drawing = Drawing(drawing_width, drawing_height)
+
+            bc = VerticalBarChart()
+            bc.x = 50
+            bc.y = 20
+            bc.height = drawing_height - 60
+            bc.width = drawing_width - 120
+            bc.data = [counts]
+            bc.strokeColor = colors.black
+            bc.valueAxis.labels.fontSize = 8
+            bc.categoryAxis.labels.boxAnchor = 'ne'
+            bc.categoryAxis.labels.dy = -2
+            bc.categoryAxis.labels.angle = 30
+            bc.categoryAxis.categoryNames = estados
+            bc.bars.fillColor = colors.HexColor('#4f81bd')
+
+            drawing.add(bc)
+
+            # Leyenda con porcentajes
+            start_y = h - 140
+            c.setFont('Helvetica-Bold', 10)
+            c.drawString(40, start_y, 'Postulaciones por estado (cantidad y porcentaje):')
+            c.setFont('Helvetica', 9)
+            y_text = start_y - 14
+            for est, cnt in zip(estados, counts):
+                pct = (cnt / total) * 100 if total else 0
+                c.drawString(48, y_text, f"- {est}: {cnt} ({pct:.1f}%)")
+                y_text -= 12
+
+            # Renderizar el drawing en el canvas
+            renderPDF.draw(drawing, c, 40, h - 420)
+        else:
+            c.setFont('Helvetica-Oblique', 9)
+            c.drawString(40, h - 140, 'No hay postulaciones para esta vacante en el rango solicitado.')
+
+        c.showPage()
+
+    c.save()
+    return buffer.getvalue()
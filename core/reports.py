@@ -0,0 +1,162 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .metrics import acotar_parametros, get_metrics_version, metricas_por_vacante, normalizar_parametros
+from .report_jobs import solicitar_reporte
+from .report_render import render_pdf_metricas, render_pdf_vacante
+
+logger = logging.getLogger(__name__)
+
+PDF_VACANTE_KEY = "pdf_vacante:{vacante_id}:v{version}:{contenido}"
+PDF_METRICAS_KEY = "pdf_metricas:{contenido}"
+
+# Logos que fallaron recientemente: no se reintenta la descarga (ni su timeout) en cada reporte
+_logos_fallidos = {}
+_logos_lock = threading.Lock()
+
+
+def _logo_dir():
+    return getattr(settings, "REPORT_LOGO_CACHE_DIR", None) or os.path.join(tempfile.gettempdir(), "talenthub-logos")
+
+
+def obtener_logo(url, timeout=5):
+    """Bytes del logo de la empresa, descargado una sola vez y guardado en disco.
+
+    El archivo se nombra con el hash de la URL (las URLs de Cloudinary cambian al
+    cambiar la imagen). Si la descarga falla se recuerda unos minutos para no pagar
+    el timeout en cada reporte. Devuelve None si no hay logo disponible.
+    """
+    if not url:
+        return None
+    ruta = os.path.join(_logo_dir(), hashlib.sha256(url.encode("utf-8")).hexdigest())
+    try:
+        with open(ruta, "rb") as f:
+            return f.read()
+    except OSError:
+        pass
+
+    reintento = getattr(settings, "REPORT_LOGO_RETRY_SECONDS", 600)
+    with _logos_lock:
+        fallo = _logos_fallidos.get(url)
+    if fallo and time.monotonic() - fallo < reintento:
+        return None
+
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            contenido = resp.read()
+    except Exception as e:
+        logger.warning(f"No se pudo descargar el logo de la empresa {url}: {e}")
+        with _logos_lock:
+            _logos_fallidos[url] = time.monotonic()
+        return None
+
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Escritura atómica: otro worker nunca ve un archivo a medias
+        fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta))
+        with os.fdopen(fd, "wb") as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+    except OSError as e:
+        logger.warning(f"No se pudo guardar el logo en cache local: {e}")
+    return contenido
+
+
+def _motor_grafico():
+    return getattr(settings, "REPORT_CHART_ENGINE", "matplotlib")
+
+
+def _clave_pdf(vacante, params):
+    # Todo lo que aparece en el PDF y no cubre la versión de métricas (datos de la vacante/empresa)
+    empresa = vacante.id_empresa if vacante.id_empresa_id else None
+    contenido = json.dumps({
+        "params": params,
+        "titulo": vacante.titulo,
+        "empresa": getattr(empresa, "nombre", None),
+        "logo": getattr(empresa, "logo_url", None),
+        "motor": _motor_grafico(),
+    }, sort_keys=True)
+    return PDF_VACANTE_KEY.format(
+        vacante_id=vacante.id,
+        version=get_metrics_version(),
+        contenido=hashlib.sha1(contenido.encode("utf-8")).hexdigest(),
+    )
+
+
+def _por_estado(item):
+    # Mayor cantidad primero, como el gráfico original
+    return sorted(item['postulaciones_por_estado'].items(), key=lambda e: -e[1]) if item else []
+
+
+def _datos_vacante(item, vacante_id, titulo, empresa_nombre):
+    return {
+        "vacante_id": vacante_id,
+        "titulo": titulo,
+        "empresa_nombre": empresa_nombre,
+        "total": item['total_postulaciones'] if item else 0,
+        "ultima": item['ultima_postulacion'] if item else None,
+        "por_estado": _por_estado(item),
+    }
+
+
+def datos_pdf_vacante(vacante, params):
+    """Datos para render_pdf_vacante: métricas del rollup y logo (desde la cache local)."""
+    metricas = metricas_por_vacante(vacante_id=vacante.id, fecha_from=params["from"], fecha_to=params["to"])
+    empresa = vacante.id_empresa if vacante.id_empresa_id else None
+    datos = _datos_vacante(
+        metricas[0] if metricas else None, vacante.id, vacante.titulo, getattr(empresa, "nombre", None)
+    )
+    datos["logo"] = obtener_logo(getattr(empresa, "logo_url", None))
+    datos["generado"] = timezone.now().isoformat()
+    datos["motor"] = _motor_grafico()
+    return datos
+
+
+def solicitar_pdf_vacante(vacante, fecha_from=None, fecha_to=None):
+    """Job del PDF de una vacante (ver report_jobs.solicitar_reporte). Devuelve (job, trabajo).
+
+    La clave combina vacante, filtros normalizados, versión de métricas y los datos de la
+    vacante que aparecen en el reporte: si ya se generó, no se consulta ni se renderiza nada.
+    Es público: las fechas se acotan al rango con datos para no crear una clave por fecha.
+    """
+    params = normalizar_parametros(vacante_id=vacante.id, fecha_from=fecha_from, fecha_to=fecha_to)
+    acotar_parametros(params, get_metrics_version())
+    return solicitar_reporte(
+        _clave_pdf(vacante, params),
+        render_pdf_vacante,
+        lambda: datos_pdf_vacante(vacante, params),
+        filename=f"metrics_vacante_{vacante.id}.pdf",
+    )
+
+
+def solicitar_pdf_metricas(vacante_id=None, area=None, fecha_from=None, fecha_to=None):
+    """Job del PDF de varias vacantes (una página por vacante). Devuelve (job, trabajo).
+
+    Los datos salen del rollup (una consulta) y la clave es el hash de esos datos.
+    """
+    params = normalizar_parametros(vacante_id=vacante_id, area=area, fecha_from=fecha_from, fecha_to=fecha_to)
+    vacantes = [
+        _datos_vacante(item, item['vacante_id'], item['titulo'], item['empresa_nombre'])
+        for item in metricas_por_vacante(
+            vacante_id=params["vacante_id"], area=params["area"], fecha_from=params["from"], fecha_to=params["to"],
+        )
+    ]
+    contenido = json.dumps(vacantes, cls=DjangoJSONEncoder, sort_keys=True)
+    clave = PDF_METRICAS_KEY.format(contenido=hashlib.sha1(contenido.encode("utf-8")).hexdigest())
+    return solicitar_reporte(
+        clave,
+        render_pdf_metricas,
+        lambda: {"vacantes": vacantes},
+        filename=f"metrics_{vacante_id or 'all'}.pdf",
+        requiere_admin=True,
+    )
@@ -0,0 +1,230 @@
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+from .models import Empresa, Roles
+
+logger = logging.getLogger(__name__)
+
+# Atributo donde se memoiza el rol dentro del mismo request (vive en el objeto user).
+REQUEST_ROLE_ATTR = "_resolved_role"
+REQUEST_EMPRESA_ATTR = "_resolved_empresa_id"
+ROLE_CACHE_KEY = "user_role_{user_id}"
+ROLE_VERSION_KEY = "user_role_version_{user_id}"
+
+_stats_lock = threading.Lock()
+_stats = {"request_hits": 0, "shared_hits": 0, "misses": 0}
+
+
+def normalize_role(role):
+    """
+    Normaliza variantes posibles del rol desde Supabase o desde el atributo Django
+    y devuelve la forma canónica utilizada en la aplicación.
+    """
+    if not role:
+        return None
+    r = str(role).strip().lower()
+    # Mapear variantes comunes a los roles canónicos
+    if r in ("admin", "administrator", "owner"):
+        return Roles.ADMIN
+    if r in ("rrhh", "recursos humanos", "recursoshumanos", "empleado_rrhh", "empleado-rrhh", "rrhh_empleado"):
+        return Roles.EMPLEADO_RRHH
+    if r in ("candidato", "candidate"):
+        return Roles.CANDIDATO
+    return r
+
+
+def _count(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def role_cache_stats():
+    """Contadores del proceso actual: aciertos por request, aciertos en cache compartida y fallos."""
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats["request_hits"] + stats["shared_hits"] + stats["misses"]
+    hits = stats["request_hits"] + stats["shared_hits"]
+    stats["total"] = total
+    stats["hit_rate"] = round(hits / total, 4) if total else 0.0
+    return stats
+
+
+def reset_role_cache_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+def _cache():
+    return caches[getattr(settings, "ROLE_CACHE_ALIAS", "default")]
+
+
+def _role_cache_key(user_id):
+    return ROLE_CACHE_KEY.format(user_id=user_id)
+
+
+def _load_role_from_db(user):
+    """Lee el rol desde auth_user (SQL raw), con fallback al atributo y a los grupos."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT role FROM auth_user WHERE id = %s', [user.id])
+            row = cursor.fetchone()
+            if row and row[0]:
+                return normalize_role(row[0])
+    except Exception:
+        pass
+
+    # Fallback a atributo en memoria
+    role = getattr(user, "role", None)
+    if role:
+        return normalize_role(role)
+
+    # Fallback a grupos de Django
+    group_names = {g.name.lower() for g in user.groups.all()}
+    if "admin" in group_names:
+        return Roles.ADMIN
+    if "empleado_rrhh" in group_names or "rrhh" in group_names:
+        return Roles.EMPLEADO_RRHH
+    return Roles.CANDIDATO
+
+
+def remember_role(user, role):
+    """Guarda el rol ya resuelto en el request actual y en la cache compartida."""
+    setattr(user, REQUEST_ROLE_ATTR, role)
+    ttl = getattr(settings, "ROLE_CACHE_TTL", 300)
+    if ttl and getattr(user, "id", None):
+        try:
+            _cache().set(_role_cache_key(user.id), role, ttl)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar el rol en cache: {e}")
+
+
+def get_supabase_role(user):
+    """Obtiene el rol del usuario.
+
+    Orden de resolución:
+    1. Memo del request (atributo en el objeto user).
+    2. Cache compartida por user id (TTL = ROLE_CACHE_TTL).
+    3. BD (SQL raw sobre auth_user, luego atributo y grupos).
+    """
+    role = getattr(user, REQUEST_ROLE_ATTR, None)
+    if role:
+        _count("request_hits")
+        return role
+
+    ttl = getattr(settings, "ROLE_CACHE_TTL", 300)
+    if ttl and getattr(user, "id", None):
+        try:
+            role = _cache().get(_role_cache_key(user.id))
+        except Exception:
+            role = None
+        if role:
+            _count("shared_hits")
+            setattr(user, REQUEST_ROLE_ATTR, role)
+            return role
+
+    _count("misses")
+    role = _load_role_from_db(user)
+    remember_role(user, role)
+    return role
+
+
+def get_supabase_empresa_id(user):
+    """Empresa del usuario: asignada en auth_user.id_empresa o, si es dueño, la que posee.
+
+    El resultado se memoiza en el objeto user durante el request.
+    """
+    if hasattr(user, REQUEST_EMPRESA_ATTR):
+        return getattr(user, REQUEST_EMPRESA_ATTR)
+
+    empresa_id = _load_empresa_id_from_db(user)
+    setattr(user, REQUEST_EMPRESA_ATTR, empresa_id)
+    return empresa_id
+
+
+def _load_empresa_id_from_db(user):
+    # 1) Empresa asignada directamente al usuario (RRHH/candidato promovido).
+    assigned_empresa = getattr(user, "id_empresa", None)
+    if assigned_empresa:
+        return assigned_empresa
+
+    # 2) Fallback a columna real en auth_user cuando el modelo no expone el campo.
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id_empresa FROM auth_user WHERE id = %s", [user.id])
+            row = cursor.fetchone()
+            if row and row[0]:
+                return row[0]
+    except Exception:
+        pass
+
+    # 3) Si es owner de empresa (admin dueño), usar esa empresa.
+    owned_empresa = Empresa.objects.filter(owner=user).values_list("id", flat=True).first()
+    return owned_empresa
+
+
+def get_role_version(user_id):
+    """Versión del rol del usuario; cambia cada vez que se invalida su rol.
+
+    Es un valor opaco, no un contador. Devuelve None si la clave no está (nunca se
+    creó, se descartó de la cache o la cache falla): quien la compare debe tratar
+    ese caso como "no se puede verificar", nunca como una versión inicial.
+    """
+    try:
+        return _cache().get(ROLE_VERSION_KEY.format(user_id=user_id))
+    except Exception:
+        return None
+
+
+def ensure_role_version(user_id):
+    """Versión actual del rol, creándola si no existe (al emitir un access token).
+
+    Devuelve None si la cache no está disponible.
+    """
+    key = ROLE_VERSION_KEY.format(user_id=user_id)
+    try:
+        # add() es atómico: si dos workers la crean a la vez, ambos leen la misma
+        _cache().add(key, uuid.uuid4().hex, None)
+        return _cache().get(key)
+    except Exception as e:
+        logger.warning(f"No se pudo leer la versión del rol: {e}")
+        return None
+
+
+def bump_role_version(user_id):
+    # Valor al azar en lugar de incr: si la clave se pierde y se vuelve a crear,
+    # nunca se repite una versión que ya lleve algún token emitido
+    version = uuid.uuid4().hex
+    try:
+        _cache().set(ROLE_VERSION_KEY.format(user_id=user_id), version, None)
+        return version
+    except Exception as e:
+        logger.warning(f"No se pudo incrementar la versión del rol: {e}")
+        return None
+
+
+def invalidate_role(user_or_id):
+    """Invalida el rol cacheado de un usuario. Llamar siempre que cambie su rol.
+
+    También cambia la versión del rol, de modo que los access tokens emitidos
+    con los claims anteriores dejan de ser aceptados y el cliente debe refrescarlos.
+    """
+    user_id = getattr(user_or_id, "id", user_or_id)
+    for attr in (REQUEST_ROLE_ATTR, REQUEST_EMPRESA_ATTR):
+        if hasattr(user_or_id, attr):
+            try:
+                delattr(user_or_id, attr)
+            except AttributeError:
+                pass
+    if user_id is None:
+        return
+    try:
+        _cache().delete(_role_cache_key(user_id))
+    except Exception as e:
+        logger.warning(f"No se pudo invalidar el rol en cache: {e}")
+    bump_role_version(user_id)
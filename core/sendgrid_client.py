@@ -0,0 +1,106 @@
+import logging
+import os
+import threading
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SENDGRID_HOST = "https://api.sendgrid.com"
+
+
+class SendGridClient:
+    """Cliente HTTP de SendGrid con pool de conexiones keep-alive.
+
+    Se comparte en todo el proceso (hilos del outbox incluidos): httpx.Client es
+    seguro entre hilos y reutiliza la conexión TLS entre envíos. Lleva la cuenta de
+    requests y de conexiones nuevas para medir la reutilización.
+    """
+
+    def __init__(self, api_key, host=SENDGRID_HOST, max_connections=10, keepalive_expiry=60.0, timeout=30.0,
+                 transport=None):
+        self.api_key = api_key
+        self._client = httpx.Client(
+            base_url=host,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+                "User-Agent": "talentohub-sendgrid",
+            },
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=timeout,
+            # Solo para tests (httpx.MockTransport); None usa el pool de httpcore
+            transport=transport,
+        )
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "new_connections": 0, "errors": 0}
+
+    def _trace(self, event_name, info):
+        # httpcore avisa cada vez que abre una conexión TCP nueva
+        if event_name == "connection.connect_tcp.complete":
+            with self._stats_lock:
+                self._stats["new_connections"] += 1
+
+    def send(self, mail):
+        """Envía a /v3/mail/send un payload ya armado (dict) o un Mail de los helpers de sendgrid."""
+        payload = mail if isinstance(mail, dict) else mail.get()
+        with self._stats_lock:
+            self._stats["requests"] += 1
+        try:
+            return self._client.post("/v3/mail/send", json=payload, extensions={"trace": self._trace})
+        except httpx.HTTPError:
+            with self._stats_lock:
+                self._stats["errors"] += 1
+            raise
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        reused = max(0, stats["requests"] - stats["new_connections"])
+        stats["reused_connections"] = reused
+        stats["reuse_rate"] = round(reused / stats["requests"], 4) if stats["requests"] else 0.0
+        return stats
+
+    def close(self):
+        self._client.close()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_sendgrid_client():
+    """Cliente del proceso, creado al primer uso (o None si no hay SENDGRID_API_KEY)."""
+    global _client, _client_pid
+    api_key = getattr(settings, "SENDGRID_API_KEY", None)
+    if not api_key:
+        return None
+
+    client = _client
+    # Se recrea si cambió la API key o si el proceso es un fork (el pool no se comparte)
+    if client is not None and client.api_key == api_key and _client_pid == os.getpid():
+        return client
+
+    with _client_lock:
+        if _client is None or _client.api_key != api_key or _client_pid != os.getpid():
+            _client = SendGridClient(
+                api_key,
+                max_connections=getattr(settings, "SENDGRID_MAX_CONNECTIONS", 10),
+                keepalive_expiry=getattr(settings, "SENDGRID_KEEPALIVE_SECONDS", 60.0),
+                timeout=getattr(settings, "EMAIL_TIMEOUT", 30),
+            )
+            _client_pid = os.getpid()
+        return _client
+
+
+def sendgrid_client_stats():
+    client = _client
+    if client is None:
+        return {"requests": 0, "new_connections": 0, "errors": 0, "reused_connections": 0, "reuse_rate": 0.0}
+    return client.stats()
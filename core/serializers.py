@@ -5,6 +5,8 @@ from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 import cloudinary.uploader
 from .models import Entrevista, Favorito, Vacante, Postulacion, Empresa, Roles
+from .eventos import resumen_ultimo_evento
+from .roles import invalidate_role
 
 User = get_user_model()
 
@@ -84,7 +86,9 @@ class EmpresaSerializer(serializers.ModelSerializer):
        # user.role = "admin"
        # user.save(update_fields=["role"])
 
-        if hasattr(user, "role"):
+        # request.user puede traer "role" como atributo puesto por la autenticación
+        # (claims del JWT); solo se guarda si es un campo real del modelo.
+        if any(f.name == "role" for f in user._meta.concrete_fields):
             user.role = Roles.ADMIN
             user.save(update_fields=["role"])
 
@@ -95,6 +99,7 @@ class EmpresaSerializer(serializers.ModelSerializer):
         except Exception:
             pass
 
+        invalidate_role(user)
         return empresa
 
     def update(self, instance, validated_data):
@@ -171,9 +176,15 @@ class UsuarioSerializer(serializers.Serializer):
 
 
 class PostulacionSerializer(serializers.ModelSerializer):
+    # En lugar del historial completo (comentarios) se envía solo el último evento
+    ultimo_evento = serializers.SerializerMethodField()
+
     class Meta:
         model = Postulacion
-        fields = "__all__"
+        exclude = ("comentarios",)
+
+    def get_ultimo_evento(self, obj):
+        return resumen_ultimo_evento(obj)
 
 
 class FavoritoSerializer(serializers.ModelSerializer):
@@ -5,6 +5,7 @@ from rest_framework.validators import UniqueValidator
 from django.contrib.auth import get_user_model
 from core.models import Roles  # 👈 importa desde models.py
 from .models import PerfilUsuario
+from .roles import invalidate_role
 
 User = get_user_model()
 
@@ -38,6 +39,7 @@ class UserSerializer(serializers.ModelSerializer):
 
         group, _ = Group.objects.get_or_create(name=role_name)
         user.groups.add(group)
+        invalidate_role(user)
 
         print(f"✅ Usuario {user.email} registrado con rol '{role_name}' correctamente")
 
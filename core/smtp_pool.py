@@ -0,0 +1,159 @@
+import logging
+import os
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPSendError(Exception):
+    """Falló un envío a mitad; done es cuántos mensajes (en orden) ya habían salido."""
+
+    def __init__(self, message, done):
+        super().__init__(message)
+        self.done = done
+
+
+class SMTPConnectionPool:
+    """Pool de conexiones SMTP ya autenticadas (STARTTLS + login una sola vez).
+
+    - Las conexiones libres se reutilizan mientras no superen EMAIL_SMTP_IDLE_SECONDS.
+    - Si el servidor cerró la conexión se reconecta una vez y se sigue desde el primer
+      mensaje no enviado (los que ya salieron no se repiten).
+    - Varios mensajes de un mismo envío salen por la misma conexión.
+    Lleva la cuenta de conexiones abiertas vs mensajes enviados.
+    """
+
+    def __init__(self, max_idle=4, idle_seconds=60.0):
+        self.max_idle = max_idle
+        self.idle_seconds = idle_seconds
+        self._idle = []  # [(backend, último uso)]
+        self._lock = threading.Lock()
+        self._stats = {"connections_opened": 0, "reconnects": 0, "messages_sent": 0, "errors": 0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _open(self):
+        connection = get_connection(fail_silently=False)
+        connection.open()
+        self._count("connections_opened")
+        return connection
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        now = time.monotonic()
+        expired = []
+        connection = None
+        with self._lock:
+            while self._idle:
+                candidate, last_used = self._idle.pop()
+                if now - last_used <= self.idle_seconds:
+                    connection = candidate
+                    break
+                expired.append(candidate)
+        for old in expired:
+            self._close(old)
+        return connection or self._open()
+
+    def release(self, connection):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((connection, time.monotonic()))
+                return
+        self._close(connection)
+
+    def send_messages(self, messages, fail_silently=False):
+        """Envía los mensajes por una conexión del pool. Devuelve cuántos salieron.
+
+        Los mensajes se entregan de a uno para saber hasta dónde se llegó: si el envío
+        falla a mitad se lanza SMTPSendError con la cantidad ya procesada.
+        """
+        messages = list(messages)
+        if not messages:
+            return 0
+        connection = None
+        done = 0
+        sent = 0
+        reconnected = False
+        try:
+            connection = self.acquire()
+            while done < len(messages):
+                try:
+                    sent += connection.send_messages([messages[done]]) or 0
+                except (smtplib.SMTPServerDisconnected, ConnectionError):
+                    if reconnected:
+                        raise
+                    # Conexión cerrada por el servidor (p.ej. inactividad): se abre otra y se
+                    # sigue desde este mensaje
+                    self._close(connection)
+                    connection = None
+                    connection = self._open()
+                    self._count("reconnects")
+                    reconnected = True
+                    continue
+                done += 1
+        except Exception as e:
+            self._count("errors")
+            self._count("messages_sent", sent)
+            if connection is not None:
+                self._close(connection)
+            if fail_silently:
+                return sent
+            raise SMTPSendError(str(e) or e.__class__.__name__, done) from e
+
+        self._count("messages_sent", sent)
+        self.release(connection)
+        return sent
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle_connections"] = len(self._idle)
+        opened = stats["connections_opened"]
+        stats["messages_per_connection"] = round(stats["messages_sent"] / opened, 2) if opened else 0.0
+        return stats
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool():
+    """Pool del proceso; se recrea tras un fork (los sockets no se comparten)."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = SMTPConnectionPool(
+                    max_idle=getattr(settings, "EMAIL_SMTP_POOL_SIZE", 4),
+                    idle_seconds=getattr(settings, "EMAIL_SMTP_IDLE_SECONDS", 60.0),
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def smtp_pool_stats():
+    pool = _pool
+    if pool is None:
+        return {"connections_opened": 0, "reconnects": 0, "messages_sent": 0, "errors": 0,
+                "idle_connections": 0, "messages_per_connection": 0.0}
+    return pool.stats()
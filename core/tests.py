@@ -1,9 +1,48 @@
+import os
+import smtplib
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+import httpx
 from PIL import Image
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import caches
+from django.db import DatabaseError, OperationalError, ProgrammingError, connection
+from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from .models import Empresa
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from . import authentication, sendgrid_client
+from .activity import get_last_activity, inactivity_elapsed, record_activity, touch_activity
+from .authentication import aplicar_contexto, load_user_context
+from .cache_backends import SQLiteCache
+from .email_outbox import OutboxDispatcher
+from .email_service import _send_via_sendgrid
+from .email_templates import (
+    ESTADO_POSTULACION_TEMPLATES, CompiledTemplate, SafeDict, render_email_template,
+    render_email_template_format_map,
+)
+from .lockout import get_lockout_backend
+from .ratelimit import SlidingWindowRateLimiter
+from .metrics import reconstruir_metricas
+from .models import EmailOutbox, Empresa, MetricaPostulacionDiaria, Postulacion, Roles, Vacante
+from .report_jobs import REPORT_JOB_KEY, ReportPool, esperar_pdf
+from .roles import (
+    ROLE_VERSION_KEY, get_role_version, get_supabase_empresa_id, get_supabase_role, invalidate_role, remember_role,
+    reset_role_cache_stats, role_cache_stats,
+)
+from .sendgrid_client import SendGridClient, get_sendgrid_client, sendgrid_client_stats
+from .smtp_pool import SMTPConnectionPool, SMTPSendError
 
 User = get_user_model()
 
@@ -99,3 +138,1095 @@ class EmpresaAPITests(APITestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Empresa.objects.filter(id=empresa.id).exists())
+
+
+class LoginLockoutTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="ana", email="ana@test.com", password="correcta123")
+        caches["auth"].clear()
+
+    def _login(self, password):
+        return self.client.post("/api/token/", {"username": "ana", "password": password}, format="json")
+
+    def test_bloquea_tras_n_fallos_y_avisa_una_vez(self):
+        """
+        ✅ Tras MAX_FAILED_LOGINS fallos la cuenta queda bloqueada (aun con la contraseña correcta) y se avisa una vez.
+        """
+        with mock.patch("core.middleware.LoginSecurityMiddleware._notify_account_locked") as notificar:
+            for _ in range(3):
+                self.assertEqual(self._login("incorrecta").status_code, 401)
+            bloqueado = self._login("correcta123")
+            self._login("incorrecta")
+
+        self.assertEqual(bloqueado.status_code, 403)
+        self.assertIn("blocked_until", bloqueado.json())
+        notificar.assert_called_once()
+        # Otro worker que intente avisar del mismo bloqueo no obtiene el permiso
+        backend = get_lockout_backend()
+        self.assertFalse(backend.claim_lock_notification("ana", backend.get_lock_until("ana")))
+
+    def test_aviso_de_bloqueo_se_encola_en_el_outbox_una_vez(self):
+        """
+        ✅ El aviso de bloqueo queda en el outbox al responder el intento que bloquea, y no se repite.
+        """
+        for _ in range(3):
+            self._login("incorrecta")
+        self.assertEqual(list(EmailOutbox.objects.values_list("recipients", flat=True)), [["ana@test.com"]])
+
+        for _ in range(2):
+            self.assertEqual(self._login("incorrecta").status_code, 403)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    def test_login_exitoso_reinicia_los_fallos(self):
+        """
+        ✅ Un login correcto limpia los fallos acumulados: hacen falta otros MAX_FAILED_LOGINS para bloquear.
+        """
+        for _ in range(2):
+            self.assertEqual(self._login("incorrecta").status_code, 401)
+        self.assertEqual(self._login("correcta123").status_code, 200)
+        for _ in range(2):
+            self.assertEqual(self._login("incorrecta").status_code, 401)
+        self.assertEqual(self._login("correcta123").status_code, 200)
+
+
+    def test_otras_rutas_no_pasan_por_el_limitador(self):
+        """
+        ✅ Solo POST /api/token/ consulta el limitador y el bloqueo; el resto de requests no toca la cache de auth.
+        """
+        with mock.patch("core.ratelimit.LoginRateLimiter.check", return_value=None) as limitador, \
+                mock.patch("core.middleware.LoginSecurityMiddleware._check_if_blocked", return_value=None) as bloqueo, \
+                mock.patch("core.middleware.LoginSecurityMiddleware._handle_login_attempt") as intento:
+            self.client.post("/api/token/refresh/", {"refresh": "x"}, format="json")
+            self.client.get("/api/token/")
+            self.client.get("/api/metrics/")
+            limitador.assert_not_called()
+            bloqueo.assert_not_called()
+            intento.assert_not_called()
+
+            self._login("incorrecta")
+        limitador.assert_called_once()
+        bloqueo.assert_called_once()
+        intento.assert_called_once()
+
+@override_settings(INACTIVITY_TIMEOUT=120, ACTIVITY_WRITE_GRANULARITY=15)
+class ActividadTests(APITestCase):
+    def setUp(self):
+        caches["activity"].clear()
+        self.usuario = User.objects.create_user(username="activa", email="activa@test.com")
+        remember_role(self.usuario, "admin")
+        self.addCleanup(caches["roles"].clear)
+
+    def test_escrituras_agrupadas_por_granularidad(self):
+        """
+        ✅ Dentro de ACTIVITY_WRITE_GRANULARITY los requests solo leen; la escritura se hace al cumplirse.
+        """
+        record_activity(self.usuario.id, now=1000)
+        with mock.patch.object(caches["activity"], "set", wraps=caches["activity"].set) as guardar:
+            self.assertFalse(touch_activity(self.usuario.id, 1000, now=1010))
+            self.assertIsNone(inactivity_elapsed(self.usuario.id, now=1014))
+            guardar.assert_not_called()
+
+            self.assertIsNone(inactivity_elapsed(self.usuario.id, now=1015))
+            guardar.assert_called_once()
+        self.assertEqual(get_last_activity(self.usuario.id), 1015)
+
+    def test_inactividad_suma_la_granularidad(self):
+        """
+        🚫 Pasado INACTIVITY_TIMEOUT + granularidad se rechaza con SESSION_TIMEOUT; justo antes la sesión sigue viva.
+        """
+        self.client.force_authenticate(self.usuario)
+        url = "/api/health/cache/"
+        with mock.patch("core.views.probe_caches", return_value=[]):
+            record_activity(self.usuario.id, now=time.time() - 130)
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+            record_activity(self.usuario.id, now=time.time() - 136)
+            respuesta = self.client.get(url)
+        self.assertEqual((respuesta.status_code, respuesta.data["error_code"]), (401, "SESSION_TIMEOUT"))
+
+
+class RolesCacheTests(APITestCase):
+    def setUp(self):
+        caches["roles"].clear()
+        self.addCleanup(caches["roles"].clear)
+        reset_role_cache_stats()
+        self.usuario = User.objects.create_user(username="cand", email="cand@test.com")
+
+    def _contadores(self):
+        stats = role_cache_stats()
+        return stats["request_hits"], stats["shared_hits"], stats["misses"]
+
+    def test_memo_del_request_y_cache_compartida(self):
+        """
+        ✅ La segunda consulta del rol no toca la BD (memo del request o cache compartida) e invalidate_role fuerza la relectura.
+        """
+        self.assertEqual(get_supabase_role(self.usuario), Roles.CANDIDATO)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_supabase_role(self.usuario), Roles.CANDIDATO)
+        # Otro request (otra instancia del usuario): sale de la cache compartida
+        otro_request = User.objects.get(pk=self.usuario.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_supabase_role(otro_request), Roles.CANDIDATO)
+        self.assertEqual(self._contadores(), (1, 1, 1))
+
+        self.usuario.groups.add(Group.objects.create(name="rrhh"))
+        invalidate_role(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(get_supabase_role(User.objects.get(pk=self.usuario.pk)), Roles.EMPLEADO_RRHH)
+        self.assertGreater(len(consultas), 1)
+        self.assertEqual(self._contadores(), (1, 1, 2))
+
+    def test_actualizar_rol_invalida_la_cache(self):
+        """
+        ✅ Tras PATCH actualizar_rol el siguiente request ve el rol nuevo, no el cacheado.
+        """
+        self.assertEqual(get_supabase_role(self.usuario), Roles.CANDIDATO)
+        admin = User.objects.create_user(username="jefe", email="jefe@test.com")
+        admin.role = Roles.ADMIN
+        self.client.force_authenticate(admin)
+
+        respuesta = self.client.patch(f"/api/usuarios/{self.usuario.id}/actualizar_rol/", {"rol": "rrhh"}, format="json")
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(get_supabase_role(User.objects.get(pk=self.usuario.pk)), Roles.EMPLEADO_RRHH)
+
+
+class RoleClaimsTests(APITestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        caches["roles"].clear()
+        self.addCleanup(caches["roles"].clear)
+        self.admin = User.objects.create_user(username="jefa", email="jefa@test.com", password="correcta123")
+        self.admin.groups.add(Group.objects.create(name="admin"))
+
+    def _login(self):
+        respuesta = self.client.post("/api/token/", {"username": "jefa", "password": "correcta123"}, format="json")
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data
+
+    def _refrescar(self, refresh):
+        respuesta = self.client.post("/api/token/refresh/", {"refresh": refresh}, format="json")
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data["access"]
+
+    def _consultar(self, access):
+        # Endpoint que exige rol admin: con claims vigentes el rol sale del token
+        with mock.patch("core.views.probe_caches", return_value=[]):
+            return self.client.get("/api/health/cache/", HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    @override_settings(JWT_ROLE_CLAIMS=True)
+    def test_cambio_de_rol_revoca_el_token_y_el_refresh_trae_la_version_nueva(self):
+        """
+        ✅ Claims firmados; invalidate_role deja el token TOKEN_STALE y el refresh emite uno con la nueva role_ver.
+        """
+        tokens = self._login()
+        claims = AccessToken(tokens["access"]).payload
+        self.assertEqual((claims["role"], claims["role_ver"]), ("admin", get_role_version(self.admin.id)))
+        with mock.patch("core.views.get_supabase_role") as rol_desde_bd:
+            self.assertEqual(self._consultar(tokens["access"]).status_code, 200)
+        rol_desde_bd.assert_not_called()
+
+        invalidate_role(self.admin)
+        obsoleto = self._consultar(tokens["access"])
+        self.assertEqual((obsoleto.status_code, obsoleto.data["error_code"]), (401, "TOKEN_STALE"))
+
+        nuevo = self._refrescar(tokens["refresh"])
+        self.assertEqual(AccessToken(nuevo)["role_ver"], get_role_version(self.admin.id))
+        self.assertNotEqual(AccessToken(nuevo)["role_ver"], claims["role_ver"])
+        self.assertEqual(self._consultar(nuevo).status_code, 200)
+
+    @override_settings(JWT_ROLE_CLAIMS=True)
+    def test_version_descartada_de_la_cache_no_acepta_tokens_viejos(self):
+        """
+        🚫 Si la clave de versión desaparece (cull, reinicio), el token no se acepta hasta refrescarlo.
+        """
+        tokens = self._login()
+        caches["roles"].delete(ROLE_VERSION_KEY.format(user_id=self.admin.id))
+
+        obsoleto = self._consultar(tokens["access"])
+        self.assertEqual((obsoleto.status_code, obsoleto.data["error_code"]), (401, "TOKEN_STALE"))
+        nuevo = self._refrescar(tokens["refresh"])
+        self.assertEqual(self._consultar(nuevo).status_code, 200)
+        # La versión recreada no coincide con la de tokens anteriores a la pérdida
+        self.assertNotEqual(AccessToken(nuevo)["role_ver"], AccessToken(tokens["access"])["role_ver"])
+
+    @override_settings(JWT_ROLE_CLAIMS=False)
+    def test_sin_role_claims_el_rol_sale_de_la_bd(self):
+        """
+        ✅ Con JWT_ROLE_CLAIMS=False el token no lleva rol y un cambio de rol no lo invalida.
+        """
+        tokens = self._login()
+        self.assertNotIn("role", AccessToken(tokens["access"]).payload)
+        self.assertNotIn("role_ver", AccessToken(tokens["access"]).payload)
+
+        invalidate_role(self.admin)
+        self.assertEqual(self._consultar(tokens["access"]).status_code, 200)
+        self.assertNotIn("role", AccessToken(self._refrescar(tokens["refresh"])).payload)
+
+
+class LoginRateLimitTests(APITestCase):
+    def setUp(self):
+        caches["auth"].clear()
+
+    def _login(self, username, ip="10.0.0.1", **extra):
+        return self.client.post(
+            "/api/token/", {"username": username, "password": "x"}, format="json", REMOTE_ADDR=ip, **extra
+        )
+
+    @override_settings(LOGIN_RATE_LIMIT_PER_IP=3)
+    def test_429_por_ip_aunque_cambie_x_forwarded_for(self):
+        """
+        ✅ Un password spray desde una IP recibe 429 con Retry-After; falsificar X-Forwarded-For no ayuda.
+        """
+        for i in range(3):
+            self.assertEqual(self._login(f"u{i}", HTTP_X_FORWARDED_FOR=f"203.0.113.{i}").status_code, 401)
+        with mock.patch("core.views.CustomTokenObtainPairSerializer.validate") as validate:
+            limitado = self._login("u9", HTTP_X_FORWARDED_FOR="203.0.113.9")
+
+        self.assertEqual(limitado.status_code, 429)
+        self.assertEqual(limitado.json()["error_code"], "LOGIN_RATE_LIMITED")
+        self.assertGreaterEqual(int(limitado["Retry-After"]), 1)
+        self.assertEqual(int(limitado["Retry-After"]), limitado.json()["retry_after_seconds"])
+        validate.assert_not_called()
+        # Otra IP no está limitada
+        self.assertEqual(self._login("u9", ip="10.0.0.2").status_code, 401)
+
+    @override_settings(LOGIN_RATE_LIMIT_PER_USER=2)
+    def test_429_por_usuario_desde_varias_ips(self):
+        """
+        ✅ El límite por usuario aplica aunque cada intento venga de otra IP, y los rechazos no se acumulan.
+        """
+        self.assertEqual(self._login("ana", ip="10.0.0.1").status_code, 401)
+        self.assertEqual(self._login("ana", ip="10.0.0.2").status_code, 401)
+        for ip in ("10.0.0.3", "10.0.0.4"):
+            limitado = self._login("ana", ip=ip)
+            self.assertEqual(limitado.status_code, 429)
+            self.assertIn("Retry-After", limitado)
+        # Los intentos rechazados no cuentan en el límite por IP
+        self.assertEqual(self._login("otro", ip="10.0.0.3").status_code, 401)
+
+    def test_intentos_concurrentes_no_superan_el_limite(self):
+        """
+        ✅ Con 20 intentos simultáneos y límite 5, el incr atómico deja pasar exactamente 5.
+        """
+        limiter = SlidingWindowRateLimiter("ip", 5, 60, "auth")
+        ahora = time.time()
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            esperas = list(pool.map(lambda _: limiter.acquire("10.0.0.1", ahora), range(20)))
+        self.assertEqual(esperas.count(0), 5)
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.cache = SQLiteCache(os.path.join(tmpdir, "cache.sqlite3"), {"KEY_PREFIX": "test"})
+
+    def test_add_incr_y_expiracion(self):
+        """
+        ✅ add solo crea la clave una vez, incr suma y las claves expiradas no se leen.
+        """
+        self.assertTrue(self.cache.add("intentos", 0, 60))
+        self.assertFalse(self.cache.add("intentos", 5, 60))
+        self.assertEqual(self.cache.incr("intentos"), 1)
+        self.assertEqual(self.cache.incr("intentos", 2), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr("no_existe")
+
+        self.cache.set("viejo", "x", -1)
+        self.assertIsNone(self.cache.get("viejo"))
+        self.assertEqual(self.cache.get_many(["intentos", "viejo"]), {"intentos": 3})
+
+    def _caches_sqlite(self, max_entries, compartida=False):
+        # Misma forma que settings.CACHES (qué alias comparten almacenamiento), en archivos temporales
+        tmpdir = tempfile.mkdtemp()
+        rutas = {}
+        config = {}
+        for alias, base in settings.CACHES.items():
+            ubicacion = "todas" if compartida else base["LOCATION"]
+            ruta = rutas.setdefault(ubicacion, os.path.join(tmpdir, f"{len(rutas)}.sqlite3"))
+            config[alias] = {
+                "BACKEND": "core.cache_backends.SQLiteCache", "LOCATION": ruta,
+                "KEY_PREFIX": base["KEY_PREFIX"], "OPTIONS": {"MAX_ENTRIES": max_entries},
+            }
+        return config
+
+    def _bloqueado_tras_flood(self, config):
+        with override_settings(CACHES=config):
+            backend = get_lockout_backend()
+            for _ in range(3):
+                backend.record_failure("ana")
+            for i in range(450):
+                caches["metrics"].set(f"dashboard:area-{i}", {"vacantes": []}, 3600)
+            return backend.get_lock_until("ana") is not None
+
+    def test_flood_de_claves_publicas_no_descarta_un_bloqueo(self):
+        """
+        ✅ Llenar la cache de métricas no hace cull de las claves de seguridad: el bloqueo sigue en pie.
+        """
+        self.assertTrue(self._bloqueado_tras_flood(self._caches_sqlite(max_entries=300)))
+        # Con un único almacenamiento el cull descartaba primero el bloqueo (expira antes)
+        self.assertFalse(self._bloqueado_tras_flood(self._caches_sqlite(max_entries=300, compartida=True)))
+        for alias in settings.SECURITY_CACHE_FEATURES if settings.CACHE_BACKEND != "redis" else ():
+            self.assertNotEqual(settings.CACHES[alias]["LOCATION"], settings.CACHES["metrics"]["LOCATION"])
+
+
+class CacheHealthTests(APITestCase):
+    def test_solo_admin_puede_consultar(self):
+        """
+        🚫 El chequeo de caches escribe en cada cache: anónimos y no admin no pueden llamarlo.
+        """
+        url = "/api/health/cache/"
+        with mock.patch("core.views.probe_caches", return_value=[{"alias": "default", "ok": True}]) as probe:
+            self.assertEqual(self.client.get(url).status_code, 401)
+            usuario = User.objects.create_user(username="cand", email="cand@test.com")
+            remember_role(usuario, "candidato")
+            self.client.force_authenticate(usuario)
+            self.assertEqual(self.client.get(url).status_code, 403)
+            probe.assert_not_called()
+
+            admin = User.objects.create_user(username="admin1", email="admin1@test.com")
+            remember_role(admin, "admin")
+            self.client.force_authenticate(admin)
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class SendGridBatchTests(SimpleTestCase):
+    @override_settings(SENDGRID_API_KEY="test-key", SENDGRID_BATCH_SIZE=1000)
+    def test_agrupa_destinatarios_en_personalizations(self):
+        """
+        ✅ 2500 destinatarios salen en 3 requests, con sustituciones propias y adjunto codificado una vez.
+        """
+        client = mock.Mock()
+        client.send.return_value = mock.Mock(status_code=202)
+        recipients = [f"c{i}@test.com" for i in range(2500)]
+
+        with mock.patch("core.email_service.get_sendgrid_client", return_value=client):
+            sent = _send_via_sendgrid(
+                "Hola -nombre-", "Texto", "<p>Hola -nombre-</p>", recipients,
+                attachments=[("cv.pdf", b"%PDF", "application/pdf")],
+                substitutions={"c1@test.com": {"nombre": "Ana"}},
+            )
+
+        self.assertTrue(sent)
+        payloads = [call.args[0] for call in client.send.call_args_list]
+        self.assertEqual([len(p["personalizations"]) for p in payloads], [1000, 1000, 500])
+        self.assertEqual(payloads[0]["personalizations"][1]["substitutions"], {"-nombre-": "Ana"})
+        self.assertNotIn("substitutions", payloads[0]["personalizations"][0])
+        self.assertIs(payloads[0]["attachments"], payloads[2]["attachments"])
+
+
+class SendGridClientTests(SimpleTestCase):
+    def setUp(self):
+        self.autorizaciones = []
+
+        def responder(request):
+            self.autorizaciones.append(request.headers["Authorization"])
+            # MockTransport no pasa por httpcore: se emula un pool que abre una sola conexión TCP
+            if len(self.autorizaciones) == 1:
+                request.extensions["trace"]("connection.connect_tcp.complete", {})
+            return httpx.Response(202)
+
+        transporte = httpx.MockTransport(responder)
+        construir = mock.patch(
+            "core.sendgrid_client.SendGridClient",
+            side_effect=lambda *args, **kwargs: SendGridClient(*args, transport=transporte, **kwargs),
+        )
+        self.construir = construir.start()
+        self.addCleanup(construir.stop)
+        sin_cliente = mock.patch.object(sendgrid_client, "_client", None)
+        sin_cliente.start()
+        self.addCleanup(sin_cliente.stop)
+
+    @override_settings(SENDGRID_API_KEY="key-1")
+    def test_reutiliza_el_cliente_y_lo_recrea_al_cambiar_la_key(self):
+        """
+        ✅ Varios envíos comparten un cliente (y su conexión); se recrea con otra API key o tras un fork.
+        """
+        cliente = get_sendgrid_client()
+        self.addCleanup(cliente.close)
+        for _ in range(3):
+            self.assertEqual(get_sendgrid_client().send({"personalizations": []}).status_code, 202)
+
+        self.assertEqual(self.construir.call_count, 1)
+        self.assertEqual(
+            {k: v for k, v in sendgrid_client_stats().items() if k != "errors"},
+            {"requests": 3, "new_connections": 1, "reused_connections": 2, "reuse_rate": 0.6667},
+        )
+
+        with override_settings(SENDGRID_API_KEY="key-2"):
+            nuevo = get_sendgrid_client()
+            self.addCleanup(nuevo.close)
+            self.assertIsNot(nuevo, cliente)
+            self.assertIs(get_sendgrid_client(), nuevo)
+            nuevo.send({"personalizations": []})
+        self.assertEqual(self.autorizaciones[-1], "Bearer key-2")
+        self.assertEqual(self.construir.call_count, 2)
+
+        # Mismo proceso padre tras un fork: el hijo no comparte el pool
+        with override_settings(SENDGRID_API_KEY="key-2"), \
+                mock.patch("core.sendgrid_client.os.getpid", return_value=os.getpid() + 1):
+            hijo = get_sendgrid_client()
+            self.addCleanup(hijo.close)
+        self.assertIsNot(hijo, nuevo)
+        self.assertEqual(self.construir.call_count, 3)
+
+
+class EmailTemplatesTests(SimpleTestCase):
+    ESTATICO = {"logo_url": "https://cdn.test/logo.png", "support_email": "soporte@test.com"}
+
+    def _contexto_estado(self):
+        # Mismos tipos que arma views._contexto_correo_estado (salario e id no son str)
+        return {
+            "vacante": "Backend", "empresa": "ACME", "empresa_mayus": "ACME",
+            "ubicacion": "Cali", "modalidad": "Remoto", "tipo_jornada": "Completa",
+            "salario": Decimal("3500000.00"), "fecha_actualizacion": "01/01/2026 a las 10:00",
+            "nombre": "Ana Gómez", "primer_nombre": "Ana", "postulacion_id": 42,
+            "fecha_postulacion": "01/12/2025",
+        }
+
+    def test_plantillas_de_estado_compiladas_igual_que_format_map(self):
+        """
+        ✅ Cada plantilla estado_* sale idéntica con CompiledTemplate y con format_map, con y sin valores faltantes.
+        """
+        for estado, template_key in ESTADO_POSTULACION_TEMPLATES.items():
+            for contexto in (self._contexto_estado(), {"nombre": "-nombre-", "postulacion_id": "-postulacion_id-"}):
+                with self.subTest(estado=estado, claves=sorted(contexto)):
+                    self.assertEqual(
+                        render_email_template(template_key, contexto),
+                        render_email_template_format_map(template_key, contexto),
+                    )
+
+    def test_contexto_estatico_incrustado_igual_que_format_map(self):
+        """
+        ✅ welcome, password_reset y account_locked con logo/soporte precompilados coinciden con format_map.
+        """
+        contextos = {
+            "welcome": {"user_name": "Ana", "login_url": "https://app.test/login"},
+            "password_reset": {"username": "ana", "reset_link": "https://app.test/reset/abc"},
+            # El contexto del request tiene prioridad sobre el estático
+            "account_locked": {"minutes_remaining": 15, "support_email": "seguridad@test.com"},
+        }
+        for template_key, contexto in contextos.items():
+            with self.subTest(template=template_key):
+                esperado = render_email_template_format_map(template_key, {**self.ESTATICO, **contexto})
+                self.assertEqual(render_email_template(template_key, contexto, static_context=self.ESTATICO), esperado)
+                # Segunda llamada: sale de la caché de plantillas compiladas
+                self.assertEqual(render_email_template(template_key, contexto, static_context=self.ESTATICO), esperado)
+
+    def test_compiled_template_respeta_formato_conversiones_y_fallback(self):
+        """
+        ✅ Especificadores de formato, !r/!s/!a, llaves escapadas y acceso por atributo se comportan como format_map.
+        """
+        contexto = {"n": 3.14159, "s": "ñandú", "i": 7, "obj": mock.Mock(nombre="Ana")}
+        for fuente in ("{n:.2f} {i:03d}", "{s!r} {s!a} {i!s}", "{{literal}} {i}", "{obj.nombre} {falta}", "{falta:>5}", "{"):
+            with self.subTest(fuente=fuente):
+                compilada = CompiledTemplate(fuente)
+                try:
+                    esperado = fuente.format_map(SafeDict(contexto))
+                except ValueError as e:
+                    with self.assertRaises(type(e)):
+                        compilada.render(contexto)
+                    continue
+                self.assertEqual(compilada.render(contexto), esperado)
+
+
+# SQL de core.roles para resolver rol/empresa sin el contexto del loader
+CONSULTAS_DE_CONTEXTO = ("SELECT role FROM auth_user", "SELECT id_empresa FROM auth_user", "auth_user_groups")
+
+
+class ContextoUsuarioTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin1", email="admin1@test.com")
+        self.admin.groups.add(Group.objects.create(name="admin"))
+        self.empresa = Empresa.objects.create(nombre="ACME", nit="1", direccion="Dir", owner=self.admin)
+        self.vacante = Vacante.objects.create(
+            id_empresa=self.empresa, titulo="Dev", descripcion="d", requisitos="r", estado="Publicado",
+            fecha_expiracion=timezone.now() + timedelta(days=30),
+        )
+        self.candidato = User.objects.create_user(username="cand", email="cand@test.com")
+        otro = User.objects.create_user(username="otro", email="otro@test.com")
+        self.postulacion = Postulacion.objects.create(
+            candidato=otro, vacante=self.vacante, empresa=self.empresa, fecha_postulacion=timezone.now()
+        )
+        caches["roles"].clear()
+        # Los ids se reutilizan entre tests: no dejar roles resueltos en la cache compartida
+        self.addCleanup(caches["roles"].clear)
+
+    def _autenticar(self, user, role=None, owned_ids=()):
+        # Instancia nueva por request, como la que arma la autenticación; con role se
+        # deja el mismo resultado que load_user_context (rol y empresa ya resueltos)
+        user = User.objects.get(pk=user.pk)
+        if role:
+            aplicar_contexto(user, role, None, list(owned_ids))
+        self.client.force_authenticate(user)
+
+    def _consultas(self, hacer_request):
+        with CaptureQueriesContext(connection) as capturadas:
+            hacer_request()
+        return [q["sql"] for q in capturadas.captured_queries]
+
+    def _de_contexto(self, consultas):
+        # Las que hace core.roles para resolver rol/empresa cuando el loader no dejó el contexto
+        return [sql for sql in consultas if any(patron in sql for patron in CONSULTAS_DE_CONTEXTO)]
+
+    def test_consultas_por_request_con_contexto_precargado(self):
+        """
+        ✅ Con el contexto del loader, listar, postular y cambiar estado no consultan rol ni empresa.
+        """
+        listar = lambda: self.assertEqual(self.client.get("/vacantes/").status_code, 200)  # noqa: E731
+        self._autenticar(self.admin)
+        sin_contexto = self._consultas(listar)
+        self._autenticar(self.admin, "admin", [self.empresa.id])
+        con_contexto = self._consultas(listar)
+
+        # La única diferencia son las consultas de rol/grupos que el contexto evita
+        self.assertTrue(self._de_contexto(sin_contexto))
+        self.assertEqual(self._de_contexto(con_contexto), [])
+        self.assertEqual(len(sin_contexto) - len(con_contexto), len(self._de_contexto(sin_contexto)))
+
+        self._autenticar(self.candidato, "candidato")
+        cv = SimpleUploadedFile("cv.pdf", b"%PDF-1.4")
+        with mock.patch("core.views._upload_to_cloudinary", return_value="https://res.cloudinary.com/demo/raw/upload/cv.pdf"):
+            consultas = self._consultas(lambda: self.assertEqual(
+                self.client.post(f"/vacantes/{self.vacante.id}/postular/", {"cv": cv}, format="multipart").status_code, 201
+            ))
+        self.assertEqual(self._de_contexto(consultas), [])
+
+        self._autenticar(self.admin, "admin", [self.empresa.id])
+        consultas = self._consultas(lambda: self.assertEqual(self.client.patch(
+            f"/reclutador/postulaciones/{self.postulacion.id}/estado/", {"estado": "Entrevista"}, format="json"
+        ).status_code, 200))
+        self.assertEqual(self._de_contexto(consultas), [])
+
+    def test_loader_en_sqlite_usa_la_resolucion_perezosa(self):
+        """
+        ✅ Sin PostgreSQL el loader no consulta nada, se desactiva y las vistas resuelven el rol como antes.
+        """
+        access = RefreshToken.for_user(self.admin).access_token
+        with mock.patch.object(authentication, "_context_query_supported", None):
+            usuario = User.objects.get(pk=self.admin.pk)
+            with self.assertNumQueries(0):
+                self.assertIs(load_user_context(usuario), usuario)
+            self.assertIs(authentication._context_query_supported, False)
+            self.assertFalse(hasattr(usuario, "owned_empresa_ids"))
+
+            respuesta = self.client.get("/vacantes/", HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_loader_deja_rol_y_empresas_de_una_consulta(self):
+        """
+        ✅ En PostgreSQL una sola consulta deja rol, empresa y empresas propias; luego core.roles no consulta.
+        """
+        usuario = User.objects.get(pk=self.admin.pk)
+        with mock.patch.object(authentication, "_context_query_supported", None), \
+                mock.patch("core.authentication.connection") as conexion:
+            conexion.vendor = "postgresql"
+            cursor = conexion.cursor.return_value.__enter__.return_value
+            cursor.fetchone.return_value = ("Administrator", None, [self.empresa.id])
+            load_user_context(usuario)
+            self.assertIs(authentication._context_query_supported, True)
+
+        cursor.execute.assert_called_once()
+        self.assertIn("ARRAY(SELECT e.id", cursor.execute.call_args.args[0])
+        self.assertEqual((usuario.role, usuario.owned_empresa_ids), ("admin", [self.empresa.id]))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_supabase_role(usuario), "admin")
+            self.assertEqual(get_supabase_empresa_id(usuario), self.empresa.id)
+
+    def test_error_transitorio_no_desactiva_el_loader(self):
+        """
+        ✅ Un error transitorio solo afecta a ese request; un error de esquema desactiva la consulta.
+        """
+        with mock.patch.object(authentication, "_context_query_supported", None), \
+                mock.patch("core.authentication.connection") as conexion:
+            conexion.vendor = "postgresql"
+            execute = conexion.cursor.return_value.__enter__.return_value.execute
+            execute.side_effect = OperationalError("server closed the connection unexpectedly")
+            load_user_context(User.objects.get(pk=self.admin.pk))
+            self.assertIsNone(authentication._context_query_supported)
+
+            execute.side_effect = ProgrammingError('column u.role does not exist')
+            load_user_context(User.objects.get(pk=self.admin.pk))
+            self.assertIs(authentication._context_query_supported, False)
+
+            # Desactivado: los siguientes requests ya no intentan la consulta
+            usuario = User.objects.get(pk=self.admin.pk)
+            self.assertIs(load_user_context(usuario), usuario)
+            self.assertEqual(execute.call_count, 2)
+
+
+class OutboxEntregaParcialTests(TestCase):
+    @override_settings(SENDGRID_API_KEY="test-key", SENDGRID_BATCH_SIZE=2)
+    def test_reintenta_solo_los_destinatarios_pendientes(self):
+        """
+        ✅ Si SendGrid entrega un lote y luego fallan SendGrid y SMTP, el reintento no repite ese lote.
+        """
+        recipients = [f"c{i}@test.com" for i in range(5)]
+        entry = EmailOutbox.objects.create(provider="sendgrid", subject="Hola", message="Texto", recipients=recipients)
+        client = mock.Mock()
+        client.send.side_effect = [mock.Mock(status_code=202), Exception("timeout")]
+        smtp = mock.Mock()
+        smtp.send_messages.side_effect = SMTPSendError("Connection unexpectedly closed", 0)
+        dispatcher = OutboxDispatcher(workers=1)
+
+        with mock.patch("core.email_service.get_sendgrid_client", return_value=client), \
+                mock.patch("core.email_service.get_smtp_pool", return_value=smtp):
+            self.assertFalse(dispatcher._deliver(entry))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, EmailOutbox.STATUS_PENDING)
+        self.assertEqual(entry.recipients, recipients[2:])
+
+        client.send.side_effect = None
+        client.send.return_value = mock.Mock(status_code=202)
+        client.send.reset_mock()
+        with mock.patch("core.email_service.get_sendgrid_client", return_value=client):
+            self.assertTrue(dispatcher._deliver(entry))
+        enviados = [p["to"][0]["email"] for call in client.send.call_args_list for p in call.args[0]["personalizations"]]
+        self.assertEqual(enviados, recipients[2:])
+        dispatcher.stop(wait=False)
+
+
+class OutboxReclamoTests(TestCase):
+    def setUp(self):
+        self.dispatcher = OutboxDispatcher(workers=1)
+        self.addCleanup(self.dispatcher.stop, wait=False)
+
+    def test_agotar_intentos_deja_la_fila_dead(self):
+        """
+        🚫 Al fallar el último de max_attempts intentos el correo queda "dead" y no se vuelve a reclamar.
+        """
+        EmailOutbox.objects.create(subject="Hola", message="Texto", recipients=["a@test.com"], attempts=1, max_attempts=2)
+        # _claim + _deliver en este hilo (run_once entrega en el pool, con otra conexión a la BD)
+        [entry] = self.dispatcher._claim(1)
+        with mock.patch("core.email_service.deliver_email", side_effect=RuntimeError("smtp caído")):
+            self.assertFalse(self.dispatcher._deliver(entry))
+
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts, entry.locked_at), (EmailOutbox.STATUS_DEAD, 2, None))
+        self.assertIn("smtp caído", entry.last_error)
+        self.assertEqual(self.dispatcher._claim(1), [])
+
+    def test_fila_abandonada_se_reclama_y_el_worker_lento_no_la_pisa(self):
+        """
+        ✅ Una fila "sending" vencida la reclama otro worker; el resultado del worker original ya no se guarda.
+        """
+        EmailOutbox.objects.create(subject="Hola", message="Texto", recipients=["a@test.com"])
+        lento = self.dispatcher._claim(1)[0]
+        EmailOutbox.objects.filter(id=lento.id).update(locked_at=timezone.now() - timedelta(seconds=301))
+        lento.refresh_from_db()
+
+        nuevo = self.dispatcher._claim(1)
+        self.assertEqual([e.id for e in nuevo], [lento.id])
+        self.assertGreater(nuevo[0].locked_at, lento.locked_at)
+
+        with mock.patch("core.email_service.deliver_email", side_effect=RuntimeError("timeout")):
+            self.assertFalse(self.dispatcher._deliver(lento))
+        entry = EmailOutbox.objects.get()
+        self.assertEqual((entry.status, entry.attempts), (EmailOutbox.STATUS_SENDING, 0))
+
+        with mock.patch("core.email_service.deliver_email"):
+            self.assertTrue(self.dispatcher._deliver(nuevo[0]))
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts, entry.locked_at), (EmailOutbox.STATUS_SENT, 1, None))
+
+
+class SMTPPoolTests(SimpleTestCase):
+    def _conexion(self, enviados, corta_tras=None):
+        # Conexión SMTP falsa que se cae cuando ya salieron `corta_tras` mensajes
+        conexion = mock.Mock()
+
+        def send_messages(mensajes):
+            if corta_tras is not None and len(enviados) >= corta_tras:
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            enviados.extend(mensajes)
+            return len(mensajes)
+
+        conexion.send_messages.side_effect = send_messages
+        return conexion
+
+    def test_reconecta_y_sigue_desde_el_primer_mensaje_no_enviado(self):
+        """
+        ✅ Si el servidor corta tras 2 mensajes se reconecta y no reenvía los que ya salieron.
+        """
+        enviados = []
+        pool = SMTPConnectionPool()
+        with mock.patch("core.smtp_pool.get_connection",
+                        side_effect=[self._conexion(enviados, corta_tras=2), self._conexion(enviados)]):
+            self.assertEqual(pool.send_messages(["m1", "m2", "m3", "m4", "m5"]), 5)
+
+        self.assertEqual(enviados, ["m1", "m2", "m3", "m4", "m5"])
+        self.assertEqual((pool.stats()["connections_opened"], pool.stats()["reconnects"]), (2, 1))
+
+        # Si también se cae la nueva conexión, el error indica cuántos mensajes ya salieron
+        enviados = []
+        with mock.patch("core.smtp_pool.get_connection",
+                        side_effect=[self._conexion(enviados, corta_tras=2), self._conexion(enviados, corta_tras=3)]):
+            with self.assertRaises(SMTPSendError) as error:
+                SMTPConnectionPool().send_messages(["m1", "m2", "m3", "m4", "m5"])
+        self.assertEqual(error.exception.done, 3)
+        self.assertEqual(enviados, ["m1", "m2", "m3"])
+
+
+class EstadoMasivoTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin1", email="admin1@test.com", password="12345678")
+        remember_role(self.admin, "admin")
+        empresa = Empresa.objects.create(nombre="ACME", nit="1", direccion="Dir", owner=self.admin)
+        self.vacante = Vacante.objects.create(
+            id_empresa=empresa, titulo="Dev", descripcion="d", requisitos="r", fecha_expiracion=timezone.now()
+        )
+        for i in range(3):
+            candidato = User.objects.create_user(username=f"cand{i}", email=f"cand{i}@test.com", first_name=f"C{i}")
+            Postulacion.objects.create(
+                candidato=candidato, vacante=self.vacante, empresa=empresa,
+                fecha_postulacion=timezone.now(), estado="Entrevista" if i == 2 else "Postulado",
+            )
+        self.client.force_authenticate(self.admin)
+
+    def test_rechaza_por_estado_en_un_envio(self):
+        """
+        ✅ Cambia solo las postulaciones filtradas, deja historial y encola un único correo masivo.
+        """
+        url = f"/reclutador/vacantes/{self.vacante.id}/postulaciones/estado/"
+        response = self.client.post(url, {"estado": "Rechazado", "estado_actual": "Postulado"}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["actualizadas"], 2)
+        self.assertEqual(Postulacion.objects.filter(estado="Rechazado").count(), 2)
+        self.assertEqual(Postulacion.objects.filter(estado="Entrevista").count(), 1)
+        rechazada = Postulacion.objects.filter(estado="Rechazado").first()
+        evento = rechazada.eventos.get()
+        self.assertEqual(evento.datos, {"anterior": "Postulado", "nuevo": "Rechazado"})
+        self.assertEqual(evento.actor, self.admin)
+
+        timeline = self.client.get(f"/postulaciones/{rechazada.id}/eventos/?limite=1")
+        self.assertEqual(timeline.status_code, 200)
+        self.assertEqual(timeline.data["eventos"][0]["resumen"], "Postulado → Rechazado")
+        self.assertIsNone(timeline.data["siguiente"])
+
+        outbox = EmailOutbox.objects.get()
+        self.assertEqual(sorted(outbox.recipients), ["cand0@test.com", "cand1@test.com"])
+        self.assertEqual(outbox.substitutions["cand0@test.com"]["nombre"], "C0")
+
+    def test_cambio_de_estado_con_estado_anterior_desactualizado_da_409(self):
+        """
+        🚫 Si la postulación cambió desde que el reclutador la vio, se responde 409 con el estado actual.
+        """
+        postulacion = Postulacion.objects.get(estado="Entrevista")
+        url = f"/reclutador/postulaciones/{postulacion.id}/estado/"
+
+        response = self.client.patch(url, {"estado": "Rechazado", "estado_anterior": "Postulado"}, format="json")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["estado_actual"], "Entrevista")
+        postulacion.refresh_from_db()
+        self.assertEqual(postulacion.estado, "Entrevista")
+        self.assertFalse(postulacion.eventos.exists())
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_fallo_del_outbox_no_revierte_el_cambio_de_estado(self):
+        """
+        ✅ Si el INSERT en el outbox falla, el estado, el historial y el rollup se guardan igual.
+        """
+        postulacion = Postulacion.objects.get(estado="Entrevista")
+        url = f"/reclutador/postulaciones/{postulacion.id}/estado/"
+
+        with mock.patch("core.email_service.enqueue_email", side_effect=DatabaseError("outbox caído")):
+            response = self.client.patch(url, {"estado": "Rechazado", "estado_anterior": "Entrevista"}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data["correo_enviado"])
+        postulacion.refresh_from_db()
+        self.assertEqual(postulacion.estado, "Rechazado")
+        self.assertEqual(postulacion.eventos.count(), 1)
+
+    def test_postulaciones_con_el_mismo_email_reciben_su_propio_correo(self):
+        """
+        ✅ Dos cuentas con el mismo email (en otras mayúsculas) no se pisan las sustituciones del envío masivo.
+        """
+        for username, email, nombre in (("dana", "Dup@test.com", "Dana"), ("dora", "dup@test.com", "Dora")):
+            candidato = User.objects.create_user(username=username, email=email, first_name=nombre)
+            Postulacion.objects.create(
+                candidato=candidato, vacante=self.vacante, empresa=self.vacante.id_empresa,
+                fecha_postulacion=timezone.now(), estado="Postulado",
+            )
+
+        url = f"/reclutador/vacantes/{self.vacante.id}/postulaciones/estado/"
+        response = self.client.post(url, {"estado": "Rechazado", "estado_actual": "Postulado"}, format="json")
+
+        self.assertEqual(response.data["actualizadas"], 4)
+        self.assertEqual(response.data["correos_encolados"], 4)
+        masivo = EmailOutbox.objects.exclude(substitutions={}).get()
+        self.assertEqual(sorted(masivo.substitutions), ["cand0@test.com", "cand1@test.com"])
+        individuales = {row.recipients[0]: row.message for row in EmailOutbox.objects.filter(substitutions={})}
+        self.assertEqual(sorted(individuales), ["Dup@test.com", "dup@test.com"])
+        self.assertIn("Dana", individuales["Dup@test.com"])
+        self.assertIn("Dora", individuales["dup@test.com"])
+        self.assertNotIn("Dora", individuales["Dup@test.com"])
+
+
+class ReportPoolTests(SimpleTestCase):
+    def test_en_proceso_no_bloquea_otros_submit(self):
+        """
+        ✅ Con workers=0 el render corre fuera del lock: un PDF lento no frena las demás solicitudes.
+        """
+        pool = ReportPool(workers=0)
+        liberar = threading.Event()
+
+        def lento(datos):
+            liberar.wait(5)
+            return b"lento"
+
+        hilo = threading.Thread(target=pool.submit, args=("a", lento, None))
+        hilo.start()
+        try:
+            inicio = time.monotonic()
+            self.assertEqual(pool.submit("b", lambda datos: b"rapido", None).future.result(), b"rapido")
+            self.assertLess(time.monotonic() - inicio, 1)
+            # Mientras "a" se genera, otra solicitud de la misma clave se une al trabajo
+            self.assertEqual(pool.stats()["in_flight"], 1)
+            trabajo = pool.submit("a", lento, None)
+        finally:
+            liberar.set()
+            hilo.join()
+        self.assertEqual(esperar_pdf(trabajo, 5), b"lento")
+        self.assertEqual((pool.stats()["joined"], pool.stats()["in_flight"]), (1, 0))
+
+
+@override_settings(REPORT_SYNC_WAIT_SECONDS=60)  # El primer PDF lanza el pool en frío
+class MetricsDashboardTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", email="owner@test.com", password="12345678")
+        empresa = Empresa.objects.create(nombre="ACME", nit="1", direccion="Dir", owner=self.owner)
+        self.ahora = timezone.now()
+        for v in range(5):
+            self.vacante = Vacante.objects.create(
+                id_empresa=empresa, titulo=f"Vac {v}", descripcion="d", requisitos="r", fecha_expiracion=self.ahora
+            )
+            for i in range(v):
+                Postulacion.objects.create(
+                    vacante=self.vacante, empresa=empresa, fecha_postulacion=self.ahora - timedelta(days=i),
+                    estado="Rechazado" if i % 2 else "Postulado",
+                )
+        reconstruir_metricas()
+        caches["metrics"].clear()
+        caches["reports"].clear()
+
+    def test_una_sola_consulta_para_todas_las_vacantes(self):
+        """
+        ✅ El dashboard no hace una consulta por vacante: siempre es un único GROUP BY.
+        """
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/metrics/")
+
+        self.assertEqual(response.status_code, 200)
+        vacantes = response.data["vacantes"]
+        self.assertEqual([v["total_postulaciones"] for v in vacantes], [0, 1, 2, 3, 4])
+        self.assertEqual(vacantes[4]["postulaciones_por_estado"], {"Postulado": 2, "Rechazado": 2})
+        self.assertIsNone(vacantes[0]["ultima_postulacion"])
+
+    def test_rollup_incremental_y_filtro_por_dias(self):
+        """
+        ✅ Un cambio de estado mueve el conteo en el rollup y from/to filtran por día.
+        """
+        remember_role(self.owner, "admin")
+        self.client.force_authenticate(self.owner)
+        postulacion = Postulacion.objects.filter(vacante=self.vacante, estado="Postulado").latest("fecha_postulacion")
+        with mock.patch("core.views._encolar_correo_estado", return_value=False):
+            response = self.client.patch(
+                f"/reclutador/postulaciones/{postulacion.id}/estado/", {"estado": "Entrevista"}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+
+        incremental = sorted(MetricaPostulacionDiaria.objects.filter(total__gt=0).values_list("vacante_id", "dia", "estado", "total"))
+        reconstruir_metricas()
+        self.assertEqual(incremental, sorted(MetricaPostulacionDiaria.objects.values_list("vacante_id", "dia", "estado", "total")))
+
+        hoy = self.ahora.date()
+        response = self.client.get("/api/metrics/", {"vacante_id": self.vacante.id, "from": (hoy - timedelta(days=1)).isoformat(), "to": hoy.isoformat()})
+        metricas = response.data["vacantes"][0]
+        self.assertEqual(metricas["total_postulaciones"], 2)
+        self.assertEqual(metricas["postulaciones_por_estado"], {"Entrevista": 1, "Rechazado": 1})
+
+    def test_cache_etag_y_304(self):
+        """
+        ✅ La segunda petición sale de cache, If-None-Match responde 304 y una escritura invalida.
+        """
+        Vacante.objects.filter(pk=self.vacante.pk).update(ubicacion="Bogotá")
+        primera = self.client.get("/api/metrics/", {"area": " Bogotá "})
+        self.assertEqual(primera["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            segunda = self.client.get("/api/metrics/", {"area": "bogotá"})
+        self.assertEqual(segunda["X-Cache"], "HIT")
+        self.assertEqual(segunda["ETag"], primera["ETag"])
+
+        no_modificada = self.client.get("/api/metrics/", {"area": "bogotá"}, HTTP_IF_NONE_MATCH=primera["ETag"])
+        self.assertEqual(no_modificada.status_code, 304)
+        self.assertEqual(no_modificada.content, b"")
+
+        remember_role(self.owner, "admin")
+        self.client.force_authenticate(self.owner)
+        postulacion = Postulacion.objects.filter(vacante=self.vacante, estado="Postulado").first()
+        with self.captureOnCommitCallbacks(execute=True), mock.patch("core.views._encolar_correo_estado", return_value=False):
+            self.client.patch(f"/reclutador/postulaciones/{postulacion.id}/estado/", {"estado": "Contratado"}, format="json")
+
+        tras_cambio = self.client.get("/api/metrics/", HTTP_IF_NONE_MATCH=primera["ETag"])
+        self.assertEqual(tras_cambio.status_code, 200)
+        self.assertEqual(tras_cambio["X-Cache"], "MISS")
+        self.assertNotEqual(tras_cambio["ETag"], primera["ETag"])
+
+    def test_filtros_desconocidos_no_crean_claves(self):
+        """
+        🚫 Áreas o vacantes inexistentes no se cachean y fechas fuera del rango comparten clave.
+        """
+        Vacante.objects.filter(pk=self.vacante.pk).update(ubicacion="Cali")
+        # Conocidos: se calculan una vez por versión de métricas
+        self.client.get("/api/metrics/", {"area": "cali"})
+
+        with mock.patch.object(caches["metrics"], "set") as guardar:
+            for i in range(20):
+                self.assertEqual(self.client.get("/api/metrics/", {"area": f"x{i}"})["X-Cache"], "MISS")
+                self.assertEqual(self.client.get("/api/metrics/", {"vacante_id": 10_000 + i})["X-Cache"], "MISS")
+        guardar.assert_not_called()
+
+        self.assertEqual(self.client.get("/api/metrics/", {"area": " CALI "})["X-Cache"], "HIT")
+        sin_filtro = self.client.get("/api/metrics/")
+        for fechas in ({"from": "1900-01-01"}, {"to": "2999-12-31"}, {"from": "1999-05-05", "to": "2999-01-01"}):
+            respuesta = self.client.get("/api/metrics/", fechas)
+            self.assertEqual((respuesta["X-Cache"], respuesta["ETag"]), ("HIT", sin_filtro["ETag"]))
+
+    def test_export_csv_en_streaming(self):
+        """
+        ✅ El CSV se entrega en streaming con una fila por estado.
+        """
+        response = self.client.get(f"/api/metrics/vacante/{self.vacante.id}/export/csv/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lineas = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(lineas[0].split(",")[:2], ["vacante_id", "titulo"])
+        self.assertEqual(sorted(linea.split(",")[-2:] for linea in lineas[1:]), [["Postulado", "2"], ["Rechazado", "2"]])
+
+    def test_export_excel_es_xlsx(self):
+        """
+        ✅ format=excel devuelve un XLSX con celdas tipadas y la hoja por estado; los estados heredados van a "Otros".
+        """
+        from openpyxl import load_workbook
+
+        # Estado heredado que ya no está en Postulacion.ESTADOS
+        heredada = Postulacion.objects.filter(vacante=self.vacante, estado="Rechazado").first()
+        Postulacion.objects.filter(pk=heredada.pk).update(estado="Aplicado")
+        reconstruir_metricas()
+
+        response = self.client.get(f"/api/metrics/vacante/{self.vacante.id}/export/excel/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("spreadsheetml", response["Content-Type"])
+        libro = load_workbook(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(libro.sheetnames, ["Métricas", "Por estado"])
+        fila = next(libro["Métricas"].iter_rows(min_row=2, values_only=True))
+        self.assertEqual(fila[0], self.vacante.id)
+        self.assertIsInstance(fila[5], datetime)
+        pivote = list(libro["Por estado"].iter_rows(values_only=True))
+        por_estado = dict(zip(pivote[0], pivote[1]))
+        self.assertEqual(
+            (por_estado["total_postulaciones"], por_estado["Postulado"], por_estado["Rechazado"], por_estado["Otros"]),
+            (4, 2, 1, 1),
+        )
+        conteos = pivote[1][pivote[0].index("total_postulaciones") + 1:pivote[0].index("ultima_postulacion")]
+        self.assertEqual(sum(conteos), por_estado["total_postulaciones"])
+
+    def test_pdf_cacheado_y_logo_descargado_una_vez(self):
+        """
+        ✅ La segunda descarga del mismo PDF sale de cache y el logo se descarga una sola vez.
+        """
+        logo = BytesIO()
+        Image.new("RGB", (20, 20), "red").save(logo, format="PNG")
+        respuesta_logo = mock.MagicMock()
+        respuesta_logo.__enter__.return_value.read.return_value = logo.getvalue()
+        Empresa.objects.update(logo_url="https://example.com/logo.png")
+        url = f"/api/metrics/vacante/{self.vacante.id}/export/pdf/"
+
+        with tempfile.TemporaryDirectory() as logos, override_settings(REPORT_LOGO_CACHE_DIR=logos), \
+                mock.patch("core.reports.urllib.request.urlopen", return_value=respuesta_logo) as urlopen:
+            primera = self.client.get(url, {"from": "2020-01-01"})
+            segunda = self.client.get(url, {"from": "2020-01-01T00:00:00"})
+            caches["reports"].clear()
+            tercera = self.client.get(url)
+
+        self.assertEqual(primera.status_code, 200)
+        self.assertTrue(primera.content.startswith(b"%PDF"))
+        self.assertEqual((primera["X-Cache"], segunda["X-Cache"], tercera["X-Cache"]), ("MISS", "HIT", "MISS"))
+        self.assertEqual(segunda.content, primera.content)
+        urlopen.assert_called_once()
+
+    def test_pdf_con_grafico_reportlab(self):
+        """
+        ✅ Con REPORT_CHART_ENGINE=reportlab el gráfico es vectorial y no se reutiliza el PDF del otro motor.
+        """
+        url = f"/api/metrics/vacante/{self.vacante.id}/export/pdf/"
+        matplotlib_pdf = self.client.get(url)
+        with override_settings(REPORT_CHART_ENGINE="reportlab"):
+            reportlab_pdf = self.client.get(url)
+
+        self.assertEqual(reportlab_pdf.status_code, 200)
+        self.assertTrue(reportlab_pdf.content.startswith(b"%PDF"))
+        self.assertEqual((matplotlib_pdf["X-Cache"], reportlab_pdf["X-Cache"]), ("MISS", "MISS"))
+        # El gráfico de matplotlib va como imagen PNG; el de reportlab son vectores
+        self.assertIn(b"/Subtype /Image", matplotlib_pdf.content)
+        self.assertNotIn(b"/Subtype /Image", reportlab_pdf.content)
+
+    def test_pdf_sincrono_no_retiene_el_worker(self):
+        """
+        ✅ Si el PDF no está en REPORT_SYNC_WAIT_SECONDS se responde 202 con el job en lugar de esperar.
+        """
+        trabajo = mock.Mock()
+        trabajo.terminado.wait.return_value = False
+        job = {"id": "abc", "clave": "pdf:x", "filename": "x.pdf", "requiere_admin": False, "creado": time.time()}
+        with override_settings(REPORT_SYNC_WAIT_SECONDS=1.5), \
+                mock.patch("core.views.solicitar_pdf_vacante", return_value=(job, trabajo)):
+            respuesta = self.client.get(f"/api/metrics/vacante/{self.vacante.id}/export/pdf/")
+
+        self.assertEqual(respuesta.status_code, 202)
+        trabajo.terminado.wait.assert_called_once_with(1.5)
+        self.assertEqual(respuesta.data["estado"], "pendiente")
+        self.assertTrue(respuesta.data["status_url"].endswith("/api/metrics/reportes/abc/"))
+
+    def test_reporte_descartado_de_la_cache_queda_expirado(self):
+        """
+        🚫 Si el PDF se descartó de la cache el job no queda 'pendiente' para siempre: pasa a expirado (410).
+        """
+        # Job cuyo PDF ya no está (descartado de la cache o el worker murió antes de guardarlo)
+        job = {"id": "huerfano", "clave": "pdf_vacante:descartado", "filename": "x.pdf", "requiere_admin": False,
+               "creado": time.time()}
+        caches["reports"].set(REPORT_JOB_KEY.format(job_id=job["id"]), job, 3600)
+        url = f"/api/metrics/reportes/{job['id']}/"
+
+        self.assertEqual(self.client.get(url).data["estado"], "pendiente")
+        with mock.patch("core.report_jobs.time.time", return_value=job["creado"] + 301):
+            estado = self.client.get(url).data
+            descarga = self.client.get(f"{url}descarga/")
+        self.assertEqual(estado["estado"], "expirado")
+        self.assertEqual(descarga.status_code, 410)
+
+    def test_reporte_asincrono_solicitar_consultar_descargar(self):
+        """
+        ✅ El PDF se genera en el pool de reportes: 202 con job, polling hasta 'listo' y descarga.
+        """
+        creado = self.client.post("/api/metrics/reportes/", {"tipo": "vacante", "vacante_id": self.vacante.id}, format="json")
+        self.assertEqual(creado.status_code, 202)
+        self.assertEqual(creado.data["estado"], "pendiente")
+
+        limite = time.monotonic() + 60
+        estado = creado.data
+        while estado["estado"] == "pendiente" and time.monotonic() < limite:
+            time.sleep(0.05)
+            estado = self.client.get(creado.data["status_url"]).data
+        self.assertEqual(estado["estado"], "listo")
+
+        descarga = self.client.get(creado.data["download_url"])
+        self.assertEqual(descarga.status_code, 200)
+        self.assertTrue(descarga.content.startswith(b"%PDF"))
+
+        # El reporte de todas las vacantes es solo para admin
+        self.assertEqual(self.client.post("/api/metrics/reportes/", {"tipo": "metricas"}, format="json").status_code, 403)
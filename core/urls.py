@@ -41,18 +41,27 @@ urlpatterns = [
     path("api/favoritos/<int:candidato_id>/", FavoritosView.as_view()),
     path("vacantes/<int:id_vacante>/postulaciones/", views.listar_postulaciones_por_vacante, name="listar_postulaciones_por_vacante"), # GET (Ver postulaciones del usuario logueado)
     path('reclutador/postulaciones/<int:postulacion_id>/estado/', actualizar_estado_postulacion),
+    path('reclutador/vacantes/<int:vacante_id>/postulaciones/estado/', views.actualizar_estado_postulaciones_masivo, name='actualizar_estado_postulaciones_masivo'),
+    path('postulaciones/<int:postulacion_id>/eventos/', views.eventos_postulacion, name='eventos_postulacion'),
     path('reclutador/postulaciones/<int:postulacion_id>/contactar/', contactar_candidato),
      # Métricas (solo admin)
     path('api/metrics/', views.metrics_dashboard, name='metrics_dashboard'),
     path('api/metrics/export/', views.export_metrics, name='export_metrics'),
     # Export por vacante con formato en la ruta para evitar problemas con query params desde clientes
     path('api/metrics/vacante/<int:vacante_id>/export/<str:fmt>/', views.export_metrics_vacante, name='export_metrics_vacante'),
+    # Reportes PDF asíncronos: solicitar, consultar estado y descargar
+    path('api/metrics/reportes/', views.crear_reporte, name='crear_reporte'),
+    path('api/metrics/reportes/<str:job_id>/', views.estado_reporte, name='estado_reporte'),
+    path('api/metrics/reportes/<str:job_id>/descarga/', views.descargar_reporte, name='descargar_reporte'),
     
     # Crear entrevista
     path("api/entrevistas/", EntrevistaView.as_view(), name="crear_entrevista"),
 
     # Marcar actividad del usuario autenticado
     path("api/auth/heartbeat/", SessionHeartbeatView.as_view(), name="session_heartbeat"),
+
+    # Estado/latencia de las caches compartidas
+    path("api/health/cache/", views.CacheHealthView.as_view(), name="cache_health"),
     
     # Obtener, actualizar o eliminar una entrevista
     path("api/entrevistas/<int:entrevista_id>/", EntrevistaView.as_view(),
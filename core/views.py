@@ -1,16 +1,17 @@
 # core/views.py
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.views import APIView
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from urllib.parse import urlencode
 from django.contrib.auth.tokens import default_token_generator
 from django.conf import settings
+from django.urls import reverse
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 import os
@@ -18,16 +19,37 @@ import os
 
 
 from .serializers_user import PerfilSerializer, UserSerializer
-from .models import Empresa, Entrevista, Postulacion, VacanteRRHH
+from .models import Empresa, Entrevista, Postulacion, PostulacionEvento, VacanteRRHH
 
 from .serializers_user import PerfilSerializer, UserSerializer, PerfilUsuarioSerializer
 from .models import Empresa
 
 from .serializers import EmpresaSerializer, UsuarioSerializer, PostulacionSerializer, EntrevistaSerializer
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .models import Roles
-from .email_service import send_plain_email, send_template_email, send_message_async
+from .email_service import send_bulk_email, send_plain_email, send_template_email, send_message_async, substitution_tag
+from .activity import record_activity
+from .authentication import RoleRefreshToken
+from .cache_backends import probe_caches
+from .email_templates import ESTADO_POSTULACION_TEMPLATES, render_email_template
+from .eventos import con_ultimo_evento, registrar_cambios_estado, registrar_evento, resumen_ultimo_evento, serializar_evento
+from .metrics import (
+    XLSX_CONTENT_TYPE,
+    csv_streaming,
+    escribir_xlsx,
+    filas_exportacion,
+    iterar_metricas,
+    metricas_dashboard_cacheadas,
+    registrar_cambios_estado_metricas,
+    registrar_metricas_304,
+    registrar_postulacion_metricas,
+)
+from .report_jobs import (
+    ESTADO_ERROR, ESTADO_EXPIRADO, ColaReportesLlena, esperar_pdf, estado_job, obtener_job, pdf_job,
+)
+from .reports import solicitar_pdf_metricas, solicitar_pdf_vacante
+from .roles import get_supabase_empresa_id, get_supabase_role, invalidate_role, normalize_role
 
 from rest_framework import generics, permissions
 
@@ -36,7 +58,7 @@ from rest_framework.decorators import api_view
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from .serializers import VacanteSerializer
-from datetime import datetime
+from datetime import datetime, timezone as dt_timezone
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from .middleware import CheckUserInactivityPermission
@@ -47,14 +69,12 @@ from .models import Vacante, Postulacion, Empresa
 import logging
 from .models import Favorito
 from .serializers import FavoritoSerializer
-from django.db.models import Count, Max
 from django.db import transaction
 from django.db import connection
 import io
-import csv
+import tempfile
 import time
 import os
-from io import BytesIO
 import cloudinary
 import cloudinary.api
 import cloudinary.uploader
@@ -90,71 +110,6 @@ def _upload_to_cloudinary(file_bytes, folder, filename, resource_type="auto"):
 
 
 
-def get_supabase_role(user):
-    """Obtiene el rol del usuario desde la BD (prioriza SQL raw sobre atributo en memoria)"""
-    # Primero intentar leer directamente de la BD para asegurar que esté actualizado
-    from django.db import connection
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute('SELECT role FROM auth_user WHERE id = %s', [user.id])
-            row = cursor.fetchone()
-            if row and row[0]:
-                return normalize_role(row[0])
-    except Exception:
-        pass
-    
-    # Fallback a atributo en memoria
-    role = getattr(user, "role", None)
-    if role:
-        return normalize_role(role)
-
-    # Fallback a grupos de Django
-    group_names = {g.name.lower() for g in user.groups.all()}
-    if "admin" in group_names:
-        return Roles.ADMIN
-    if "empleado_rrhh" in group_names or "rrhh" in group_names:
-        return Roles.EMPLEADO_RRHH
-    return Roles.CANDIDATO
-
-
-def normalize_role(role):
-    """
-    Normaliza variantes posibles del rol desde Supabase o desde el atributo Django
-    y devuelve la forma canónica utilizada en la aplicación.
-    """
-    if not role:
-        return None
-    r = str(role).strip().lower()
-    # Mapear variantes comunes a los roles canónicos
-    if r in ("admin", "administrator", "owner"):
-        return Roles.ADMIN
-    if r in ("rrhh", "recursos humanos", "recursoshumanos", "empleado_rrhh", "empleado-rrhh", "rrhh_empleado"):
-        return Roles.EMPLEADO_RRHH
-    if r in ("candidato", "candidate"):
-        return Roles.CANDIDATO
-    return r
-
-
-def get_supabase_empresa_id(user):
-    # 1) Empresa asignada directamente al usuario (RRHH/candidato promovido).
-    assigned_empresa = getattr(user, "id_empresa", None)
-    if assigned_empresa:
-        return assigned_empresa
-
-    # 2) Fallback a columna real en auth_user cuando el modelo no expone el campo.
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT id_empresa FROM auth_user WHERE id = %s", [user.id])
-            row = cursor.fetchone()
-            if row and row[0]:
-                return row[0]
-    except Exception:
-        pass
-
-    # 3) Si es owner de empresa (admin dueño), usar esa empresa.
-    owned_empresa = Empresa.objects.filter(owner=user).values_list("id", flat=True).first()
-    return owned_empresa
-
 from .models import PerfilUsuario, validate_hoja_vida
 from rest_framework import status, permissions, parsers 
 import time
@@ -346,6 +301,8 @@ class AsignarEmpleadoView(APIView):
                 rrhh_group, _ = Group.objects.get_or_create(name=Roles.EMPLEADO_RRHH)
                 empleado.groups.add(rrhh_group)
 
+            invalidate_role(empleado)
+
         except Exception as e:
             logger.exception("Error actualizando empleado durante asignacion")
             detail = str(e) if settings.DEBUG else "Error interno"
@@ -769,15 +726,24 @@ def postular_vacante(request, vacante_id):
         except Exception:
             cv_preview_url = None
 
-    # 9) Crear postulación
-    postulacion = Postulacion.objects.create(
-        candidato=request.user,
-        vacante=vacante,
-        empresa=vacante.id_empresa,
-        cv_url=url_final,
-        estado="Postulado",
-        fecha_postulacion=timezone.now()
-    )
+    # 9) Crear postulación (y sumarla al rollup de métricas en la misma transacción)
+    with transaction.atomic():
+        postulacion = Postulacion.objects.create(
+            candidato=request.user,
+            vacante=vacante,
+            empresa=vacante.id_empresa,
+            cv_url=url_final,
+            estado="Postulado",
+            fecha_postulacion=timezone.now()
+        )
+        registrar_evento(
+            postulacion.id,
+            PostulacionEvento.TIPO_POSTULACION,
+            actor=request.user,
+            resumen=f"Postulación a {vacante.titulo}",
+            cv_url=url_final,
+        )
+        registrar_postulacion_metricas(postulacion)
 
     # 10) Enviar correo de confirmacion
     try:
@@ -825,20 +791,25 @@ Sistema de Gestión de Candidatos | TalentoHub
 Correo generado el {timezone.now().strftime('%d/%m/%Y a las %H:%M')}
 """
 
+        # Solo se encola: el outbox lo entrega (con reintentos) fuera del request
         sent = send_plain_email(
             subject=asunto,
             message=mensaje,
             recipient_list=[candidato.email],
             fail_silently=True,
+            async_send=True,
         )
 
         if sent:
-            logger.info(f"✅ Correo enviado exitosamente a {candidato.email}")
-            comentario = f"\n[{timezone.now().isoformat()}] Correo de confirmación enviado a {candidato.email}"
-            postulacion.comentarios = (postulacion.comentarios or "") + comentario
-            postulacion.save(update_fields=["comentarios"])
+            logger.info(f"✅ Correo de confirmación encolado para {candidato.email}")
+            registrar_evento(
+                postulacion.id,
+                PostulacionEvento.TIPO_CORREO,
+                resumen=f"Correo de confirmación encolado para {candidato.email}",
+                destinatario=candidato.email,
+            )
         else:
-            logger.warning(f"⚠️ No se pudo enviar correo de confirmación a {candidato.email}")
+            logger.warning(f"⚠️ No se pudo encolar correo de confirmación a {candidato.email}")
 
     except Exception as e:
         logger.error(f"❌ Error enviando correo de confirmación: {e}")
@@ -881,7 +852,7 @@ def listar_postulaciones_por_vacante(request, id_vacante):
     if role == Roles.EMPLEADO_RRHH and id_empresa_usuario != vacante_empresa_id:
         return Response({"detail": "No pertenece a tu empresa"}, status=403)
 
-    postulaciones = Postulacion.objects.filter(vacante_id=id_vacante)
+    postulaciones = con_ultimo_evento(Postulacion.objects.filter(vacante_id=id_vacante))
     serializer = PostulacionSerializer(postulaciones, many=True)
 
     return Response(serializer.data)
@@ -893,9 +864,12 @@ def metrics_dashboard(request):
     """Devuelve métricas agregadas por vacante. Público.
 
     Filtros por query params:
-    - from: ISO date (yyyy-mm-dd) fecha mínima de postulacion
-    - to: ISO date fecha máxima
+    - from: ISO date (yyyy-mm-dd) día mínimo de postulacion (inclusive)
+    - to: ISO date día máximo (inclusive)
     - area: cadena que filtra `Vacante.ubicacion` (icontains)
+    Se lee del rollup diario (MetricaPostulacionDiaria), no de core_postulaciones.
+    La respuesta se cachea por parámetros normalizados y lleva ETag/Last-Modified:
+    con If-None-Match (o If-Modified-Since) vigente responde 304 sin cuerpo.
     """
     fecha_from = request.GET.get('from')
     fecha_to = request.GET.get('to')
@@ -903,45 +877,175 @@ def metrics_dashboard(request):
     # Aceptar vacante_id o id_vacante como query param (por compatibilidad con Postman screenshots)
     vacante_param = request.GET.get('vacante_id') or request.GET.get('id_vacante')
 
-    vacantes_qs = Vacante.objects.all()
+    vac_id = None
     if vacante_param:
         try:
             vac_id = int(vacante_param)
-            vacantes_qs = vacantes_qs.filter(id=vac_id)
         except Exception:
             pass
-    if area:
-        vacantes_qs = vacantes_qs.filter(ubicacion__icontains=area)
 
-    out = []
-    for v in vacantes_qs:
-        postulaciones = Postulacion.objects.filter(vacante=v)
-        if fecha_from:
-            try:
-                postulaciones = postulaciones.filter(fecha_postulacion__gte=fecha_from)
-            except Exception:
-                pass
-        if fecha_to:
-            try:
-                postulaciones = postulaciones.filter(fecha_postulacion__lte=fecha_to)
-            except Exception:
-                pass
+    # Una sola consulta agrupada sobre el rollup diario, cacheada hasta la próxima escritura (ver core/metrics.py)
+    entrada, hit = metricas_dashboard_cacheadas(vacante_id=vac_id, area=area, fecha_from=fecha_from, fecha_to=fecha_to)
 
-        total = postulaciones.count()
-        por_estado = {row['estado']: row['count'] for row in postulaciones.values('estado').annotate(count=Count('id'))}
-        ultima = postulaciones.aggregate(last=Max('fecha_postulacion')).get('last')
+    if _metricas_no_modificadas(request, entrada):
+        registrar_metricas_304()
+        response = Response(status=304)
+    else:
+        response = Response(entrada['data'])
+    response['ETag'] = entrada['etag']
+    response['Last-Modified'] = http_date(entrada['last_modified'])
+    # Públicas, pero el cliente debe revalidar siempre (normalmente un 304 barato)
+    response['Cache-Control'] = 'public, no-cache'
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+def _metricas_no_modificadas(request, entrada):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = [etag[2:] if etag.startswith('W/') else etag for etag in parse_etags(if_none_match)]
+        return '*' in etags or entrada['etag'] in etags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE') or '')
+    return if_modified_since is not None and entrada['last_modified'] <= if_modified_since
+
+
+def _es_admin(request):
+    if not request.user or not request.user.is_authenticated:
+        return False
+    return normalize_role(getattr(request.user, 'role', None) or get_supabase_role(request.user)) == Roles.ADMIN
+
+
+def _serializar_reporte(request, job):
+    estado, error = estado_job(job)
+    return {
+        'job_id': job['id'],
+        'estado': estado,
+        'error': error,
+        'creado': datetime.fromtimestamp(job['creado'], tz=dt_timezone.utc),
+        'status_url': request.build_absolute_uri(reverse('estado_reporte', args=[job['id']])),
+        'download_url': request.build_absolute_uri(reverse('descargar_reporte', args=[job['id']])),
+    }
+
+
+def _respuesta_cola_llena():
+    return Response(
+        {'error': 'Hay demasiados reportes en proceso. Intenta de nuevo en unos segundos.'},
+        status=503,
+        headers={'Retry-After': '5'},
+    )
 
-        out.append({
-            'vacante_id': v.id,
-            'titulo': v.titulo,
-            'empresa_id': v.id_empresa_id,
-            'empresa_nombre': v.id_empresa.nombre if v.id_empresa else None,
-            'total_postulaciones': total,
-            'postulaciones_por_estado': por_estado,
-            'ultima_postulacion': ultima,
-        })
 
-    return Response({'vacantes': out})
+def _respuesta_pdf(request, solicitar, error_importacion):
+    """Exportación PDF síncrona: se genera en el pool de reportes y se espera hasta
+    REPORT_SYNC_WAIT_SECONDS. Si tarda más se responde 202 con el job para hacer polling."""
+    try:
+        job, trabajo = solicitar()
+        if trabajo is None:
+            pdf = pdf_job(job)
+        else:
+            pdf = esperar_pdf(trabajo, getattr(settings, 'REPORT_SYNC_WAIT_SECONDS', 2))
+    except ColaReportesLlena:
+        return _respuesta_cola_llena()
+    except ImportError:
+        return Response({'error': error_importacion}, status=400)
+
+    if pdf is None:
+        return Response(_serializar_reporte(request, job), status=202)
+    return HttpResponse(pdf, content_type='application/pdf', headers={
+        'Content-Disposition': f'attachment; filename="{job["filename"]}"',
+        'X-Cache': 'HIT' if trabajo is None else 'MISS',
+    })
+
+
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def crear_reporte(request):
+    """Solicita un reporte PDF sin esperar a que se genere (pool de reportes).
+
+    URL: POST /api/metrics/reportes/
+    Body (JSON):
+    {"tipo": "vacante", "vacante_id": 5, "from": "2026-01-01", "to": "2026-01-31"}
+    {"tipo": "metricas", "vacante_id": 5, "area": "Bogotá", "from": ..., "to": ...}  (solo admin)
+    Responde 202 con job_id, estado y las URLs de estado y descarga.
+    """
+    tipo = request.data.get('tipo') or 'vacante'
+    fecha_from = request.data.get('from')
+    fecha_to = request.data.get('to')
+    vacante_id = request.data.get('vacante_id')
+
+    if tipo == 'vacante':
+        try:
+            vacante = Vacante.objects.select_related('id_empresa').get(id=int(vacante_id))
+        except (TypeError, ValueError, Vacante.DoesNotExist):
+            return Response({'error': 'Vacante no encontrada'}, status=404)
+        solicitar = lambda: solicitar_pdf_vacante(vacante, fecha_from=fecha_from, fecha_to=fecha_to)  # noqa: E731
+    elif tipo == 'metricas':
+        if not _es_admin(request):
+            return Response({'error': 'No autorizado'}, status=403)
+        try:
+            vac_id = int(vacante_id) if vacante_id else None
+        except (TypeError, ValueError):
+            vac_id = None
+        area = request.data.get('area')
+        solicitar = lambda: solicitar_pdf_metricas(vacante_id=vac_id, area=area, fecha_from=fecha_from, fecha_to=fecha_to)  # noqa: E731
+    else:
+        return Response({'error': "Tipo inválido. Use 'vacante' o 'metricas'."}, status=400)
+
+    try:
+        job, _ = solicitar()
+    except ColaReportesLlena:
+        return _respuesta_cola_llena()
+    return Response(_serializar_reporte(request, job), status=202)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def estado_reporte(request, job_id):
+    """Estado de un reporte: pendiente | listo | error | expirado. URL: GET /api/metrics/reportes/<job_id>/"""
+    job = obtener_job(job_id)
+    if job is None:
+        return Response({'error': 'Reporte no encontrado o expirado'}, status=404)
+    if job['requiere_admin'] and not _es_admin(request):
+        return Response({'error': 'No autorizado'}, status=403)
+    return Response(_serializar_reporte(request, job))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def descargar_reporte(request, job_id):
+    """Descarga el PDF de un reporte listo. URL: GET /api/metrics/reportes/<job_id>/descarga/"""
+    job = obtener_job(job_id)
+    if job is None:
+        return Response({'error': 'Reporte no encontrado o expirado'}, status=404)
+    if job['requiere_admin'] and not _es_admin(request):
+        return Response({'error': 'No autorizado'}, status=403)
+
+    pdf = pdf_job(job)
+    if pdf is None:
+        datos = _serializar_reporte(request, job)
+        codigos = {ESTADO_ERROR: 500, ESTADO_EXPIRADO: 410}
+        return Response(datos, status=codigos.get(datos['estado'], 409))
+    return HttpResponse(pdf, content_type='application/pdf', headers={
+        'Content-Disposition': f'attachment; filename="{job["filename"]}"',
+    })
+
+
+def _respuesta_xlsx(metricas, filename):
+    """XLSX real (openpyxl write-only) escrito en un archivo temporal y enviado por bloques."""
+    try:
+        import openpyxl  # noqa: F401
+    except Exception:
+        return Response({'error': "Para exportar Excel instale 'openpyxl' (pip install openpyxl) o use csv."}, status=400)
+
+    archivo = tempfile.TemporaryFile()
+    try:
+        escribir_xlsx(metricas, archivo)
+    except Exception:
+        archivo.close()
+        raise
+    archivo.seek(0)
+    # FileResponse cierra (y borra) el temporal al terminar de enviarlo
+    return FileResponse(archivo, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
 
 
 @api_view(['GET'])
@@ -955,171 +1059,49 @@ def export_metrics_vacante(request, vacante_id, fmt):
     """
     fmt = (fmt or '').lower()
     if fmt not in ('csv', 'excel', 'pdf'):
-        return Response({'error': "Formato inválido. Use 'csv' o 'pdf'."}, status=400)
+        return Response({'error': "Formato inválido. Use 'csv', 'excel' o 'pdf'."}, status=400)
 
     fecha_from = request.GET.get('from')
     fecha_to = request.GET.get('to')
     area = request.GET.get('area')
 
     try:
-        vacante = Vacante.objects.get(id=vacante_id)
+        vacante = Vacante.objects.select_related('id_empresa').get(id=vacante_id)
     except Vacante.DoesNotExist:
         return Response({'error': 'Vacante no encontrada'}, status=404)
 
-    vacantes_qs = Vacante.objects.filter(id=vacante_id)
-
-    rows = []
-    header = ['vacante_id', 'titulo', 'empresa_id', 'empresa_nombre', 'total_postulaciones', 'ultima_postulacion', 'estado', 'estado_count']
-
-    for v in vacantes_qs:
-        postulaciones = Postulacion.objects.filter(vacante=v)
-        if fecha_from:
-            postulaciones = postulaciones.filter(fecha_postulacion__gte=fecha_from)
-        if fecha_to:
-            postulaciones = postulaciones.filter(fecha_postulacion__lte=fecha_to)
-
-        total = postulaciones.count()
-        ultima = postulaciones.aggregate(last=Max('fecha_postulacion')).get('last')
-        estados = postulaciones.values('estado').annotate(count=Count('id'))
-        if not estados:
-            rows.append([v.id, v.titulo, v.id_empresa_id, getattr(v.id_empresa, 'nombre', None), total, ultima, None, 0])
-        else:
-            for s in estados:
-                rows.append([v.id, v.titulo, v.id_empresa_id, getattr(v.id_empresa, 'nombre', None), total, ultima, s['estado'], s['count']])
+    if fmt == 'excel':
+        return _respuesta_xlsx(
+            iterar_metricas(vacante_id=vacante.id, fecha_from=fecha_from, fecha_to=fecha_to),
+            f"metrics_vacante_{vacante_id}.xlsx",
+        )
 
-    # CSV/Excel
-    if fmt in ('excel', 'csv'):
-        sio = io.StringIO()
-        writer = csv.writer(sio)
-        writer.writerow(header)
-        for r in rows:
-            writer.writerow([str(c) if c is not None else '' for c in r])
-        content = sio.getvalue()
+    # CSV: en streaming, fila a fila desde un cursor del servidor
+    if fmt == 'csv':
+        rows = filas_exportacion(
+            iterar_metricas(vacante_id=vacante.id, fecha_from=fecha_from, fecha_to=fecha_to)
+        )
         filename = f"metrics_vacante_{vacante_id}.csv"
-        resp = HttpResponse(content, content_type='text/csv')
+        resp = StreamingHttpResponse(csv_streaming(rows), content_type='text/csv')
         resp['Content-Disposition'] = f'attachment; filename="{filename}"'
         return resp
 
-    # PDF usando matplotlib para un gráfico más bonito y opcional logo de empresa
-    try:
-        import matplotlib
-        matplotlib.use('Agg')
-        import matplotlib.pyplot as plt
-        from reportlab.lib.pagesizes import letter
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.units import inch
-        from reportlab.lib.utils import ImageReader
-        import urllib.request
-        from PIL import Image
-    except Exception:
-        return Response({'error': "Para exportar PDF instale 'matplotlib' y 'reportlab' (pip install matplotlib reportlab pillow)."}, status=400)
-
-    # Preparar datos
-    v = vacante
-    postulaciones = Postulacion.objects.filter(vacante=v)
-    if fecha_from:
-        postulaciones = postulaciones.filter(fecha_postulacion__gte=fecha_from)
-    if fecha_to:
-        postulaciones = postulaciones.filter(fecha_postulacion__lte=fecha_to)
-
-    total = postulaciones.count()
-    estados_q = list(postulaciones.values('estado').annotate(count=Count('id')).order_by('-count'))
-    estados = [e['estado'] for e in estados_q] if estados_q else []
-    counts = [e['count'] for e in estados_q] if estados_q else []
-
-    # Generar gráfico con matplotlib
-    fig = plt.figure(figsize=(7.5, 4))
-    ax = fig.add_subplot(111)
-    if counts:
-        bars = ax.bar(range(len(counts)), counts, color='#e74c3c')
-        ax.set_xticks(range(len(counts)))
-        ax.set_xticklabels(estados, rotation=30, ha='right')
-        ax.set_ylabel('Cantidad')
-        ax.set_title(f'Postulaciones por estado - Vacante {v.id}')
-        # Anotar valores encima de barras
-        for bar in bars:
-            hgt = bar.get_height()
-            ax.annotate(f'{int(hgt)}', xy=(bar.get_x() + bar.get_width() / 2, hgt), xytext=(0, 4),
-                        textcoords='offset points', ha='center', va='bottom', fontsize=9)
-    else:
-        ax.text(0.5, 0.5, 'No hay postulaciones', ha='center', va='center')
-        ax.set_xticks([])
-        ax.set_yticks([])
-
-    fig.tight_layout()
-    img_buf = BytesIO()
-    fig.savefig(img_buf, format='png', dpi=150, bbox_inches='tight')
-    plt.close(fig)
-    img_buf.seek(0)
-
-    # Construir PDF e insertar imagen
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
-    w, h = letter
-
-    # Header: título y metadata
-    c.setFont('Helvetica-Bold', 16)
-    c.drawString(40, h - 40, f"Reporte de métricas - Vacante {v.id}: {v.titulo}")
-    c.setFont('Helvetica', 9)
-    empresa_nombre = getattr(v.id_empresa, 'nombre', None) if getattr(v, 'id_empresa', None) else ''
-    c.drawString(40, h - 60, f"Empresa: {empresa_nombre}    Vacante ID: {v.id}")
-    ultima = postulaciones.aggregate(last=Max('fecha_postulacion')).get('last')
-    c.drawString(40, h - 75, f"Total postulaciones: {total}    Última postulación: {ultima}")
-
-    # Insertar logo si existe
-    logo_y = h - 40
-    logo_size = 60
-    logo_url = getattr(v.id_empresa, 'logo_url', None) if getattr(v, 'id_empresa', None) else None
-    if logo_url:
-        try:
-            with urllib.request.urlopen(logo_url, timeout=5) as resp:
-                logo_bytes = resp.read()
-            logo_img = Image.open(BytesIO(logo_bytes))
-            logo_img_reader = ImageReader(BytesIO(logo_bytes))
-            c.drawImage(logo_img_reader, w - 40 - logo_size, h - 40 - (logo_size/2), width=logo_size, height=logo_size, preserveAspectRatio=True, mask='auto')
-        except Exception:
-            # si falla el logo, no interrumpe la generación
-            logger.warning('No se pudo descargar/incluir el logo de la empresa: %s', logo_url)
-
-    # Dibujar el gráfico PNG debajo del header
-    img_reader = ImageReader(img_buf)
-    img_w = w - 80
-    img_h = 3.5 * inch
-    c.drawImage(img_reader, 40, h - 120 - img_h, width=img_w, height=img_h, preserveAspectRatio=True, mask='auto')
-
-    # Añadir tabla simple de estados y conteos
-    text_y = h - 120 - img_h - 20
-    c.setFont('Helvetica-Bold', 11)
-    c.drawString(40, text_y, 'Detalle por estado:')
-    c.setFont('Helvetica', 10)
-    ty = text_y - 14
-    if estados_q:
-        for e in estados_q:
-            c.drawString(48, ty, f"- {e['estado']}: {e['count']}")
-            ty -= 12
-    else:
-        c.drawString(48, ty, 'No hay estados para mostrar')
-
-    # Footer: fecha de generación
-    c.setFont('Helvetica-Oblique', 8)
-    c.drawString(40, 20, f"Generado: {timezone.now().isoformat()}")
-
-    c.showPage()
-    c.save()
-    buffer.seek(0)
-    filename = f"metrics_vacante_{vacante_id}.pdf"
-    return HttpResponse(buffer.getvalue(), content_type='application/pdf', headers={
-        'Content-Disposition': f'attachment; filename="{filename}"'
-    })
+    # PDF (gráfico matplotlib + reportlab): se genera una vez por vacante/filtros/versión de
+    # métricas en el pool de reportes; las descargas siguientes son una lectura de cache
+    return _respuesta_pdf(
+        request,
+        lambda: solicitar_pdf_vacante(vacante, fecha_from=fecha_from, fecha_to=fecha_to),
+        "Para exportar PDF instale 'matplotlib' y 'reportlab' (pip install matplotlib reportlab pillow).",
+    )
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, CheckUserInactivityPermission])
 def export_metrics(request):
-    """Exporta métricas (CSV o PDF) para una o varias vacantes.
+    """Exporta métricas (XLSX, CSV o PDF) para una o varias vacantes.
 
     Query params:
-    - format: 'excel'|'csv'|'pdf' (por defecto 'excel' -> CSV)
+    - format: 'excel' (XLSX) | 'csv' | 'pdf'
     - vacante_id: opcional; si viene, exporta solo esa vacante
     - from, to, area: mismos filtros que `metrics_dashboard`
     """
@@ -1141,147 +1123,112 @@ def export_metrics(request):
     fecha_to = request.GET.get('to')
     area = request.GET.get('area')
 
-    vacantes_qs = Vacante.objects.all()
+    vac_id = None
     if vacante_id:
         try:
-            vacantes_qs = vacantes_qs.filter(id=int(vacante_id))
+            vac_id = int(vacante_id)
         except Exception:
             pass
-    if area:
-        vacantes_qs = vacantes_qs.filter(ubicacion__icontains=area)
-
-    rows = []
-    header = ['vacante_id', 'titulo', 'empresa_id', 'empresa_nombre', 'total_postulaciones', 'ultima_postulacion', 'estado', 'estado_count']
-
-    for v in vacantes_qs:
-        postulaciones = Postulacion.objects.filter(vacante=v)
-        if fecha_from:
-            postulaciones = postulaciones.filter(fecha_postulacion__gte=fecha_from)
-        if fecha_to:
-            postulaciones = postulaciones.filter(fecha_postulacion__lte=fecha_to)
-
-        total = postulaciones.count()
-        ultima = postulaciones.aggregate(last=Max('fecha_postulacion')).get('last')
-        estados = postulaciones.values('estado').annotate(count=Count('id'))
-        if not estados:
-            rows.append([v.id, v.titulo, v.id_empresa_id, getattr(v.id_empresa, 'nombre', None), total, ultima, None, 0])
-        else:
-            for s in estados:
-                rows.append([v.id, v.titulo, v.id_empresa_id, getattr(v.id_empresa, 'nombre', None), total, ultima, s['estado'], s['count']])
 
-    # CSV/Excel (CSV compatible con Excel)
+    # CSV/Excel
     if fmt in ('excel', 'csv'):
-        sio = io.StringIO()
-        writer = csv.writer(sio)
-        writer.writerow(header)
-        for r in rows:
-            writer.writerow([str(c) if c is not None else '' for c in r])
-        content = sio.getvalue()
+        if fmt == 'excel':
+            return _respuesta_xlsx(
+                iterar_metricas(vacante_id=vac_id, area=area, fecha_from=fecha_from, fecha_to=fecha_to),
+                f"metrics_{vacante_id or 'all'}.xlsx",
+            )
+        # Streaming: la memoria no depende del tamaño de la exportación y el primer byte sale enseguida
+        rows = filas_exportacion(
+            iterar_metricas(vacante_id=vac_id, area=area, fecha_from=fecha_from, fecha_to=fecha_to)
+        )
         filename = f"metrics_{vacante_id or 'all'}.csv"
-        resp = HttpResponse(content, content_type='text/csv')
+        resp = StreamingHttpResponse(csv_streaming(rows), content_type='text/csv')
         resp['Content-Disposition'] = f'attachment; filename="{filename}"'
         return resp
 
-    # PDF (intento con reportlab si está instalado)
+    # PDF (reportlab, una página por vacante) generado en el pool de reportes
     if fmt == 'pdf':
-        try:
-            from reportlab.lib.pagesizes import letter
-            from reportlab.pdfgen import canvas
-            from reportlab.lib import colors
-            from reportlab.lib.units import inch
-            from reportlab.graphics.shapes import Drawing, String
-            from reportlab.graphics.charts.barcharts import VerticalBarChart
-            from reportlab.graphics import renderPDF
-        except Exception:
-            return Response({'error': "Para exportar PDF instale 'reportlab' (pip install reportlab) o use format=csv."}, status=400)
-
-        buffer = BytesIO()
-        c = canvas.Canvas(buffer, pagesize=letter)
-        w, h = letter
-
-        # Organizar los datos por vacante y generar una página por vacante
-        for v in vacantes_qs:
-            # Cabecera
-            c.setFont('Helvetica-Bold', 14)
-            c.drawString(40, h - 40, f"Reporte de métricas - Vacante {v.id}: {v.titulo}")
-
-            # Subtítulo empresa y fecha
-            c.setFont('Helvetica', 9)
-            empresa_nombre = getattr(v.id_empresa, 'nombre', None) if getattr(v, 'id_empresa', None) else ''
-            c.drawString(40, h - 60, f"Empresa: {empresa_nombre}    Vacante ID: {v.id}")
-
-            # Recalcular postulaciones y estados para esta vacante
-            postulaciones = Postulacion.objects.filter(vacante=v)
-            if fecha_from:
-                postulaciones = postulaciones.filter(fecha_postulacion__gte=fecha_from)
-            if fecha_to:
-                postulaciones = postulaciones.filter(fecha_postulacion__lte=fecha_to)
-
-            total = postulaciones.count()
-            estados_q = list(postulaciones.values('estado').annotate(count=Count('id')).order_by('-count'))
-
-            # Texto resumen
-            c.setFont('Helvetica', 10)
-            c.drawString(40, h - 90, f"Total postulaciones: {total}")
-            ultima = postulaciones.aggregate(last=Max('fecha_postulacion')).get('last')
-            c.drawString(200, h - 90, f"Última postulación: {ultima}")
-
-            # Preparar datos para gráfico
-            estados = [e['estado'] for e in estados_q]
-            counts = [e['count'] for e in estados_q]
-
-            if total > 0 and counts:
-                # Dibujar gráfico de barras usando Graphics
-                drawing_width = 6.5 * inch
-                drawing_height = 3 * inch
-                drawing = Drawing(drawing_width, drawing_height)
-
-                bc = VerticalBarChart()
-                bc.x = 50
-                bc.y = 20
-                bc.height = drawing_height - 60
-                bc.width = drawing_width - 120
-                bc.data = [counts]
-                bc.strokeColor = colors.black
-                bc.valueAxis.labels.fontSize = 8
-                bc.categoryAxis.labels.boxAnchor = 'ne'
-                bc.categoryAxis.labels.dy = -2
-                bc.categoryAxis.labels.angle = 30
-                bc.categoryAxis.categoryNames = estados
-                bc.bars.fillColor = colors.HexColor('#4f81bd')
-
-                drawing.add(bc)
-
-                # Leyenda con porcentajes
-                start_y = h - 140
-                c.setFont('Helvetica-Bold', 10)
-                c.drawString(40, start_y, 'Postulaciones por estado (cantidad y porcentaje):')
-                c.setFont('Helvetica', 9)
-                y_text = start_y - 14
-                for est, cnt in zip(estados, counts):
-                    pct = (cnt / total) * 100 if total else 0
-                    c.drawString(48, y_text, f"- {est}: {cnt} ({pct:.1f}%)")
-                    y_text -= 12
-
-                # Renderizar el drawing en el canvas
-                renderPDF.draw(drawing, c, 40, h - 420)
-            else:
-                c.setFont('Helvetica-Oblique', 9)
-                c.drawString(40, h - 140, 'No hay postulaciones para esta vacante en el rango solicitado.')
-
-            c.showPage()
-
-        c.save()
-        buffer.seek(0)
-        filename = f"metrics_{vacante_id or 'all'}.pdf"
-        return HttpResponse(buffer.getvalue(), content_type='application/pdf', headers={
-            'Content-Disposition': f'attachment; filename="{filename}"'
-        })
+        return _respuesta_pdf(
+            request,
+            lambda: solicitar_pdf_metricas(vacante_id=vac_id, area=area, fecha_from=fecha_from, fecha_to=fecha_to),
+            "Para exportar PDF instale 'reportlab' (pip install reportlab) o use format=csv.",
+        )
 
     return Response({'error': 'Formato no soportado. Use format=csv|excel|pdf'}, status=400)
 # ----------------------------
 # Gestion de postulaciones
 # ----------------------------
+def _contexto_correo_estado(vacante_obj, empresa, nombre, primer_nombre, postulacion_id, fecha_postulacion):
+    """Contexto de las plantillas estado_* de EMAIL_TEMPLATES.
+
+    Los datos del candidato llegan como texto: valores reales en el envío individual o
+    marcas -clave- (substitution_tag) en el envío masivo.
+    """
+    return {
+        "vacante": vacante_obj.titulo,
+        "empresa": empresa.nombre,
+        "empresa_mayus": empresa.nombre.upper(),
+        "ubicacion": vacante_obj.ubicacion or 'Por definir',
+        "modalidad": vacante_obj.modalidad_trabajo or 'Por definir',
+        "tipo_jornada": vacante_obj.tipo_jornada or 'Por definir',
+        "salario": vacante_obj.salario if vacante_obj.salario else 'Según lo acordado en entrevista',
+        "fecha_actualizacion": timezone.now().strftime('%d/%m/%Y a las %H:%M'),
+        "nombre": nombre,
+        "primer_nombre": primer_nombre,
+        "postulacion_id": postulacion_id,
+        "fecha_postulacion": fecha_postulacion,
+    }
+
+
+def _encolar_correo_estado(postulacion, nuevo_estado):
+    """Encola el correo del nuevo estado (el outbox garantiza la entrega con reintentos)."""
+    correo_enviado = False
+    try:
+        candidato = postulacion.candidato
+        vacante_obj = postulacion.vacante
+        empresa = postulacion.empresa
+
+        print(f"📧 Preparando correo SMTP para estado '{nuevo_estado}' → {candidato.email}")
+        logger.info(f"📧 Preparando correo SMTP para estado '{nuevo_estado}' → {candidato.email}")
+        # Solo se renderiza la plantilla del nuevo estado (compilada una vez en email_templates)
+        template_key = ESTADO_POSTULACION_TEMPLATES.get(nuevo_estado)
+
+        if template_key:
+            asunto, mensaje, _ = render_email_template(template_key, _contexto_correo_estado(
+                vacante_obj,
+                empresa,
+                nombre=candidato.first_name or candidato.username,
+                primer_nombre=candidato.first_name,
+                postulacion_id=postulacion.id,
+                fecha_postulacion=postulacion.fecha_postulacion.strftime('%d/%m/%Y'),
+            ))
+            logger.info(f"📧 Encolando envío SMTP para estado '{nuevo_estado}' → {candidato.email}")
+            # Savepoint: se llama dentro de la transacción del cambio de estado y un INSERT
+            # fallido en el outbox no debe dejarla abortada
+            with transaction.atomic():
+                enviado_ok = send_plain_email(
+                    subject=asunto,
+                    message=mensaje,
+                    recipient_list=[candidato.email],
+                    fail_silently=False,
+                    async_send=True,
+                )
+            correo_enviado = bool(enviado_ok)
+            print(f"📬 Resultado send_plain_email para {candidato.email}: {correo_enviado}")
+            logger.info(f"📧 Resultado envío correo estado ({nuevo_estado}): {correo_enviado}")
+        else:
+            logger.warning(f"⚠️ No existe plantilla de correo para el estado '{nuevo_estado}'.")
+
+    except Exception as e:
+        print(f"❌ Error enviando correo de estado '{nuevo_estado}': {e}")
+        logger.error(f"❌ Error enviando correo de estado '{nuevo_estado}': {e}")
+        import traceback
+        print(traceback.format_exc())
+        logger.error(traceback.format_exc())
+        # No fallar la actualización si falla el correo
+    return correo_enviado
+
+
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated, CheckUserInactivityPermission])
 def actualizar_estado_postulacion(request, postulacion_id):
@@ -1292,7 +1239,7 @@ def actualizar_estado_postulacion(request, postulacion_id):
         return Response({"error": "No autorizado"}, status=403)
 
     postulacion = get_object_or_404(
-        Postulacion.objects.select_related("vacante"),
+        Postulacion.objects.select_related("vacante", "empresa", "candidato"),
         id=postulacion_id
     )
 
@@ -1318,652 +1265,237 @@ def actualizar_estado_postulacion(request, postulacion_id):
             "error": f"Estado inválido. Usa uno de: {', '.join(ESTADOS_VALIDOS)}"
         }, status=400)
 
-    estado_anterior = postulacion.estado
-    postulacion.estado = nuevo_estado
-    postulacion.save(update_fields=["estado"])
+    # Concurrencia optimista: el cambio solo se aplica si el estado sigue siendo el que
+    # vio el reclutador (estado_anterior del body o, si no viene, el leído ahora)
+    estado_anterior = request.data.get("estado_anterior") or postulacion.estado
+    conflicto = {
+        "error": "La postulación cambió de estado mientras la editabas. Recarga e intenta de nuevo.",
+        "estado_actual": postulacion.estado,
+    }
+    if estado_anterior != postulacion.estado:
+        return Response(conflicto, status=409)
+    correo_enviado = False
 
-    # Enviar correo según el nuevo estado (SÍNCRONO para garantizar envío en producción)
     if nuevo_estado != estado_anterior:
-        # Registrar cambio primero
-        comentario_cambio = f"\n[{timezone.now().isoformat()}] Estado cambiado: '{estado_anterior}' → '{nuevo_estado}' por {request.user.email}"
-        postulacion.comentarios = (postulacion.comentarios or "") + comentario_cambio
-        postulacion.save(update_fields=["comentarios"])
-        
-        try:
-            candidato = postulacion.candidato
-            vacante_obj = postulacion.vacante
-            empresa = postulacion.empresa
-
-            print(f"📧 Preparando correo SMTP para estado '{nuevo_estado}' → {candidato.email}")
-            logger.info(f"📧 Preparando correo SMTP para estado '{nuevo_estado}' → {candidato.email}")
-            # Plantillas de correo según estado
-            templates = {
-                "Postulado": {
-                    "asunto": f"✅ Confirmación de postulación - {vacante_obj.titulo} | {empresa.nombre}",
-                    "mensaje": f"""Estimado/a {candidato.first_name or candidato.username},
-
-Hemos registrado correctamente tu postulación.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📊 RESUMEN DE TU POSTULACIÓN
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🏢 Empresa: {empresa.nombre}
-💼 Vacante: {vacante_obj.titulo}
-🔄 Estado actual: POSTULADO ✅
-📅 Fecha de actualización: {timezone.now().strftime('%d/%m/%Y a las %H:%M')}
-🆔 ID de Postulación: #{postulacion.id}
-
-Gracias por confiar en Talento Hub. Te notificaremos cuando haya avances en tu proceso.
-
-Atentamente,
-Equipo de Gestión de Talento Humano
-{empresa.nombre}
-"""
-                },
-                "En revisión": {
-                    "asunto": f"🔍 Tu postulación está en revisión - {vacante_obj.titulo} | {empresa.nombre}",
-                    "mensaje": f"""Estimado/a {candidato.first_name or candidato.username},
-
-¡Buenas noticias! Tu postulación ha avanzado a la siguiente etapa.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📊 ACTUALIZACIÓN DE ESTADO
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🏢 Empresa: {empresa.nombre}
-💼 Puesto: {vacante_obj.titulo}
-📍 Ubicación: {vacante_obj.ubicacion or 'Por definir'}
-🔄 Estado actual: EN REVISIÓN 🔍
-📅 Fecha de actualización: {timezone.now().strftime('%d/%m/%Y a las %H:%M')}
-🆔 ID de Postulación: #{postulacion.id}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🎯 ¿QUÉ SIGNIFICA ESTO?
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Tu perfil profesional está siendo evaluado detalladamente por nuestro equipo de Recursos Humanos.
-
-Estamos revisando:
-✓ Tu experiencia laboral y trayectoria profesional
-✓ Tus habilidades técnicas y competencias
-✓ Tu formación académica y certificaciones
-✓ La compatibilidad de tu perfil con los requisitos del puesto
-✓ Referencias y recomendaciones (si aplica)
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-⏰ TIEMPOS ESTIMADOS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-📆 Duración de revisión: 3 a 5 días hábiles
-🔔 Próxima comunicación: Si tu perfil es seleccionado, te contactaremos directamente
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-💡 MIENTRAS ESPERAS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-📱 Mantén activos tus medios de contacto (teléfono y correo)
-📧 Revisa tu bandeja de entrada y spam regularmente
-📄 Ten lista tu documentación actualizada
-🏢 Investiga más sobre {empresa.nombre}, su misión, visión y valores
-💪 Prepárate mentalmente para posibles entrevistas
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Agradecemos tu paciencia durante este proceso. Te mantendremos informado/a sobre cualquier avance.
-
-¡Mucho éxito!
-
-Atentamente,
-
-Equipo de Gestión de Talento Humano
-{empresa.nombre}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Sistema de Gestión de Candidatos | TalentoHub
-Correo generado automáticamente el {timezone.now().strftime('%d/%m/%Y a las %H:%M')}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
-                },
-                "Entrevista": {
-                    "asunto": f"🎉 ¡Felicitaciones! Has sido seleccionado para entrevista - {vacante_obj.titulo}",
-                    "mensaje": f"""Estimado/a {candidato.first_name or candidato.username},
-
-¡EXCELENTES NOTICIAS! 🎊
-
-Tu perfil ha destacado entre los candidatos y hemos decidido continuar con tu proceso de selección.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🎯 ACTUALIZACIÓN DE ESTADO
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🏢 Empresa: {empresa.nombre}
-💼 Puesto: {vacante_obj.titulo}
-📍 Ubicación: {vacante_obj.ubicacion or 'Por definir'}
-🏠 Modalidad: {vacante_obj.modalidad_trabajo or 'Por definir'}
-🔄 Estado actual: SELECCIONADO PARA ENTREVISTA ⭐
-📅 Fecha de actualización: {timezone.now().strftime('%d/%m/%Y a las %H:%M')}
-🆔 ID de Postulación: #{postulacion.id}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📞 PRÓXIMOS PASOS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-⏰ CONTACTO INMEDIATO
-Nuestro equipo de Recursos Humanos se comunicará contigo en las próximas 24-48 horas para:
-
-✓ Confirmar tu interés y disponibilidad
-✓ Coordinar fecha y hora de la entrevista
-✓ Definir modalidad (presencial, virtual o telefónica)
-✓ Proporcionar detalles sobre el proceso
-✓ Indicar duración estimada de la entrevista
-✓ Presentar a las personas que te entrevistarán
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📝 PREPÁRATE PARA LA ENTREVISTA
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🏢 INVESTIGA LA EMPRESA
-• Conoce la historia, misión y visión de {empresa.nombre}
-• Revisa sus productos/servicios principales
-• Identifica sus valores corporativos y cultura organizacional
-• Consulta sus redes sociales y sitio web oficial
-
-💼 PREPARA TU PRESENTACIÓN
-• Repasa tu experiencia laboral más relevante
-• Identifica 3-5 logros profesionales clave
-• Prepara ejemplos concretos de situaciones laborales (método STAR)
-• Ten claro por qué quieres trabajar en {empresa.nombre}
-
-❓ PREPARA PREGUNTAS INTELIGENTES
-• Sobre el puesto y sus responsabilidades
-• Sobre el equipo de trabajo y la cultura
-• Sobre oportunidades de crecimiento profesional
-• Sobre los retos del puesto
-
-📄 DOCUMENTACIÓN REQUERIDA
-• Copia impresa o digital de tu CV actualizado
-• Portafolio de proyectos (si aplica para el puesto)
-• Certificados de estudios y capacitaciones
-• Referencias laborales disponibles
-
-💻 SI ES ENTREVISTA VIRTUAL
-• Verifica tu conexión a internet
-• Prueba tu cámara y micrófono
-• Busca un lugar tranquilo e iluminado
-• Ten instalado Zoom/Teams/Google Meet
-• Viste de manera profesional (incluso si es virtual)
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-💡 CONSEJOS CLAVE
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-✓ Sé puntual (llega 10-15 minutos antes)
-✓ Mantén contacto visual y lenguaje corporal positivo
-✓ Responde con sinceridad y seguridad
-✓ Escucha activamente las preguntas
-✓ Sé tú mismo/a y muestra tu entusiasmo
-✓ Apaga tu teléfono o ponlo en silencio
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Estamos emocionados de conocerte mejor y explorar cómo puedes contribuir a {empresa.nombre}.
-
-¡Te deseamos mucho éxito en tu entrevista!
-
-Atentamente,
-
-Equipo de Gestión de Talento Humano
-{empresa.nombre}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Sistema de Gestión de Candidatos | TalentoHub
-Correo generado automáticamente el {timezone.now().strftime('%d/%m/%Y a las %H:%M')}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
-                },
-                "Proceso de contratacion": {
-                    "asunto": f"🎊 ¡FELICITACIONES! Iniciamos tu proceso de contratación - {vacante_obj.titulo}",
-                    "mensaje": f"""Estimado/a {candidato.first_name or candidato.username},
-
-¡EXCELENTES NOTICIAS! 🎉🎉🎉
-
-Después de un riguroso proceso de selección, nos complace informarte que HAS SIDO SELECCIONADO/A para formar parte de nuestro equipo.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🌟 ACTUALIZACIÓN DE ESTADO
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🏢 Empresa: {empresa.nombre}
-💼 Puesto: {vacante_obj.titulo}
-📍 Ubicación: {vacante_obj.ubicacion or 'Por definir'}
-🏠 Modalidad: {vacante_obj.modalidad_trabajo or 'Por definir'}
-⏰ Jornada: {vacante_obj.tipo_jornada or 'Por definir'}
-💰 Salario: {vacante_obj.salario if vacante_obj.salario else 'Según lo acordado en entrevista'}
-🔄 Estado actual: PROCESO DE CONTRATACIÓN 📋✅
-📅 Fecha de selección: {timezone.now().strftime('%d/%m/%Y a las %H:%M')}
-🆔 ID de Postulación: #{postulacion.id}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📋 DOCUMENTACIÓN REQUERIDA (URGENTE)
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Por favor, reúne y prepara los siguientes documentos ORIGINALES y COPIAS:
-
-📄 IDENTIFICACIÓN PERSONAL
-✓ Documento de identidad vigente (DPI/Cédula/Pasaporte)
-✓ Partida de nacimiento certificada (si aplica)
-✓ 2 fotografías tamaño cédula recientes a color
-
-👨‍🎓 FORMACIÓN ACADÉMICA
-✓ Títulos universitarios certificados
-✓ Diplomas de estudios superiores
-✓ Certificados de capacitaciones y cursos
-✓ Constancias de idiomas (si aplica)
-
-💼 EXPERIENCIA LABORAL
-✓ Cartas de recomendación laboral (mínimo 2)
-✓ Certificados de trabajo de empleos anteriores
-✓ Hoja de vida actualizada y detallada
-
-🏥 DOCUMENTOS MÉDICOS Y LEGALES
-✓ Certificado médico de buena salud (reciente)
-✓ Antecedentes penales actualizados
-✓ Antecedentes policiacos
-✓ Constancia de afiliación al seguro social (si aplica)
-
-🏦 INFORMACIÓN BANCARIA
-✓ Estado de cuenta bancaria reciente
-✓ Número de cuenta para depósitos (si aplica)
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📝 PASOS A SEGUIR
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-PASO 1️⃣: REVISIÓN Y FIRMA DE CONTRATO (Próximos 3-5 días)
-• Recibirás tu contrato de trabajo para revisión
-• Lee cuidadosamente todos los términos y condiciones
-• Consulta cualquier duda antes de firmar
-• Firma y devuelve el contrato en los plazos indicados
-
-PASO 2️⃣: ENTREGA DE DOCUMENTACIÓN (Plazo: 5 días hábiles)
-• Entrega toda la documentación requerida completa
-• Asegúrate de que todas las copias sean legibles
-• Organiza los documentos según la lista proporcionada
-
-PASO 3️⃣: PROCESO DE ONBOARDING
-• Completarás formularios administrativos internos
-• Recibirás información sobre políticas de la empresa
-• Conocerás los beneficios y prestaciones
-
-PASO 4️⃣: INDUCCIÓN CORPORATIVA (Fecha por confirmar)
-• Programa de bienvenida e integración
-• Capacitación sobre sistemas y procesos
-• Presentación del equipo de trabajo
-• Recorrido por las instalaciones
-
-PASO 5️⃣: INICIO DE LABORES
-• Confirmaremos tu fecha de inicio oficial
-• Recibirás tu equipo de trabajo y credenciales
-• Comenzarás tu plan de entrenamiento específico
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-⏰ PLAZOS IMPORTANTES
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🚨 CRÍTICO: Debes entregar toda la documentación dentro de los próximos 5 DÍAS HÁBILES para no retrasar tu proceso de incorporación.
-
-Si tienes dificultades para conseguir algún documento, comunícate inmediatamente con RRHH.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📞 CONTACTO Y SEGUIMIENTO
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Para cualquier consulta, duda o información adicional:
-
-📧 Responde a este correo electrónico
-📱 Contacta al Departamento de Recursos Humanos de {empresa.nombre}
-⏰ Horario de atención: Lunes a Viernes, 8:00 AM - 5:00 PM
-
-Nuestro equipo está disponible para apoyarte en todo el proceso.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-¡Bienvenido/a a la familia {empresa.nombre}!
-
-Estamos emocionados de que comiences esta nueva etapa profesional con nosotros. Tu talento, experiencia y dedicación serán fundamentales para alcanzar nuestros objetivos.
-
-Confiamos en que esta será una relación laboral exitosa y mutuamente beneficiosa.
-
-¡Nos vemos pronto!
-
-Atentamente,
-
-Equipo de Gestión de Talento Humano
-{empresa.nombre}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Sistema de Gestión de Candidatos | TalentoHub
-Correo generado automáticamente el {timezone.now().strftime('%d/%m/%Y a las %H:%M')}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
-                },
-                "Contratado": {
-                    "asunto": f"🎉 ¡BIENVENIDO/A AL EQUIPO! Tu contratación está completa - {empresa.nombre}",
-                    "mensaje": f"""Estimado/a {candidato.first_name or candidato.username},
-
-🎊 ¡FELICITACIONES! 🎊
-
-Tu proceso de contratación ha sido completado exitosamente. Oficialmente eres parte del equipo de {empresa.nombre}.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🌟 CONFIRMACIÓN DE CONTRATACIÓN
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🎉 BIENVENIDO/A A {empresa.nombre.upper()} 🎉
-
-🏢 Empresa: {empresa.nombre}
-💼 Tu puesto: {vacante_obj.titulo}
-📍 Ubicación: {vacante_obj.ubicacion or 'Por definir'}
-🏠 Modalidad: {vacante_obj.modalidad_trabajo or 'Por definir'}
-⏰ Jornada laboral: {vacante_obj.tipo_jornada or 'Por definir'}
-🔄 Estado: CONTRATADO ✅
-📅 Fecha de contratación: {timezone.now().strftime('%d/%m/%Y a las %H:%M')}
-🆔 ID de Empleado: Por asignar por RRHH
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📅 INICIO DE LABORES
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Nuestro equipo de Recursos Humanos se comunicará contigo en las PRÓXIMAS HORAS para:
-
-✓ Confirmar tu fecha exacta de inicio
-✓ Coordinar tu sesión de inducción corporativa
-✓ Entregarte credenciales y accesos a sistemas
-✓ Asignarte tu equipo de trabajo (computadora, teléfono, etc.)
-✓ Presentarte oficialmente a tu equipo de trabajo
-✓ Programar tu recorrido por las instalaciones
-✓ Entregarte tu contrato firmado y documentación oficial
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📋 TU PRIMER DÍA
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-PROGRAMA DE INDUCCIÓN INTEGRAL:
-
-🏢 BIENVENIDA CORPORATIVA (9:00 AM)
-• Recepción oficial por parte del equipo de RRHH
-• Presentación de la empresa, historia y valores
-• Entrega de kit de bienvenida
-• Firma de documentos finales
-
-👥 INTEGRACIÓN AL EQUIPO (10:30 AM)
-• Presentación con tu jefe inmediato
-• Conoce a tus compañeros de equipo
-• Tour por tu área de trabajo
-• Asignación de tu espacio laboral
-
-💻 CONFIGURACIÓN TECNOLÓGICA (12:00 PM)
-• Entrega de equipo de cómputo y herramientas
-• Creación de cuentas y credenciales
-• Capacitación en sistemas internos
-• Acceso a plataformas corporativas
-
-🎓 CAPACITACIÓN INICIAL (2:00 PM)
-• Políticas y procedimientos internos
-• Normas de seguridad y salud ocupacional
-• Beneficios y prestaciones de ley
-• Código de conducta y ética profesional
-
-📍 RECORRIDO GENERAL (4:00 PM)
-• Conoce todas las instalaciones
-• Ubicación de áreas importantes
-• Presentación con otros departamentos
-• Información sobre servicios disponibles
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-💼 DOCUMENTACIÓN IMPORTANTE
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Asegúrate de tener lista y COMPLETA la siguiente documentación para tu primer día:
-
-✓ Documento de identidad original
-✓ Fotos tamaño cédula (2 adicionales)
-✓ Comprobante de domicilio reciente
-✓ Documentación académica certificada
-✓ Certificado médico de buena salud
-✓ Referencias laborales originales
-✓ Cualquier otro documento pendiente
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🎯 EXPECTATIVAS Y OBJETIVOS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Durante tus primeras semanas en {empresa.nombre}:
-
-SEMANA 1-2: ADAPTACIÓN
-• Conocer procesos y metodologías de trabajo
-• Familiarizarte con herramientas y sistemas
-• Establecer relaciones con tu equipo
-• Comprender tu rol y responsabilidades
-
-SEMANA 3-4: INTEGRACIÓN
-• Participar activamente en proyectos
-• Aplicar conocimientos adquiridos
-• Comenzar a generar resultados
-• Recibir retroalimentación constante
-
-MES 2-3: PRODUCTIVIDAD
-• Trabajar de manera autónoma
-• Contribuir significativamente al equipo
-• Proponer mejoras e innovaciones
-• Alcanzar objetivos establecidos
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-💡 CONSEJOS PARA TU ÉXITO
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-✓ Sé puntual desde el primer día
-✓ Mantén una actitud positiva y proactiva
-✓ Haz preguntas cuando tengas dudas
-✓ Toma notas durante las capacitaciones
-✓ Conoce y respeta la cultura organizacional
-✓ Sé amable y respetuoso con todos
-✓ Demuestra tu compromiso y profesionalismo
-✓ Aprende continuamente y adapta-te rápido
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📞 CONTACTO
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Para cualquier consulta antes de tu inicio:
-
-📧 Responde a este correo
-📱 Contacta a Recursos Humanos
-⏰ Disponibilidad: Lunes a Viernes, 8:00 AM - 5:00 PM
-
-Estamos aquí para apoyarte en tu integración.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-{candidato.first_name}, estamos verdaderamente emocionados de tenerte en nuestro equipo. Tu experiencia, habilidades y talento serán un gran aporte para {empresa.nombre}.
-
-Confiamos en que esta será una relación laboral exitosa, productiva y llena de crecimiento profesional.
-
-¡Bienvenido/a a la familia {empresa.nombre}!
-
-¡Nos vemos muy pronto!
-
-Con entusiasmo,
-
-Equipo de Gestión de Talento Humano
-{empresa.nombre}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Sistema de Gestión de Candidatos | TalentoHub
-Correo generado automáticamente el {timezone.now().strftime('%d/%m/%Y a las %H:%M')}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
-                },
-                "Rechazado": {
-                    "asunto": f"Actualización sobre tu postulación - {vacante_obj.titulo} | {empresa.nombre}",
-                    "mensaje": f"""Estimado/a {candidato.first_name or candidato.username},
-
-Esperamos que te encuentres muy bien.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📊 ACTUALIZACIÓN DE TU POSTULACIÓN
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🏢 Empresa: {empresa.nombre}
-💼 Puesto aplicado: {vacante_obj.titulo}
-📅 Fecha de postulación: {postulacion.fecha_postulacion.strftime('%d/%m/%Y')}
-📅 Fecha de esta actualización: {timezone.now().strftime('%d/%m/%Y a las %H:%M')}
-🆔 ID de Postulación: #{postulacion.id}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-💬 RESULTADO DEL PROCESO
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Queremos agradecerte sinceramente por tu interés en formar parte de {empresa.nombre} y por el tiempo que dedicaste a nuestro proceso de selección.
-
-Después de una cuidadosa y exhaustiva evaluación de todos los candidatos, hemos tomado la difícil decisión de continuar con otros perfiles cuya experiencia y habilidades se ajustan de manera más específica a los requisitos particulares de esta posición.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-💡 IMPORTANTE: ESTA NO ES UNA EVALUACIÓN DE TU VALOR
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Queremos enfatizar que esta decisión NO refleja tu valor como profesional ni cuestiona tus capacidades y competencias.
-
-El proceso de selección involucra múltiples factores:
-• Requisitos muy específicos del puesto
-• Experiencia en áreas particulares
-• Disponibilidad inmediata
-• Compatibilidad cultural y organizacional
-• Nivel de especialización requerido
-• Presupuesto y estructura salarial
-• Necesidades estratégicas del momento
-
-En ocasiones, la decisión se basa en detalles muy específicos que no necesariamente reflejan la calidad de tu perfil profesional.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🔄 FUTURAS OPORTUNIDADES
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-¡No pierdas el ánimo! Valoramos tu perfil y queremos que sepas que:
-
-✓ TU PERFIL PERMANECE ACTIVO en nuestra base de datos de talento
-✓ Serás CONSIDERADO AUTOMÁTICAMENTE para futuras vacantes que coincidan con tu experiencia
-✓ Te INVITAMOS a postularte nuevamente a otras posiciones que publiquemos
-✓ Mantendremos TU INFORMACIÓN actualizada por 12 meses
-✓ Podrás ACTUALIZAR tu perfil en cualquier momento
+        with transaction.atomic():
+            # UPDATE condicional + INSERT del evento; no se reescribe ningún historial
+            actualizadas = Postulacion.objects.filter(id=postulacion.id, estado=estado_anterior).update(
+                estado=nuevo_estado,
+            )
+            if not actualizadas:
+                conflicto["estado_actual"] = (
+                    Postulacion.objects.filter(id=postulacion.id).values_list("estado", flat=True).first()
+                )
+                return Response(conflicto, status=409)
+            registrar_cambios_estado([(postulacion.id, estado_anterior)], nuevo_estado, actor=request.user)
+            registrar_cambios_estado_metricas(
+                postulacion.vacante_id, [(estado_anterior, postulacion.fecha_postulacion)], nuevo_estado
+            )
+            postulacion.estado = nuevo_estado
+            correo_enviado = _encolar_correo_estado(postulacion, nuevo_estado)
 
-Te animamos a:
-• Revisar regularmente nuestras ofertas de empleo
-• Seguirnos en redes sociales profesionales
-• Visitar nuestro portal de carreras
-• Mantenerte atento a nuevas oportunidades
+        logger.info(f"✅ Estado actualizado: {estado_anterior} → {nuevo_estado}")
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📈 RECOMENDACIONES PARA TU DESARROLLO PROFESIONAL
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    return Response({
+        "message": "Estado actualizado correctamente.",
+        "correo_enviado": correo_enviado,
+        "postulacion_id": postulacion.id,
+        "nuevo_estado": nuevo_estado
+    })
 
-Mientras continúas tu búsqueda laboral, te sugerimos:
 
-🎓 FORMACIÓN CONTINUA
-• Actualiza tus conocimientos técnicos
-• Obtén certificaciones reconocidas en tu área
-• Participa en cursos y talleres especializados
-• Aprende nuevas tecnologías y herramientas
+def _valores_correo_estado(row):
+    """Datos del candidato para las plantillas estado_* a partir de una fila de values()."""
+    return {
+        "nombre": row["candidato__first_name"] or row["candidato__username"],
+        "primer_nombre": row["candidato__first_name"] or "",
+        "postulacion_id": row["id"],
+        "fecha_postulacion": row["fecha_postulacion"].strftime('%d/%m/%Y') if row["fecha_postulacion"] else "",
+    }
 
-💼 DESARROLLO DE HABILIDADES
-• Fortalece tus soft skills (comunicación, liderazgo, trabajo en equipo)
-• Desarrolla habilidades digitales
-• Mejora tu dominio de idiomas
-• Practica entrevistas y presentaciones
 
-📄 OPTIMIZA TU PERFIL PROFESIONAL
-• Actualiza constantemente tu CV y portafolio
-• Mantén activo tu perfil en LinkedIn y otras plataformas
-• Solicita recomendaciones de empleadores anteriores
-• Documenta tus logros y proyectos exitosos
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, CheckUserInactivityPermission])
+def actualizar_estado_postulaciones_masivo(request, vacante_id):
+    """
+    Cambia el estado de muchas postulaciones de una vacante en un solo UPDATE.
+    URL: POST /reclutador/vacantes/<vacante_id>/postulaciones/estado/
+    Body (JSON), se selecciona por ids o por estado actual:
+    {"estado": "Rechazado", "ids": [1, 2, 3]}
+    {"estado": "Rechazado", "estado_actual": ["Postulado", "En revisión"]}
+    El historial se guarda con un solo INSERT y los correos salen como un único envío masivo
+    (salvo postulaciones que comparten email, que reciben cada una su propio correo).
+    """
+    role_raw = getattr(request.user, 'role', None) or get_supabase_role(request.user)
+    role = normalize_role(role_raw)
 
-🌐 NETWORKING
-• Asiste a eventos profesionales de tu sector
-• Conecta con profesionales de tu área
-• Participa en comunidades y grupos especializados
-• Mantén relaciones profesionales activas
+    if role not in ["admin", "empleado_rrhh"]:
+        return Response({"error": "No autorizado"}, status=403)
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🙏 NUESTRO AGRADECIMIENTO
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    vacante = get_object_or_404(Vacante.objects.select_related("id_empresa"), id=vacante_id)
 
-Valoramos profundamente:
-• El tiempo que invertiste en nuestro proceso
-• Tu interés genuino en {empresa.nombre}
-• La información y documentación que compartiste
-• Tu profesionalismo durante todo el proceso
+    if role == "empleado_rrhh":
+        asignado = VacanteRRHH.objects.filter(vacante=vacante, rrhh_user=request.user).exists()
+        if not asignado:
+            return Response(
+                {"error": "No puedes modificar postulaciones de vacantes que no gestionas."},
+                status=403
+            )
 
-Fue un placer conocer tu trayectoria y perfil profesional.
+    nuevo_estado = request.data.get("estado")
+    if not nuevo_estado:
+        return Response({"error": "Debes enviar el campo 'estado'."}, status=400)
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    ESTADOS_VALIDOS = [valor for valor, _ in Postulacion.ESTADOS]
+    if nuevo_estado not in ESTADOS_VALIDOS:
+        return Response({
+            "error": f"Estado inválido. Usa uno de: {', '.join(ESTADOS_VALIDOS)}"
+        }, status=400)
 
-{candidato.first_name}, te deseamos el mayor de los éxitos en tu búsqueda laboral y en todos tus proyectos profesionales futuros.
+    ids = request.data.get("ids")
+    estado_actual = request.data.get("estado_actual")
+    if isinstance(estado_actual, str):
+        estado_actual = [estado_actual]
+
+    seleccion = Postulacion.objects.filter(vacante=vacante).exclude(estado=nuevo_estado)
+    if ids:
+        if not isinstance(ids, list) or not all(str(i).isdigit() for i in ids):
+            return Response({"error": "'ids' debe ser una lista de ids de postulación."}, status=400)
+        seleccion = seleccion.filter(id__in=[int(i) for i in ids])
+    elif estado_actual:
+        seleccion = seleccion.filter(estado__in=estado_actual)
+    else:
+        return Response({"error": "Debes enviar 'ids' o 'estado_actual'."}, status=400)
+
+    with transaction.atomic():
+        # Filas bloqueadas hasta el UPDATE para que nadie cambie su estado en medio
+        destinatarios = list(
+            seleccion.select_for_update(of=("self",)).values(
+                "id",
+                "estado",
+                "fecha_postulacion",
+                "candidato__email",
+                "candidato__first_name",
+                "candidato__username",
+            )
+        )
+        postulacion_ids = [row["id"] for row in destinatarios]
 
-Estamos seguros de que encontrarás una excelente oportunidad donde tu talento, experiencia y dedicación serán plenamente aprovechados y valorados.
+        # Un solo UPDATE para el estado y un solo INSERT para el historial
+        actualizadas = Postulacion.objects.filter(id__in=postulacion_ids).update(estado=nuevo_estado)
+        registrar_cambios_estado(
+            [(row["id"], row["estado"]) for row in destinatarios], nuevo_estado, actor=request.user
+        )
+        registrar_cambios_estado_metricas(
+            vacante.id, [(row["estado"], row["fecha_postulacion"]) for row in destinatarios], nuevo_estado
+        )
 
-Las puertas de {empresa.nombre} permanecen abiertas para futuras oportunidades.
+        # El envío masivo personaliza por email. Si varias postulaciones comparten email
+        # (cuentas distintas, o el mismo email con otras mayúsculas) cada una va en su propio
+        # correo, para que nadie reciba el nombre o los datos de otra postulación.
+        por_email = {}
+        for row in destinatarios:
+            if row["candidato__email"]:
+                por_email.setdefault(row["candidato__email"].strip().lower(), []).append(row)
+        substitutions = {
+            filas[0]["candidato__email"]: _valores_correo_estado(filas[0])
+            for filas in por_email.values()
+            if len(filas) == 1
+        }
+        individuales = [row for filas in por_email.values() if len(filas) > 1 for row in filas]
+        template_key = ESTADO_POSTULACION_TEMPLATES.get(nuevo_estado)
 
-¡Mucho éxito!
+        correos_encolados = 0
+        if template_key and (substitutions or individuales):
+            try:
+                # Savepoint: si falla el INSERT en el outbox, el cambio de estado sigue en pie
+                with transaction.atomic():
+                    if substitutions:
+                        asunto, mensaje, _ = render_email_template(template_key, _contexto_correo_estado(
+                            vacante,
+                            vacante.id_empresa,
+                            nombre=substitution_tag("nombre"),
+                            primer_nombre=substitution_tag("primer_nombre"),
+                            postulacion_id=substitution_tag("postulacion_id"),
+                            fecha_postulacion=substitution_tag("fecha_postulacion"),
+                        ))
+                        # Un solo registro en el outbox para todos los candidatos
+                        send_bulk_email(
+                            subject=asunto,
+                            message=mensaje,
+                            recipient_list=list(substitutions),
+                            substitutions=substitutions,
+                        )
+                    for row in individuales:
+                        asunto, mensaje, _ = render_email_template(template_key, _contexto_correo_estado(
+                            vacante, vacante.id_empresa, **_valores_correo_estado(row)
+                        ))
+                        send_plain_email(
+                            subject=asunto,
+                            message=mensaje,
+                            recipient_list=[row["candidato__email"]],
+                            async_send=True,
+                        )
+                correos_encolados = len(substitutions) + len(individuales)
+            except Exception as e:
+                logger.error(f"❌ Error encolando correos masivos de estado '{nuevo_estado}': {e}")
 
-Con los mejores deseos,
+    logger.info(
+        f"✅ Estado masivo en vacante {vacante.id}: {actualizadas} postulación(es) → {nuevo_estado}, "
+        f"{correos_encolados} correo(s) encolados"
+    )
+    return Response({
+        "message": "Estados actualizados correctamente.",
+        "vacante_id": vacante.id,
+        "nuevo_estado": nuevo_estado,
+        "actualizadas": actualizadas,
+        "postulacion_ids": postulacion_ids,
+        "correos_encolados": correos_encolados,
+    })
 
-Equipo de Gestión de Talento Humano
-{empresa.nombre}
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, CheckUserInactivityPermission])
+def eventos_postulacion(request, postulacion_id):
+    """
+    Historial paginado de una postulación, del más reciente al más antiguo.
+    URL: GET /postulaciones/<id>/eventos/?limite=50&antes_de=<id_evento>
+    La respuesta trae "siguiente": el valor de antes_de para pedir la página siguiente.
+    """
+    role = normalize_role(getattr(request.user, 'role', None) or get_supabase_role(request.user))
+    postulacion = get_object_or_404(Postulacion.objects.only("id", "vacante_id", "candidato_id"), id=postulacion_id)
+
+    if role == Roles.CANDIDATO:
+        if postulacion.candidato_id != request.user.id:
+            return Response({"error": "No autorizado"}, status=403)
+    elif role == Roles.EMPLEADO_RRHH:
+        asignado = VacanteRRHH.objects.filter(vacante_id=postulacion.vacante_id, rrhh_user=request.user).exists()
+        if not asignado:
+            return Response({"error": "No tienes permisos sobre esta vacante/postulación."}, status=403)
+    elif role != Roles.ADMIN:
+        return Response({"error": "No autorizado"}, status=403)
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Sistema de Gestión de Candidatos | TalentoHub
-Correo generado automáticamente el {timezone.now().strftime('%d/%m/%Y a las %H:%M')}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
-                }
-            }
-            
-            template = templates.get(nuevo_estado)
-            correo_enviado = False
-            
-            if template:
-                logger.info(f"📧 Encolando envío SMTP para estado '{nuevo_estado}' → {candidato.email}")
-                enviado_ok = send_plain_email(
-                    subject=template["asunto"],
-                    message=template["mensaje"],
-                    recipient_list=[candidato.email],
-                    fail_silently=False,
-                    async_send=False,
-                )
-                correo_enviado = bool(enviado_ok)
-                print(f"📬 Resultado send_plain_email para {candidato.email}: {correo_enviado}")
-                logger.info(f"📧 Resultado envío correo estado ({nuevo_estado}): {correo_enviado}")
-            else:
-                logger.warning(f"⚠️ No existe plantilla de correo para el estado '{nuevo_estado}'.")
-                    
-        except Exception as e:
-            print(f"❌ Error enviando correo de estado '{nuevo_estado}': {e}")
-            logger.error(f"❌ Error enviando correo de estado '{nuevo_estado}': {e}")
-            import traceback
-            print(traceback.format_exc())
-            logger.error(traceback.format_exc())
-            # No fallar la actualización si falla el correo
-        
-        logger.info(f"✅ Estado actualizado: {estado_anterior} → {nuevo_estado}")
+    try:
+        limite = min(max(int(request.query_params.get("limite", 50)), 1), 200)
+        antes_de = request.query_params.get("antes_de")
+        antes_de = int(antes_de) if antes_de else None
+    except ValueError:
+        return Response({"error": "'limite' y 'antes_de' deben ser números."}, status=400)
+
+    # Paginación por id (keyset): usa el índice (postulacion, id) sin OFFSET
+    eventos = PostulacionEvento.objects.filter(postulacion_id=postulacion.id).select_related("actor")
+    if antes_de:
+        eventos = eventos.filter(id__lt=antes_de)
+    pagina = list(eventos.order_by("-id")[:limite + 1])
+    hay_mas = len(pagina) > limite
+    pagina = pagina[:limite]
 
     return Response({
-        "message": "Estado actualizado correctamente.",
-        "correo_enviado": bool(locals().get("correo_enviado", False)),
         "postulacion_id": postulacion.id,
-        "nuevo_estado": nuevo_estado
+        "eventos": [serializar_evento(evento) for evento in pagina],
+        "siguiente": pagina[-1].id if hay_mas else None,
     })
 
+
 # ----------------------------
 # Contactar candidato
 # ----------------------------
@@ -2019,22 +1551,16 @@ def contactar_candidato(request, postulacion_id):
             status=400
         )
 
-    # 5️⃣ Guardar comentario en la postulación (historial) sin enviar correo
-    marca_tiempo = timezone.now().strftime("%Y-%m-%d %H:%M")
-    comentario_nuevo = (
-        f"[{marca_tiempo}] {request.user.email} registró nota:\n"
-        f"Asunto: {asunto}\n"
-        f"Mensaje: {mensaje}\n\n"
+    # 5️⃣ Guardar la nota en el historial de la postulación sin enviar correo
+    registrar_evento(
+        postulacion.id,
+        PostulacionEvento.TIPO_NOTA,
+        actor=request.user,
+        resumen=asunto,
+        asunto=asunto,
+        mensaje=mensaje,
     )
 
-    # Asegurarnos de no romper si por alguna razón no existe el campo
-    if hasattr(postulacion, "comentarios"):
-        if postulacion.comentarios:
-            postulacion.comentarios += comentario_nuevo
-        else:
-            postulacion.comentarios = comentario_nuevo
-        postulacion.save(update_fields=["comentarios"])
-
     # 6️⃣ Respuesta
     return Response(
         {'message': 'Nota registrada correctamente en la postulación'},
@@ -2214,9 +1740,9 @@ def obtener_postulaciones_asignadas_rrhh(request):
         return Response({'postulaciones': []}, status=200)
 
     # Obtener todas las postulaciones de esas vacantes
-    postulaciones = Postulacion.objects.filter(vacante_id__in=vacantes_ids).select_related(
+    postulaciones = con_ultimo_evento(Postulacion.objects.filter(vacante_id__in=vacantes_ids).select_related(
         'candidato', 'vacante', 'empresa'
-    )
+    ))
 
     serializer = PostulacionSerializer(postulaciones, many=True)
     return Response({'postulaciones': serializer.data}, status=200)
@@ -2231,9 +1757,9 @@ def mis_postulaciones(request):
     if caller_role != Roles.CANDIDATO:
         return Response({'error': 'Solo candidatos pueden ver sus postulaciones.'}, status=403)
 
-    postulaciones = Postulacion.objects.filter(candidato=request.user).select_related(
+    postulaciones = con_ultimo_evento(Postulacion.objects.filter(candidato=request.user).select_related(
         'vacante', 'vacante__id_empresa', 'empresa'
-    ).order_by('-fecha_postulacion')
+    )).order_by('-fecha_postulacion')
 
     data = []
     for postulacion in postulaciones:
@@ -2273,7 +1799,7 @@ def mis_postulaciones(request):
             'estado': postulacion.estado,
             'cv_url': postulacion.cv_url,
             'fecha_postulacion': postulacion.fecha_postulacion,
-            'comentarios': postulacion.comentarios,
+            'ultimo_evento': resumen_ultimo_evento(postulacion),
             'vacante': vacante_data,
             'empresa_nombre': empresa.nombre if empresa else None,
             'empresa_id': empresa.id if empresa else None,
@@ -2304,15 +1830,15 @@ class PostulacionViewSet(viewsets.ModelViewSet):
         role = normalize_role(getattr(user, 'role', None) or get_supabase_role(user))
 
         if role == Roles.ADMIN:
-            return Postulacion.objects.all()
+            return con_ultimo_evento(Postulacion.objects.all())
         elif role == Roles.EMPLEADO_RRHH:
             # RRHH ve solo las postulaciones de vacantes asignadas
             asignaciones = VacanteRRHH.objects.filter(rrhh_user=user)
             vacantes_ids = [a.vacante.id for a in asignaciones]
-            return Postulacion.objects.filter(vacante_id__in=vacantes_ids)
+            return con_ultimo_evento(Postulacion.objects.filter(vacante_id__in=vacantes_ids))
         elif role == Roles.CANDIDATO:
             # Candidato ve solo sus propias postulaciones
-            return Postulacion.objects.filter(candidato=user)
+            return con_ultimo_evento(Postulacion.objects.filter(candidato=user))
         else:
             return Postulacion.objects.none()
 
@@ -2344,11 +1870,7 @@ class SessionHeartbeatView(APIView):
 
     def post(self, request):
         try:
-            from django.core.cache import cache
-            from django.utils import timezone
-            cache_key = f'user_activity_{request.user.id}'
-            activity_cache_ttl = getattr(settings, 'INACTIVITY_CACHE_TTL', 86400)
-            cache.set(cache_key, timezone.now().isoformat(), activity_cache_ttl)
+            record_activity(request.user.id)
         except Exception:
             pass
 
@@ -2625,22 +2147,16 @@ def contactar_candidato(request, postulacion_id):
             status=400
         )
 
-    # 5️⃣ Guardar comentario en la postulación (historial) sin enviar correo
-    marca_tiempo = timezone.now().strftime("%Y-%m-%d %H:%M")
-    comentario_nuevo = (
-        f"[{marca_tiempo}] {request.user.email} registró nota:\n"
-        f"Asunto: {asunto}\n"
-        f"Mensaje: {mensaje}\n\n"
+    # 5️⃣ Guardar la nota en el historial de la postulación sin enviar correo
+    registrar_evento(
+        postulacion.id,
+        PostulacionEvento.TIPO_NOTA,
+        actor=request.user,
+        resumen=asunto,
+        asunto=asunto,
+        mensaje=mensaje,
     )
 
-    # Asegurarnos de no romper si por alguna razón no existe el campo
-    if hasattr(postulacion, "comentarios"):
-        if postulacion.comentarios:
-            postulacion.comentarios += comentario_nuevo
-        else:
-            postulacion.comentarios = comentario_nuevo
-        postulacion.save(update_fields=["comentarios"])
-
     # 6️⃣ Respuesta
     return Response(
         {'message': 'Nota registrada correctamente en la postulación'},
@@ -2730,6 +2246,24 @@ class TestSupabaseView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+# Estado y latencia de las caches (una por funcionalidad, ver CACHES en settings).
+# Solo admin: cada consulta escribe y borra una clave en cada cache.
+class CacheHealthView(APIView):
+    permission_classes = [permissions.IsAuthenticated, CheckUserInactivityPermission]
+
+    def get(self, request):
+        if not _es_admin(request):
+            return Response({"error": "Solo administradores pueden consultar el estado de las caches."},
+                            status=status.HTTP_403_FORBIDDEN)
+        probes = probe_caches()
+        healthy = all(p["ok"] for p in probes)
+        return Response({
+            "status": "ok" if healthy else "degraded",
+            "cache_backend": getattr(settings, "CACHE_BACKEND", None),
+            "caches": probes,
+        }, status=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
 # ----------------------------
 # Función auxiliar para enviar email de bienvenida
 # ----------------------------
@@ -2789,6 +2323,8 @@ class RegisterView(APIView):
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """Login con username o email + devolver info de usuario y grupos"""
+    token_class = RoleRefreshToken
+
     def validate(self, attrs):
         username_or_email = attrs.get("username")
         password = attrs.get("password")
@@ -2806,17 +2342,8 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         data = super().validate(attrs)
         self.user = user
 
-        # Obtener role directamente de la BD (el campo existe en auth_user pero no en el modelo Django)
-        from django.db import connection
-        role = Roles.CANDIDATO
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute('SELECT role FROM auth_user WHERE id = %s', [user.id])
-                row = cursor.fetchone()
-                if row and row[0]:
-                    role = normalize_role(row[0]) or Roles.CANDIDATO
-        except Exception:
-            pass
+        # Rol ya resuelto al emitir el token (memo del request / cache compartida)
+        role = get_supabase_role(user) or Roles.CANDIDATO
 
         # Obtener grupos (si los usas)
         groups = [g.name for g in user.groups.all()] if hasattr(user, "groups") else []
@@ -2843,17 +2370,20 @@ class CustomTokenObtainPairView(TokenObtainPairView):
             if response.status_code == 200 and isinstance(response.data, dict):
                 user_info = response.data.get("user")
                 if user_info and user_info.get("id"):
-                    from django.core.cache import cache
-                    from django.utils import timezone
-                    from django.conf import settings as dj_settings
-                    user_id = user_info.get("id")
-                    cache_key = f'user_activity_{user_id}'
-                    activity_cache_ttl = getattr(dj_settings, 'INACTIVITY_CACHE_TTL', 86400)
-                    cache.set(cache_key, timezone.now().isoformat(), activity_cache_ttl)
+                    record_activity(user_info.get("id"))
         except Exception:
             pass
 
         return response
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh que vuelve a calcular los claims de rol/empresa del access token"""
+    token_class = RoleRefreshToken
+
+
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+
 # ----------------------------
 # Empresa
 # ----------------------------
@@ -2929,6 +2459,7 @@ class EmpresaViewSet(viewsets.ModelViewSet):
         except Exception as e:
             print(f"⚠️ Error actualizando grupo en Django: {e}")
 
+        invalidate_role(user)
         return empresa
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])  # Permite acceso a cualquier usuario
@@ -3118,6 +2649,7 @@ class UsuarioViewSet(viewsets.ViewSet):
             if "rol" in request.data and request.user.role == "admin" and hasattr(usuario, "role"):
                 usuario.role = normalize_role(request.data.get("rol"))
             usuario.save()
+            invalidate_role(usuario)
         except Exception as e:
             return Response({"detail": f"Error al actualizar: {e}"}, status=status.HTTP_400_BAD_REQUEST)
         return Response({
@@ -3151,6 +2683,8 @@ class UsuarioViewSet(viewsets.ViewSet):
 
         group_obj, _ = Group.objects.get_or_create(name=rol)
         user_obj.groups.add(group_obj)
+        # Después de cambiar los grupos: el rol se resuelve con ellos si auth_user no tiene la columna
+        invalidate_role(user_obj)
         return Response({"message": f"Usuario '{usuario['email']}' creado con rol '{rol}'"}, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=["patch"], url_path="actualizar_rol")
@@ -3172,6 +2706,7 @@ class UsuarioViewSet(viewsets.ViewSet):
         group_obj, _ = Group.objects.get_or_create(name=normalized_role)
         usuario.groups.clear()
         usuario.groups.add(group_obj)
+        invalidate_role(usuario)
         return Response({"message": "Rol actualizado correctamente"}, status=status.HTTP_200_OK)
 
     
@@ -3215,8 +2750,9 @@ class PasswordResetRequestView(APIView):
                     "reset_link": reset_link,
                 },
                 fail_silently=False,
+                async_send=True,
             )
-            print("📧 Correo enviado correctamente por SMTP")
+            print("📧 Correo de restablecimiento encolado")
         except Exception as e:
             print("❌ Error enviando correo:", e)
             return Response({"error": "Error enviando correo"}, status=500)
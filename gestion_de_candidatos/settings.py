@@ -61,9 +61,9 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
 
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
-        "rest_framework.authentication.SessionAuthentication",
+        "core.authentication.RoleClaimsJWTAuthentication",
+        "core.authentication.UserContextTokenAuthentication",
+        "core.authentication.UserContextSessionAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -89,6 +89,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.LoginSecurityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -148,6 +149,10 @@ else:
         }
     }
 
+# Las exportaciones leen con .iterator() (cursor del servidor). Detrás de un pooler en modo
+# transacción (p.ej. pgbouncer/Supabase en el puerto 6543) hay que desactivarlos.
+DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS', 'false').lower() == 'true'
+
 
 
 
@@ -199,6 +204,11 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "talentohub2025@gmail.com")
+# Pool keep-alive del cliente SendGrid compartido por proceso
+SENDGRID_MAX_CONNECTIONS = int(os.getenv("SENDGRID_MAX_CONNECTIONS", "10"))
+SENDGRID_KEEPALIVE_SECONDS = float(os.getenv("SENDGRID_KEEPALIVE_SECONDS", "60"))
+# Destinatarios por request en envíos masivos (SendGrid admite hasta 1000 personalizations)
+SENDGRID_BATCH_SIZE = int(os.getenv("SENDGRID_BATCH_SIZE", "1000"))
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 FRONTEND_RESET_PASSWORD_PATH = os.getenv("FRONTEND_RESET_PASSWORD_PATH", "/reset-password")
 TALENTOHUB_LOGO_URL = os.getenv(
@@ -218,6 +228,26 @@ EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", "30"))
 EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES", "2"))
 EMAIL_RETRY_BACKOFF_SECONDS = float(os.getenv("EMAIL_RETRY_BACKOFF_SECONDS", "1.0"))
+# Pool de conexiones SMTP autenticadas (fallback sin SendGrid). Gmail corta conexiones inactivas,
+# así que las que lleven más de EMAIL_SMTP_IDLE_SECONDS sin uso se cierran y se abre otra.
+EMAIL_SMTP_POOL_SIZE = int(os.getenv("EMAIL_SMTP_POOL_SIZE", "2"))
+EMAIL_SMTP_IDLE_SECONDS = float(os.getenv("EMAIL_SMTP_IDLE_SECONDS", "60"))
+
+# Outbox de correos: los requests solo encolan y un pool acotado entrega.
+# EMAIL_OUTBOX_IN_PROCESS=true arranca el pool dentro de cada worker web; con false,
+# ejecutar aparte `python manage.py process_email_outbox`.
+EMAIL_OUTBOX_IN_PROCESS = os.getenv("EMAIL_OUTBOX_IN_PROCESS", "true").lower() == "true"
+EMAIL_OUTBOX_WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS", "4"))
+EMAIL_OUTBOX_POLL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "5"))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+EMAIL_OUTBOX_MAX_RETRY_DELAY = int(os.getenv("EMAIL_OUTBOX_MAX_RETRY_DELAY", "3600"))
+# Filas en "sending" más viejas que esto se consideran abandonadas (worker reiniciado)
+EMAIL_OUTBOX_STALE_SECONDS = int(os.getenv("EMAIL_OUTBOX_STALE_SECONDS", "300"))
+# Envíos simultáneos por proveedor (por proceso)
+EMAIL_OUTBOX_PROVIDER_CONCURRENCY = {
+    "sendgrid": int(os.getenv("EMAIL_OUTBOX_SENDGRID_CONCURRENCY", "4")),
+    "smtp": int(os.getenv("EMAIL_OUTBOX_SMTP_CONCURRENCY", "2")),
+}
 
 print("✅ Email SMTP (Gmail) configurado correctamente")
 
@@ -246,21 +276,139 @@ SIMPLE_JWT = {
 }
 
 # ============================================
-# CONFIGURACIÓN DE CACHES (para inactividad)
+# CONFIGURACIÓN DE CACHES
 # ============================================
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'talenthub-cache',
-    }
-}
+# CACHE_BACKEND elige el nivel de cache (todas las funciones usan el mismo):
+#   locmem -> memoria del proceso (cada worker de gunicorn tiene la suya, solo desarrollo)
+#   sqlite -> archivo SQLite compartido por los workers del mismo host (sin servicios externos)
+#   file   -> directorio compartido (FileBasedCache; incr no es atómico entre procesos)
+#   db     -> tabla en la BD (ejecutar `python manage.py createcachetable`)
+#   redis  -> Redis o compatible (REDIS_URL)
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem' if DEBUG else 'sqlite').lower()
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1')
+# Las claves de seguridad (bloqueos y ventanas de rate limit, versiones de rol, actividad)
+# van en su propio almacenamiento: el tráfico público (métricas, reportes) no lo llena, así
+# que el cull no las descarta (descarta primero las que expiran antes, que son justo esas).
+SECURITY_CACHE_LOCATION = os.getenv('SECURITY_CACHE_LOCATION', '')
+# Entradas por almacenamiento antes del cull (sqlite/file/db/locmem; Redis usa su maxmemory)
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 5000))
+SECURITY_CACHE_MAX_ENTRIES = int(os.getenv('SECURITY_CACHE_MAX_ENTRIES', 100000))
+
+if CACHE_BACKEND == 'redis':
+    _cache_backend = 'django.core.cache.backends.redis.RedisCache'
+    _cache_location = REDIS_URL
+    # Redis no descarta por número de entradas; para aislarlas de verdad usar otra BD/instancia
+    _security_location = SECURITY_CACHE_LOCATION or REDIS_URL
+elif CACHE_BACKEND == 'sqlite':
+    _cache_backend = 'core.cache_backends.SQLiteCache'
+    _cache_location = CACHE_LOCATION or os.path.join(BASE_DIR, '.cache', 'talenthub-cache.sqlite3')
+    _security_location = SECURITY_CACHE_LOCATION or '{}-security{}'.format(*os.path.splitext(_cache_location))
+elif CACHE_BACKEND == 'file':
+    _cache_backend = 'django.core.cache.backends.filebased.FileBasedCache'
+    _cache_location = CACHE_LOCATION or os.path.join(BASE_DIR, '.cache', 'talenthub-cache')
+    _security_location = SECURITY_CACHE_LOCATION or _cache_location.rstrip(os.sep) + '-security'
+elif CACHE_BACKEND == 'db':
+    _cache_backend = 'django.core.cache.backends.db.DatabaseCache'
+    _cache_location = CACHE_LOCATION or 'talenthub_cache'
+    _security_location = SECURITY_CACHE_LOCATION or f'{_cache_location}_security'
+else:
+    _cache_backend = 'django.core.cache.backends.locmem.LocMemCache'
+    _cache_location = 'talenthub-cache'
+    _security_location = 'talenthub-cache-security'
+
+
+def _cache_config(location, max_entries, key_prefix):
+    config = {'BACKEND': _cache_backend, 'LOCATION': location, 'KEY_PREFIX': key_prefix}
+    if CACHE_BACKEND != 'redis':
+        # RedisCache pasa OPTIONS al cliente de redis y no acepta MAX_ENTRIES
+        config['OPTIONS'] = {'MAX_ENTRIES': max_entries}
+    return config
+
+
+# Un alias por funcionalidad con su propio KEY_PREFIX: cada uno se puede mover a otro
+# backend. Los de SECURITY_CACHE_FEATURES comparten el almacenamiento de seguridad.
+CACHE_FEATURES = ('roles', 'auth', 'activity', 'metrics', 'reports')
+SECURITY_CACHE_FEATURES = ('roles', 'auth', 'activity')
+CACHES = {'default': _cache_config(_cache_location, CACHE_MAX_ENTRIES, 'th')}
+for _feature in CACHE_FEATURES:
+    if _feature in SECURITY_CACHE_FEATURES:
+        CACHES[_feature] = _cache_config(_security_location, SECURITY_CACHE_MAX_ENTRIES, f'th:{_feature}')
+    else:
+        CACHES[_feature] = _cache_config(_cache_location, CACHE_MAX_ENTRIES, f'th:{_feature}')
 
 # Timeout de inactividad en segundos (2 minutos para pruebas)
 INACTIVITY_TIMEOUT = int(os.getenv('INACTIVITY_TIMEOUT', 120))  # 120 segundos = 2 minutos
 # TTL del marcador de actividad en cache (debe ser mayor que INACTIVITY_TIMEOUT)
 INACTIVITY_CACHE_TTL = int(os.getenv('INACTIVITY_CACHE_TTL', 86400))
+# Solo se reescribe la actividad si la guardada tiene más de N segundos (la mayoría de
+# requests solo leen). Una sesión puede durar hasta N segundos más que INACTIVITY_TIMEOUT.
+ACTIVITY_WRITE_GRANULARITY = int(os.getenv('ACTIVITY_WRITE_GRANULARITY', 15))
+# Alias de cache para la actividad; debe ser compartido entre workers para que el timeout sea global
+INACTIVITY_CACHE_ALIAS = os.getenv('INACTIVITY_CACHE_ALIAS', 'activity')
+
+# TTL (segundos) de la cache compartida de roles por usuario (0 desactiva la cache compartida)
+ROLE_CACHE_ALIAS = os.getenv('ROLE_CACHE_ALIAS', 'roles')
+ROLE_CACHE_TTL = int(os.getenv('ROLE_CACHE_TTL', 300))
+
+# Respuestas cacheadas de /api/metrics/ (públicas). Se invalidan al subir la versión de
+# métricas en cada escritura de postulaciones; el TTL acota lo que no pasa por ahí
+# (p.ej. cambios de título de una vacante).
+METRICS_CACHE_ALIAS = os.getenv('METRICS_CACHE_ALIAS', 'metrics')
+METRICS_CACHE_TTL = int(os.getenv('METRICS_CACHE_TTL', 300))
+
+# PDFs de métricas por vacante ya generados. La clave incluye la versión de métricas, así
+# que el TTL solo controla cuánto ocupan las versiones viejas.
+REPORTS_CACHE_ALIAS = os.getenv('REPORTS_CACHE_ALIAS', 'reports')
+REPORTS_CACHE_TTL = int(os.getenv('REPORTS_CACHE_TTL', 86400))
+# Logos de empresa descargados para los reportes (una vez por URL)
+REPORT_LOGO_CACHE_DIR = os.getenv('REPORT_LOGO_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'logos'))
+# Tras un fallo de descarga, segundos antes de volver a intentar ese logo
+REPORT_LOGO_RETRY_SECONDS = int(os.getenv('REPORT_LOGO_RETRY_SECONDS', 600))
+
+# Pool de procesos para generar PDFs fuera del worker de gunicorn (uno por worker).
+# REPORT_POOL_WORKERS=0 genera en el mismo proceso (desarrollo).
+REPORT_POOL_WORKERS = int(os.getenv('REPORT_POOL_WORKERS', 1))
+# Máximo de reportes en cola o en proceso por worker; el siguiente recibe 503 + Retry-After
+REPORT_QUEUE_SIZE = int(os.getenv('REPORT_QUEUE_SIZE', 4))
+# 'spawn' evita heredar hilos y conexiones abiertas del worker
+REPORT_POOL_START_METHOD = os.getenv('REPORT_POOL_START_METHOD', 'spawn')
+# Las exportaciones PDF síncronas esperan hasta N segundos; si no, responden 202 con el job.
+# Mientras espera, el worker de gunicorn no atiende otros requests: mantenerlo corto.
+REPORT_SYNC_WAIT_SECONDS = float(os.getenv('REPORT_SYNC_WAIT_SECONDS', 2))
+# Cuánto se recuerda un job (estado y error) para el polling
+REPORT_JOB_TTL = int(os.getenv('REPORT_JOB_TTL', 3600))
+# Un job sin PDF ni error pasado este tiempo se da por expirado (resultado descartado de la cache)
+REPORT_JOB_TIMEOUT = int(os.getenv('REPORT_JOB_TIMEOUT', 300))
+# Motor del gráfico del PDF por vacante: 'matplotlib' (PNG) o 'reportlab' (vectorial,
+# evita importar matplotlib: arranque en frío mucho más corto)
+REPORT_CHART_ENGINE = os.getenv('REPORT_CHART_ENGINE', 'matplotlib')
+# Desactivado por defecto: el pool se lanza (y el motor se importa) con el primer reporte.
+# Con 'true' cada worker de gunicorn lo precalienta al arrancar, para que el primer PDF no
+# pague el arranque en frío; solo conviene donde se exportan PDFs con frecuencia.
+REPORT_WARMUP = os.getenv('REPORT_WARMUP', 'false').lower() == 'true'
+
+# Firmar role e id_empresa como claims del access token (evita consultar la BD en cada request).
+# Un cambio de rol cambia la versión del usuario en cache y obliga a refrescar el token,
+# por eso conviene activarlo solo con una cache compartida entre workers. Si la versión
+# se pierde de la cache, los tokens con claims se rechazan (TOKEN_STALE) hasta refrescarlos.
+JWT_ROLE_CLAIMS = os.getenv('JWT_ROLE_CLAIMS', 'false').lower() == 'true'
 
-
-
-
-
+# ============================================
+# BLOQUEO POR INTENTOS FALLIDOS DE LOGIN
+# ============================================
+LOGIN_LOCKOUT_BACKEND = os.getenv('LOGIN_LOCKOUT_BACKEND', 'core.lockout.CacheLockoutBackend')
+LOGIN_LOCKOUT_CACHE = os.getenv('LOGIN_LOCKOUT_CACHE', 'auth')
+MAX_FAILED_LOGINS = int(os.getenv('MAX_FAILED_LOGINS', 3))
+ACCOUNT_LOCK_MINUTES = int(os.getenv('ACCOUNT_LOCK_MINUTES', 5))
+# Los intentos fallidos se olvidan si pasa este tiempo sin nuevos fallos
+FAILED_LOGIN_WINDOW_SECONDS = int(os.getenv('FAILED_LOGIN_WINDOW_SECONDS', 3600))
+
+# Límite de frecuencia en /api/token/ (ventana deslizante, se aplica antes de verificar la contraseña)
+LOGIN_RATE_LIMIT_WINDOW_SECONDS = int(os.getenv('LOGIN_RATE_LIMIT_WINDOW_SECONDS', 60))
+LOGIN_RATE_LIMIT_PER_IP = int(os.getenv('LOGIN_RATE_LIMIT_PER_IP', 20))
+LOGIN_RATE_LIMIT_PER_USER = int(os.getenv('LOGIN_RATE_LIMIT_PER_USER', 10))
+# Proxies de confianza delante de la app. 0 = usar REMOTE_ADDR e ignorar X-Forwarded-For
+# (lo puede falsificar el cliente). Detrás de un proxy, poner cuántos agregan su entrada
+# al X-Forwarded-For (en Render: LOGIN_RATE_LIMIT_PROXY_COUNT=1).
+LOGIN_RATE_LIMIT_PROXY_COUNT = int(os.getenv('LOGIN_RATE_LIMIT_PROXY_COUNT', 0))
@@ -45,3 +45,23 @@ preload_app = False
 
 # Threads por worker (solo si usas gthread como worker_class)
 # threads = 2
+
+
+def post_worker_init(worker):
+    # Arrancar el pool del outbox de correos en cada worker (reanuda pendientes tras un reinicio)
+    try:
+        from core.email_outbox import start_dispatcher
+        start_dispatcher()
+    except Exception as e:
+        worker.log.warning(f"No se pudo iniciar el outbox de correos: {e}")
+
+    # Con REPORT_WARMUP, lanzar el pool de PDFs con matplotlib/reportlab ya importados: el
+    # primer reporte no paga el arranque en frío. Corre en un hilo para no retrasar el worker.
+    try:
+        from django.conf import settings
+        if getattr(settings, "REPORT_WARMUP", False):
+            import threading
+            from core.report_jobs import calentar_pool
+            threading.Thread(target=calentar_pool, name="report-warmup", daemon=True).start()
+    except Exception as e:
+        worker.log.warning(f"No se pudo precalentar el pool de reportes: {e}")